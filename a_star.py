@@ -1,71 +1,11 @@
 import math
+import sys
 import time
-import heapq
 
-
-def get_neighbours(current, maze, visited):
-    """
-    Returns all valid neighbours of the current Node
-
-    Parameters:
-        current   (tuple): Contains the Node's current position
-        maze   (2-d list): Contains the maze. Used to check if Node
-                           is within bounds
-        visited     (set): Contains a list of visited nodes. Used to
-                           filter out neighbours that have already been
-                           visited.
-
-    Returns:
-        neighbours (list): Contains a list of valid neighbours
-
-    """
-
-    r = current[0]
-    c = current[1]
-
-    # top right left bottom priority
-    all_neighbours = [(r - 1, c),
-                      (r, c + 1),
-                      (r, c - 1),
-                      (r + 1, c), ]
-    neighbours = []
-
-    # filters valid neighbours
-    for each in all_neighbours:
-        # go next if out of bounds, is a wall or visited
-        if each in visited:
-            continue
-        if each[0] < 0 or each[0] > len(maze) - 1:  # row bounds check
-            continue
-        if each[1] < 0 or each[1] > len(maze[0]) - 1:  # column bounds check
-            continue
-        if maze[each[0]][each[1]] == '#':
-            continue
-
-        # append and return list of valid neighbours
-        neighbours.append(each)
-    return neighbours
-
-
-def get_path(node):
-    """
-    Loops through all Nodes preceding the current_node and
-    compiles it into the final path.
-
-    Args:
-        node  (Node): Node object
-
-    Returns:
-        path  (list): Contains full path from start to the end Node.
-    """
-
-    path = [node.position]
-
-    # get final path by going through node parents
-    while node.parent:
-        node = node.parent
-        path.append(node.position)
-    return path[::-1]
+from maze import as_maze, trace_path
+from open_list import make_open_list
+from stats import CHECK_EVERY, EXPAND, PUSH, SearchStats, observed
+from workspace import Workspace
 
 
 # euclidean is slower with an average of 0.8 seconds on VLarge
@@ -81,7 +21,7 @@ def euclidean(current, end):
         Euclidean heuristic for the given Node
     """
 
-    return math.sqrt((current[0] - end[1]) ** 2 + (current[1] - end[1]) ** 2)
+    return math.sqrt((current[0] - end[0]) ** 2 + (current[1] - end[1]) ** 2)
 
 
 # an average of 0.5 seconds on VLarge
@@ -99,79 +39,405 @@ def manhattan(current, end):
     return abs(current[0] - end[0]) + abs(current[1] - end[1])
 
 
-class Node:
+class AStarSearch:
     """
-    To represent Node, to be used with A-Star search
+    State of an A-Star Search between two cells, which can be run to the
+    end in one go, as astar_search does, or in slices that pause and
+    resume, as checkpoint.ResumableSearch does.
+
+    g-costs and parents are kept in the workspace's flat arrays and every
+    open list entry is a single int packing f, g and the cell index,
+    (f << f_shift) | ((mask - g) << shift) | index, so no per-node objects
+    are created. The open list is a binary heap, which breaks ties on f in
+    favour of the higher g, then the lower cell index, or a bucket queue or
+    radix heap, which pop the latest of the entries with the lowest f. A
+    cell is pushed again whenever a cheaper g is found for it, and outdated
+    entries are skipped when popped, so the path found is optimal.
 
     Attributes:
-        parent     (Node): Node, the parent of self
-        position  (tuple): Tuple, position of current node
-        f           (int): Absolute value of some number, contains
-                           the heuristic value of the current Node.
+        graph          (Maze): Contains the maze, or its Adjacency index.
+        source          (int): Flat index of the starting position.
+        target          (int): Flat index of the end position.
+        workspace (Workspace): g-costs, parents and expansion order.
+        open      (open list): The open list.
+        estimate   (callable): estimate(index) of the steps to target, None
+                               for the Manhattan distance.
+        shift           (int): Bit position of g in the keys.
+        f_shift         (int): Bit position of f in the keys.
+        mask            (int): Mask of the cell index and of g in the keys.
+        pushes          (int): Number of open list pushes so far.
+        pops            (int): Number of entries popped so far.
+        reopened        (int): Number of pushes of cells already seen, after
+                               a cheaper g was found.
+        max_frontier    (int): Largest size of the open list so far.
+        found          (bool): Whether the end was reached.
+        done           (bool): Whether the search has finished.
     """
 
-    # default constructor with default values if unset
-    def __init__(self, parent=None, position=None, f=0):
-        self.parent = parent
-        self.position = position
-        self.f = f
+    def __init__(self, graph, source, target, workspace, observer=None, heuristic=None, open_list=None):
+        """
+        Resets the workspace and pushes the starting position.
+
+        Args:
+            graph          (Maze): Contains the maze, or its Adjacency index
+            source          (int): Flat index of the starting position
+            target          (int): Flat index of the end position
+            workspace (Workspace): Buffers to search in, reset by this call
+            observer   (callable): Optional observer(event, cell), called on
+                                   every stats.EXPAND and stats.PUSH
+            heuristic  (callable): Optional heuristic(target) returning an
+                                   admissible estimate(index) of the steps
+                                   to target, such as landmarks.Landmarks,
+                                   the Manhattan distance when None
+            open_list       (str): One of open_list.HEAP, BUCKET and RADIX,
+                                   or None to pick one for the heuristic
+        """
+
+        self.graph = graph
+        self.source = source
+        self.target = target
+        self.workspace = workspace
+        self.shift = graph.size.bit_length()
+        self.f_shift = 2 * self.shift
+        self.mask = (1 << self.shift) - 1
+        self.open = make_open_list(open_list, self.f_shift, heuristic)
+        self.estimate = heuristic(target) if heuristic is not None else None
+        self.pushes = 1
+        self.pops = 0
+        self.reopened = 0
+        self.max_frontier = 1
+        self.found = False
+        self.done = False
+
+        mask = self.mask
+        self.observe(observer)
+
+        generation = workspace.reset()
+        workspace.seen[source] = generation
+        workspace.g[source] = 0
+        workspace.parent[source] = -1
+        if self.estimate is None:
+            (r, c) = divmod(source, graph.width)
+            (end_r, end_c) = divmod(target, graph.width)
+            h = abs(r - end_r) + abs(c - end_c)
+        else:
+            h = self.estimate(source)
+        self._push((h << self.f_shift) | (mask << self.shift) | source)
+
+    def observe(self, observer):
+        """
+        Sets the observer(event, cell) called on every later stats.EXPAND
+        and stats.PUSH, None for none.
+        """
+        mask = self.mask
+        self._push = observed(self.open.push, observer, PUSH, lambda key: key & mask)
+        self._expand = observed(self.workspace.order.append, observer, EXPAND)
+
+    def run(self, limit=None, deadline=None):
+        """
+        Runs the search until it finishes, or pauses it once limit more
+        entries were popped or time.perf_counter() passes deadline, which
+        is only read every stats.CHECK_EVERY pops.
+
+        Args:
+            limit           (int): Optional number of entries to pop
+            deadline      (float): Optional time.perf_counter() to pause at
+
+        Returns:
+            done           (bool): Whether the search has finished
+        """
+
+        graph = self.graph
+        neighbours = graph.neighbours
+        width = graph.width
+        workspace = self.workspace
+        (g, parent, seen, generation) = (workspace.g, workspace.parent, workspace.seen, workspace.generation)
+        (shift, f_shift, mask) = (self.shift, self.f_shift, self.mask)
+        push = self._push
+        pop = self.open.pop
+        expand = self._expand
+        estimate = self.estimate
+        target = self.target
+        (end_r, end_c) = divmod(target, width)
+        (pushes, pops, reopened, max_frontier) = (self.pushes, self.pops, self.reopened, self.max_frontier)
+
+        # pause once pops reaches stop, looking at the clock every CHECK_EVERY pops
+        stop = pops + limit if limit is not None else sys.maxsize
+        pause = stop if deadline is None else min(stop, pops + CHECK_EVERY)
+
+        # loop while the open list contains elements
+        while pushes > pops:
+            if pops >= pause:
+                if pops >= stop or time.perf_counter() >= deadline:
+                    break
+                pause = min(stop, pops + CHECK_EVERY)
+
+            # retrieve the cell with the smallest f value, skip outdated entries
+            key = pop()
+            pops += 1
+            current = key & mask
+            current_g = mask - ((key >> shift) & mask)
+            if current_g != g[current]:
+                continue
+            expand(current)
+
+            if current == target:
+                self.found = True
+                break
+
+            # push every neighbour reached with a cheaper g than before
+            next_g = current_g + 1
+            for each in neighbours(current):
+                if seen[each] == generation:
+                    if g[each] <= next_g:
+                        continue
+                    reopened += 1
+                seen[each] = generation
+                g[each] = next_g
+                parent[each] = current
+                if estimate is None:
+                    (r, c) = divmod(each, width)
+                    f = next_g + abs(r - end_r) + abs(c - end_c)
+                else:
+                    f = next_g + estimate(each)
+                push((f << f_shift) | ((mask - next_g) << shift) | each)
+                pushes += 1
+            if pushes - pops > max_frontier:
+                max_frontier = pushes - pops
+
+        (self.pushes, self.pops, self.reopened, self.max_frontier) = (pushes, pops, reopened, max_frontier)
+        self.done = self.found or pushes == pops
+        return self.done
+
+    def stats(self):
+        """
+        Returns the counters of the search so far, without timings.
+        """
+        return SearchStats(self.found, len(self.workspace.order), self.pushes, self.pops, self.max_frontier,
+                           self.reopened)
+
+
+def astar_search(graph, source, target, workspace, observer=None, heuristic=None, open_list=None):
+    """
+    Runs A-Star Search between two cells, leaving g-costs, parents and the
+    expansion order in the workspace. See AStarSearch for the details.
 
-    # comparison methods for heap purposes
-    def __eq__(self, other):
-        return self.f == other.f
+    Args:
+        graph          (Maze): Contains the maze, or its Adjacency index
+        source          (int): Flat index of the starting position
+        target          (int): Flat index of the end position
+        workspace (Workspace): Buffers to search in, reset by this call
+        observer   (callable): Optional observer(event, cell), called on
+                               every stats.EXPAND and stats.PUSH
+        heuristic  (callable): Optional heuristic(target) returning an
+                               admissible estimate(index) of the steps to
+                               target, such as landmarks.Landmarks, the
+                               Manhattan distance when None
+        open_list       (str): One of open_list.HEAP, BUCKET and RADIX, or
+                               None to pick one for the heuristic
 
-    def __lt__(self, other):
-        return self.f < other.f
+    Returns:
+        stats    (SearchStats): Counters and search time, path_length is
+                               left for the caller to fill in
+    """
 
-    def __hash__(self):
-        return hash(self.f)
+    start_time = time.perf_counter()
+    search = AStarSearch(graph, source, target, workspace, observer, heuristic, open_list)
+    search.run()
+    stats = search.stats()
+    stats.timings["search"] = time.perf_counter() - start_time
+    return stats
 
 
-def astar(maze, start, end):
+def astar(maze, start, end, adjacency=None, workspace=None, observer=None, heuristic=None, open_list=None):
     """
     Solves the maze given using A-Star Search, returns statistics and pathing.
 
     Args:
-            maze  (2-d list): Contains the maze
+            maze      (Maze): Contains the maze, a list of rows is
+                              also accepted
             start    (tuple): Position of the starting position
             end      (tuple): Position of the end position
+            adjacency (Adjacency): Optional precomputed index of the maze,
+                              walked instead of the maze when given
+            workspace (Workspace): Optional buffers to reuse from an earlier
+                              query on the same maze
+            observer (callable): Optional observer(event, cell), called on
+                              every stats.EXPAND and stats.PUSH
+            heuristic (callable): Optional heuristic(target) returning an
+                              admissible estimate(index), such as
+                              landmarks.Landmarks, Manhattan when None
+            open_list  (str): One of open_list.HEAP, BUCKET and RADIX, or
+                              None to pick one for the heuristic
 
     Returns:
             path      (list): Contains all the tiles traversed from the
                               start node in order to reach the end node.
             closed     (set): Contains all Nodes explored while trying
                               to find the path.
+            stats (SearchStats): Counters and timings of the search
+    """
+
+    graph = adjacency if adjacency is not None else as_maze(maze)
+    width = graph.width
+    if workspace is None:
+        workspace = Workspace(graph.size)
+
+    target = end[0] * width + end[1]
+    stats = astar_search(graph, start[0] * width + start[1], target, workspace, observer, heuristic, open_list)
+    with stats.timed("path"):
+        path = trace_path(workspace.parent, target, width) if stats.found else []
+    stats.path_length = len(path)
+    return path, workspace.explored(width), stats
+
+
+def astar_goals_search(graph, source, targets, workspace, observer=None, all_goals=False, open_list=None):
+    """
+    Runs one A-Star Search from a cell towards several target cells,
+    leaving g-costs, parents and the expansion order in the workspace.
+
+    The heuristic of a cell is its Manhattan distance to the nearest
+    target still unreached, which never overestimates the distance to any
+    of them, so the first target expanded is the nearest one and every
+    target is expanded with its shortest distance. All targets share the
+    one open list and set of expanded cells, so cells between them are
+    expanded once instead of once per target. Entries pushed before a
+    target was reached keep their lower f-cost and are popped earlier
+    than needed, which costs some expansions but not optimality.
+
+    Args:
+        graph          (Maze): Contains the maze, or its Adjacency index
+        source          (int): Flat index of the starting position
+        targets        (list): Flat indices of the goals
+        workspace (Workspace): Buffers to search in, reset by this call
+        observer   (callable): Optional observer(event, cell), called on
+                               every stats.EXPAND and stats.PUSH
+        all_goals      (bool): Keep searching until every goal is reached,
+                               instead of stopping at the nearest
+        open_list       (str): One of open_list.HEAP, BUCKET and RADIX, or
+                               None for a binary heap
+
+    Returns:
+        reached        (list): Flat indices of the goals reached, nearest
+                               first
+        stats    (SearchStats): Counters and search time, path_length is
+                               left for the caller to fill in
+    """
+
+    start_time = time.perf_counter()
+    neighbours = graph.neighbours
+    width = graph.width
+    generation = workspace.reset()
+    g = workspace.g
+    parent = workspace.parent
+    seen = workspace.seen
+    order = workspace.order
+    pushes = 1
+    pops = 0
+    reopened = 0
+    max_frontier = 1
+    reached = []
+
+    # open list entries are (f << f_shift) | ((mask - g) << shift) | index
+    shift = graph.size.bit_length()
+    f_shift = 2 * shift
+    mask = (1 << shift) - 1
+    open = make_open_list(open_list, f_shift)
+    push = observed(open.push, observer, PUSH, lambda key: key & mask)
+    pop = open.pop
+    expand = observed(order.append, observer, EXPAND)
+
+    remaining = set(targets)
+    goals = [divmod(each, width) for each in remaining]
+
+    def estimate(index):
+        (r, c) = divmod(index, width)
+        return min(abs(r - goal_r) + abs(c - goal_c) for (goal_r, goal_c) in goals)
+
+    seen[source] = generation
+    g[source] = 0
+    parent[source] = -1
+    if goals:
+        push((estimate(source) << f_shift) | (mask << shift) | source)
+    else:
+        pushes = 0
+
+    while pushes > pops:
+        key = pop()
+        pops += 1
+        current = key & mask
+        current_g = mask - ((key >> shift) & mask)
+        if current_g != g[current]:
+            continue
+        expand(current)
+
+        if current in remaining:
+            reached.append(current)
+            remaining.discard(current)
+            if not all_goals or not remaining:
+                break
+            goals = [divmod(each, width) for each in remaining]
+
+        next_g = current_g + 1
+        for each in neighbours(current):
+            if seen[each] == generation:
+                if g[each] <= next_g:
+                    continue
+                reopened += 1
+            seen[each] = generation
+            g[each] = next_g
+            parent[each] = current
+            push(((next_g + estimate(each)) << f_shift) | ((mask - next_g) << shift) | each)
+            pushes += 1
+        if pushes - pops > max_frontier:
+            max_frontier = pushes - pops
+
+    stats = SearchStats(bool(reached), len(order), pushes, pops, max_frontier, reopened)
+    stats.timings["search"] = time.perf_counter() - start_time
+    return reached, stats
+
+
+def astar_goals(maze, start, goals, all_goals=False, adjacency=None, workspace=None, observer=None, open_list=None):
+    """
+    Solves the maze given for several goals at once using A-Star Search,
+    returns statistics and the paths to the nearest goal or to all of
+    them.
+
+    Args:
+            maze      (Maze): Contains the maze, a list of rows is
+                              also accepted
+            start    (tuple): Position of the starting position
+            goals     (list): Positions of the goals, such as the exits
+                              utils.get_exits returns
+            all_goals (bool): Find the paths to every goal, instead of only
+                              to the nearest
+            adjacency (Adjacency): Optional precomputed index of the maze,
+                              walked instead of the maze when given
+            workspace (Workspace): Optional buffers to reuse from an earlier
+                              query on the same maze
+            observer (callable): Optional observer(event, cell), called on
+                              every stats.EXPAND and stats.PUSH
+            open_list  (str): One of open_list.HEAP, BUCKET and RADIX, or
+                              None for a binary heap
+
+    Returns:
+            paths     (dict): Path from the start to every goal reached,
+                              nearest first, empty if none can be reached.
+            closed     (set): Contains all Nodes explored while trying
+                              to find the paths.
+            stats (SearchStats): Counters and timings of the search,
+                              path_length is that of the shortest path
     """
 
-    # initialize open, closed, step count, and start_time
-    open = []
-    closed = set()
-    steps = 0
-    start_time = time.time()
-
-    # create start_node with no parent and push into heap
-    start_node = Node(None, start, manhattan(start, end))
-    heapq.heappush(open, (start_node.f, start_node))
-
-    # loop while the heap open contains elements
-    while open:
-        # retrieve node with the smallest f value from heap and add it to closed
-        current = heapq.heappop(open)
-        closed.add(current[1].position)
-
-        # check for end goal, print statistics and return if True
-        if current[1].position == end:
-            print("\nA-Star Search:\nNodes explored: %i\nTime taken: %s\nPath length: %i steps"
-                  % (len(closed),
-                     time.time() - start_time,
-                     len(get_path(current[1]))))
-            return get_path(current[1]), closed
-
-        # get neighbours and update path length
-        neighbours = get_neighbours(current[1].position, maze, closed)
-        steps += 1
-
-        # calculate heuristic, push with node into the heap
-        for each in neighbours:
-            f = manhattan(each, end) + steps
-            heapq.heappush(open, (f, Node(parent=current[1], position=each, f=f)))
+    graph = adjacency if adjacency is not None else as_maze(maze)
+    width = graph.width
+    if workspace is None:
+        workspace = Workspace(graph.size)
+
+    targets = [r * width + c for (r, c) in goals]
+    reached, stats = astar_goals_search(graph, start[0] * width + start[1], targets, workspace, observer,
+                                        all_goals, open_list)
+    with stats.timed("path"):
+        paths = {divmod(each, width): trace_path(workspace.parent, each, width) for each in reached}
+    stats.path_length = min((len(path) for path in paths.values()), default=0)
+    return paths, workspace.explored(width), stats
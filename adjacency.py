@@ -0,0 +1,156 @@
+import os
+import struct
+import sys
+from array import array
+
+from maze import OPEN_BYTE
+
+# header of the on-disk index: magic, height, width, number of targets
+_MAGIC = b"MZADJ1\0\0"
+_HEADER = struct.Struct("<8sIIQ")
+
+
+class Adjacency:
+    """
+    Precomputed CSR-style adjacency index of the open cells of a maze.
+
+    The open neighbours of cell i are targets[offsets[i]:offsets[i + 1]],
+    in the same top left right bottom order as Maze.neighbours, so a
+    solver can walk the index in place of the maze. Walls have no
+    neighbours.
+
+    Attributes:
+        height       (int): Number of rows in the maze.
+        width        (int): Number of columns in the maze.
+        size         (int): Total number of cells, height * width.
+        offsets    (array): uint32, size + 1 offsets into targets.
+        targets    (array): uint32, flat indices of neighbouring cells.
+    """
+
+    __slots__ = ("height", "width", "size", "offsets", "targets")
+
+    def __init__(self, height, width, offsets, targets):
+        self.height = height
+        self.width = width
+        self.size = height * width
+        self.offsets = offsets
+        self.targets = targets
+
+    def neighbours(self, index):
+        """
+        Returns the flat indices of the open cells next to the given cell.
+        """
+        offsets = self.offsets
+        return self.targets[offsets[index]:offsets[index + 1]]
+
+    def position(self, index):
+        """
+        Returns the (row, column) position of a flat index.
+        """
+        return divmod(index, self.width)
+
+    def save(self, file_name):
+        """
+        Writes the index to a binary file. The file is written under a
+        temporary name first and then renamed, so processes reading the
+        index never see it half written.
+
+        Args:
+            file_name  (str): Path of the index file
+        """
+
+        temp_name = "%s.%i.tmp" % (file_name, os.getpid())
+        with open(temp_name, "wb") as file:
+            file.write(_HEADER.pack(_MAGIC, self.height, self.width, len(self.targets)))
+            for values in (self.offsets, self.targets):
+                if sys.byteorder == "big":
+                    values = array("I", values)
+                    values.byteswap()
+                values.tofile(file)
+        os.replace(temp_name, file_name)
+
+    @classmethod
+    def load(cls, file_name):
+        """
+        Reads an index written by Adjacency.save.
+
+        Args:
+            file_name    (str): Path of the index file
+
+        Returns:
+            index  (Adjacency): The loaded index
+        """
+
+        with open(file_name, "rb") as file:
+            magic, height, width, count = _HEADER.unpack(file.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError("%s is not an adjacency index" % file_name)
+            offsets = array("I")
+            offsets.fromfile(file, height * width + 1)
+            targets = array("I")
+            targets.fromfile(file, count)
+        if sys.byteorder == "big":
+            offsets.byteswap()
+            targets.byteswap()
+        return cls(height, width, offsets, targets)
+
+
+def build_adjacency(maze):
+    """
+    Builds the adjacency index of all open cells of a maze.
+
+    Args:
+        maze        (Maze): Contains the maze
+
+    Returns:
+        index  (Adjacency): The adjacency index
+    """
+
+    walls = maze.walls
+    neighbours = maze.neighbours
+    offsets = array("I", bytes(4 * (maze.size + 1)))
+    targets = array("I")
+
+    # only open cells have neighbours, jump between them with find()
+    last = 0
+    i = walls.find(OPEN_BYTE)
+    while i >= 0:
+        offsets[last + 1:i + 1] = array("I", [len(targets)]) * (i - last)
+        targets.extend(neighbours(i))
+        last = i
+        i = walls.find(OPEN_BYTE, i + 1)
+
+    offsets[last + 1:] = array("I", [len(targets)]) * (maze.size - last)
+    return Adjacency(maze.height, maze.width, offsets, targets)
+
+
+def cached_adjacency(maze, file_name):
+    """
+    Returns the adjacency index of a maze loaded from file_name, reading
+    it from file_name + ".adj" when that cache is newer than the maze file
+    and building and saving it otherwise.
+
+    Args:
+        maze        (Maze): Contains the maze
+        file_name    (str): The .txt file the maze was read from
+
+    Returns:
+        index  (Adjacency): The adjacency index
+    """
+
+    cache_name = file_name + ".adj"
+    try:
+        if os.path.getmtime(cache_name) >= os.path.getmtime(file_name):
+            index = Adjacency.load(cache_name)
+            if index.height == maze.height and index.width == maze.width:
+                return index
+    except (OSError, ValueError, EOFError):
+        pass
+
+    index = build_adjacency(maze)
+    try:
+        index.save(cache_name)
+    except OSError:
+        # a read-only directory only costs the cache
+        pass
+    return index
@@ -0,0 +1,217 @@
+import random
+import sys
+import time
+
+from a_star import astar_search
+from adjacency import cached_adjacency
+from binary import cached_maze
+from bi_a_star import bi_a_star_search, bi_trace_path
+from depth_first import dfs_search
+from landmarks import cached_landmarks
+from maze import OPEN, OPEN_BYTE, as_maze, trace_path
+from stats import SearchStats
+from workspace import Workspace
+
+ASTAR = "astar"
+BI_A_STAR = "bi_a_star"
+DFS = "dfs"
+ALGORITHMS = (ASTAR, BI_A_STAR, DFS)
+
+
+class BatchSolver:
+    """
+    Answers many routing queries against one loaded maze.
+
+    The maze is loaded and indexed once, and every query reuses the same
+    preallocated search buffers, which are invalidated with a generation
+    counter instead of being cleared. With a cache.PathCache, queries it
+    can answer skip the search entirely.
+
+    Attributes:
+        maze         (Maze): The maze queries are answered on.
+        graph        (Maze): The maze, or its Adjacency index, that is searched.
+        fwd     (Workspace): Buffers of astar, dfs and the forward direction
+                             of bi_a_star.
+        bwd     (Workspace): Buffers of the backward direction of bi_a_star,
+                             allocated on first use.
+        timings      (dict): Seconds spent loading the maze ("load") and its
+                             index ("index"), when loaded by from_file.
+        stats (SearchStats): Counters and timings of the last query, None
+                             before the first.
+        cache   (PathCache): Optional cache of solved paths, shared with
+                             other solvers if needed.
+        heuristic (callable): Optional heuristic of astar and bi_a_star,
+                             such as landmarks.Landmarks.
+    """
+
+    def __init__(self, maze, adjacency=None, cache=None, heuristic=None):
+        self.maze = as_maze(maze)
+        self.graph = adjacency if adjacency is not None else self.maze
+        self.fwd = Workspace(self.maze.size)
+        self.bwd = None
+        self.timings = {}
+        self.stats = None
+        self.cache = cache
+        self.heuristic = heuristic
+
+    @classmethod
+    def from_file(cls, file_name, index=True, cache=None, landmarks=0):
+        """
+        Loads a maze file once, through its binary cache, along with its
+        cached adjacency index and landmark tables.
+
+        Args:
+            file_name      (str): The .txt file of the maze to be read
+            index         (bool): Whether to search the adjacency index,
+                                  built and cached next to the file if needed
+            cache    (PathCache): Optional cache of solved paths
+            landmarks      (int): Number of landmarks whose ALT heuristic
+                                  astar and bi_a_star use, built and cached
+                                  next to the file if needed, 0 for none
+
+        Returns:
+            solver (BatchSolver): Solver for queries on the maze
+        """
+
+        start_time = time.perf_counter()
+        maze = cached_maze(file_name)
+        loaded = time.perf_counter()
+        adjacency = cached_adjacency(maze, file_name) if index else None
+        indexed = time.perf_counter()
+        heuristic = cached_landmarks(maze, file_name, landmarks) if landmarks else None
+        solver = cls(maze, adjacency, cache, heuristic)
+        solver.timings = {"load": loaded - start_time, "index": indexed - loaded}
+        if landmarks:
+            solver.timings["landmarks"] = time.perf_counter() - indexed
+        return solver
+
+    def solve(self, queries, algorithm=ASTAR, observer=None):
+        """
+        Solves every (start, end) pair of queries in turn, yielding each
+        result as soon as it is found. A start or end outside the maze or
+        on a wall raises ValueError when its query is reached.
+
+        Args:
+            queries   (iterable): (start, end) position pairs
+            algorithm      (str): One of ASTAR, BI_A_STAR and DFS
+            observer  (callable): Optional observer(event, cell), called on
+                                  every stats.EXPAND and stats.PUSH
+
+        Yields:
+            start        (tuple): Position of the starting position
+            end          (tuple): Position of the end position
+            path          (list): Path from start to end, empty if the end
+                                  cannot be reached
+        """
+
+        if algorithm not in ALGORITHMS:
+            raise ValueError("unknown algorithm %r, expected one of %s" % (algorithm, ", ".join(ALGORITHMS)))
+        if algorithm == BI_A_STAR and self.bwd is None:
+            self.bwd = Workspace(self.maze.size)
+
+        maze = self.maze
+        graph = self.graph
+        width = maze.width
+        fwd = self.fwd
+        cache = self.cache
+        heuristic = self.heuristic
+        digest = cache.digest(maze) if cache is not None else None
+        for (start, end) in queries:
+            for position in (start, end):
+                if not maze.in_bounds(position) or maze.is_wall(position):
+                    raise ValueError("%r is not an open cell of the %i x %i maze"
+                                     % (tuple(position), maze.height, maze.width))
+            source = start[0] * width + start[1]
+            target = end[0] * width + end[1]
+            if cache is not None:
+                start_time = time.perf_counter()
+                cells = cache.get(digest, algorithm, source, target)
+                if cells is not None:
+                    path = [divmod(i, width) for i in cells]
+                    stats = SearchStats(found=bool(path))
+                    stats.path_length = len(path)
+                    stats.timings["cache"] = time.perf_counter() - start_time
+                    self.stats = stats
+                    yield start, end, path
+                    continue
+
+            if algorithm == BI_A_STAR:
+                bi = bi_a_star_search(graph, source, target, fwd, self.bwd, observer=observer, heuristic=heuristic)
+                stats = bi.stats
+                path = bi_trace_path(bi, width)
+            else:
+                if algorithm == ASTAR:
+                    stats = astar_search(graph, source, target, fwd, observer, heuristic)
+                else:
+                    stats = dfs_search(graph, source, target, fwd, observer)
+                path = trace_path(fwd.parent, target, width) if stats.found else []
+            stats.path_length = len(path)
+            if cache is not None:
+                cache.put(digest, algorithm, source, target, [r * width + c for (r, c) in path])
+            self.stats = stats
+            yield start, end, path
+
+
+def random_queries(maze, count, seed=0):
+    """
+    Picks random (start, end) pairs of open cells of a maze.
+
+    Args:
+        maze      (Maze): Contains the maze
+        count      (int): Number of pairs to pick
+        seed       (int): Seed of the random generator
+
+    Returns:
+        queries   (list): (start, end) position pairs
+    """
+
+    rng = random.Random(seed)
+    if maze.walls.find(OPEN_BYTE) < 0:
+        raise ValueError("maze has no open cells")
+
+    def open_cell():
+        while True:
+            i = rng.randrange(maze.size)
+            if maze.walls[i] == OPEN:
+                return maze.position(i)
+
+    return [(open_cell(), open_cell()) for _ in range(count)]
+
+
+def throughput(solver, queries, algorithm=ASTAR):
+    """
+    Solves all queries and measures how many were answered per second.
+
+    Args:
+        solver (BatchSolver): Solver for queries on the maze
+        queries       (list): (start, end) position pairs
+        algorithm      (str): One of ASTAR, BI_A_STAR and DFS
+
+    Returns:
+        rate         (float): Queries answered per second
+    """
+
+    start_time = time.perf_counter()
+    for _ in solver.solve(queries, algorithm):
+        pass
+    return len(queries) / (time.perf_counter() - start_time)
+
+
+if __name__ == '__main__':
+    # usage: python batch.py [maze file] [number of queries]
+    file_name = sys.argv[1] if len(sys.argv) > 1 else "maze-VLarge.txt"
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    solver = BatchSolver.from_file(file_name)
+    queries = random_queries(solver.maze, count)
+    for algorithm in ALGORITHMS:
+        print("%s: %.1f queries/sec over %i queries on %s"
+              % (algorithm, throughput(solver, queries, algorithm), count, file_name))
+
+    # the same queries again, answered from a path cache after the first pass
+    from cache import PathCache
+    solver.cache = PathCache()
+    for algorithm in ALGORITHMS:
+        throughput(solver, queries, algorithm)
+        print("%s, cached: %.1f queries/sec" % (algorithm, throughput(solver, queries, algorithm)))
+    print("cache: %s" % ", ".join("%s %i" % item for item in solver.cache.counters().items()))
@@ -0,0 +1,302 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+from a_star import astar_search
+from adjacency import build_adjacency, cached_adjacency
+from bi_a_star import bi_a_star_search, bi_trace_path
+from depth_first import dfs_search
+from distance import distance_field
+from jps import jps_path, jps_search
+from generator import ALGORITHMS as GENERATORS, BACKTRACKER, generate_maze
+from maze import load_maze, trace_path
+from open_list import OPEN_LISTS
+from stats import percentile
+from workspace import Workspace
+
+MAZE_FILES = ("maze-Easy.txt", "maze-Medium.txt", "maze-Large.txt", "maze-VLarge.txt")
+
+# (height, width) of the seeded synthetic mazes
+SYNTHETIC_SIZES = ((255, 255), (1023, 1023))
+SYNTHETIC_SEED = 0
+
+# relative slowdown of the median time allowed before a result counts as a regression
+TOLERANCE = 0.25
+
+
+def run_astar(maze, graph, source, target, fwd, bwd, open_list=None):
+    stats = astar_search(graph, source, target, fwd, open_list=open_list)
+    stats.path_length = len(trace_path(fwd.parent, target, maze.width)) if stats.found else 0
+    return stats
+
+
+def run_bi_a_star(maze, graph, source, target, fwd, bwd, open_list=None):
+    bi = bi_a_star_search(graph, source, target, fwd, bwd, open_list=open_list)
+    bi.stats.path_length = len(bi_trace_path(bi, maze.width))
+    return bi.stats
+
+
+def run_dfs(maze, graph, source, target, fwd, bwd, open_list=None):
+    stats = dfs_search(graph, source, target, fwd)
+    stats.path_length = len(trace_path(fwd.parent, target, maze.width)) if stats.found else 0
+    return stats
+
+
+def run_jps(maze, graph, source, target, fwd, bwd, open_list=None):
+    # jumps scan the wall bitmap, so jps always searches the maze itself
+    stats = jps_search(maze, source, target, fwd)
+    stats.path_length = len(jps_path(fwd, target, maze.width)) if stats.found else 0
+    return stats
+
+
+def run_bfs_field(maze, graph, source, target, fwd, bwd, open_list=None):
+    # the sweep works on the grid, so it always searches the maze itself
+    field = distance_field(maze, source, target)
+    field.stats.path_length = len(field.path_to(maze.end))
+    return field.stats
+
+
+# every solver run takes (maze, graph, source, target, fwd, bwd, open_list) and returns
+# its SearchStats, open_list only applies to astar and bi_a_star
+SOLVERS = {
+    "astar": run_astar,
+    "bi_a_star": run_bi_a_star,
+    "dfs": run_dfs,
+    "jps": run_jps,
+    "bfs_field": run_bfs_field,
+}
+
+
+def bench(name, maze, graph, solver, repeat=5, warmup=1, open_list=None):
+    """
+    Times one solver from the start to the end of one maze.
+
+    The timed runs reuse one pair of workspaces, as a long-running service
+    would. Peak memory is measured with tracemalloc in a separate run, with
+    its own workspaces, so tracing does not slow down the timed runs.
+
+    Args:
+        name       (str): Name of the maze in the report
+        maze      (Maze): The maze to solve
+        graph     (Maze): The maze, or its Adjacency index, that is searched
+        solver     (str): One of SOLVERS
+        repeat     (int): Number of timed runs
+        warmup     (int): Number of untimed runs before them
+        open_list  (str): Open list of astar and bi_a_star, from
+                          open_list.OPEN_LISTS, None to pick automatically
+
+    Returns:
+        result    (dict): Timings and search statistics of the solver
+    """
+
+    run = SOLVERS[solver]
+    width = maze.width
+    source = maze.start[0] * width + maze.start[1]
+    target = maze.end[0] * width + maze.end[1]
+    fwd = Workspace(maze.size)
+    bwd = Workspace(maze.size)
+
+    for _ in range(warmup):
+        run(maze, graph, source, target, fwd, bwd, open_list)
+
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        stats = run(maze, graph, source, target, fwd, bwd, open_list)
+        times.append(time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    try:
+        run(maze, graph, source, target, Workspace(maze.size), Workspace(maze.size), open_list)
+        (_, peak) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "maze": name,
+        "solver": solver,
+        "cells": maze.size,
+        "repeat": repeat,
+        "median": statistics.median(times),
+        "p95": percentile(times, 95),
+        "min": min(times),
+        "expanded": stats.expanded,
+        "pushes": stats.pushes,
+        "pops": stats.pops,
+        "max_frontier": stats.max_frontier,
+        "reopened": stats.reopened,
+        "peak_memory": peak,
+        "path_length": stats.path_length,
+    }
+
+
+def benchmark_mazes(files=MAZE_FILES, sizes=SYNTHETIC_SIZES, seed=SYNTHETIC_SEED,
+                    algorithm=BACKTRACKER, braid=0.0):
+    """
+    Loads the maze files and generates the synthetic mazes to benchmark on.
+
+    Args:
+        files    (tuple): .txt files of the mazes, missing files are skipped
+        sizes    (tuple): (height, width) of every synthetic maze
+        seed       (int): Seed of the synthetic mazes
+        algorithm  (str): generator algorithm of the synthetic mazes
+        braid    (float): Share of the dead ends of the synthetic mazes
+                          opened into loops
+
+    Yields:
+        name       (str): Name of the maze in the report
+        maze      (Maze): The maze
+        file_name  (str): The .txt file of the maze, None for synthetic mazes
+        load     (float): Seconds spent loading or generating the maze
+    """
+
+    for file_name in files:
+        if os.path.exists(file_name):
+            start_time = time.perf_counter()
+            maze = load_maze(file_name)
+            yield os.path.basename(file_name), maze, file_name, time.perf_counter() - start_time
+    for (height, width) in sizes:
+        start_time = time.perf_counter()
+        maze = generate_maze(height, width, algorithm, seed, braid)
+        name = "%s-%ix%i-%i" % (algorithm, height, width, seed)
+        if braid:
+            name += "-braid%g" % braid
+        yield name, maze, None, time.perf_counter() - start_time
+
+
+def run_suite(mazes, solvers=tuple(SOLVERS), repeat=5, warmup=1, index=False, open_list=None):
+    """
+    Benchmarks every solver on every maze.
+
+    Args:
+        mazes  (iterable): (name, maze, file name, load time) tuples, as
+                           yielded by benchmark_mazes
+        solvers   (tuple): Solvers to run, from SOLVERS
+        repeat      (int): Number of timed runs per solver and maze
+        warmup      (int): Number of untimed runs before them
+        index      (bool): Whether to search the adjacency index of every maze
+        open_list   (str): Open list of astar and bi_a_star, None to pick
+                           automatically
+
+    Returns:
+        report     (dict): Environment, settings and one result per solver
+                           and maze, ready to be written as JSON
+    """
+
+    results = []
+    for (name, maze, file_name, load) in mazes:
+        start_time = time.perf_counter()
+        graph = maze
+        if index:
+            graph = cached_adjacency(maze, file_name) if file_name else build_adjacency(maze)
+        timings = {"load": load, "index": time.perf_counter() - start_time}
+        for solver in solvers:
+            result = bench(name, maze, graph, solver, repeat, warmup, open_list)
+            result.update(timings)
+            results.append(result)
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "warmup": warmup,
+        "index": index,
+        "open_list": open_list,
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance=TOLERANCE):
+    """
+    Compares a report against a saved baseline report.
+
+    A result regresses when its median time grows by more than the
+    tolerance, or when it expands or pushes more nodes than before, which
+    the solvers do deterministically. Results missing from either report
+    are ignored.
+
+    Args:
+        report     (dict): Report of the current run
+        baseline   (dict): Report saved from an earlier run
+        tolerance (float): Relative slowdown of the median time allowed
+
+    Returns:
+        regressions (list): Description of every regression found
+    """
+
+    saved = {(each["maze"], each["solver"]): each for each in baseline["results"]}
+    regressions = []
+    for each in report["results"]:
+        old = saved.get((each["maze"], each["solver"]))
+        if old is None:
+            continue
+        label = "%s on %s" % (each["solver"], each["maze"])
+        if each["median"] > old["median"] * (1 + tolerance):
+            regressions.append("%s: median %.4f s, was %.4f s" % (label, each["median"], old["median"]))
+        for key in ("expanded", "pushes"):
+            if each[key] > old[key]:
+                regressions.append("%s: %s %i, was %i" % (label, key, each[key], old[key]))
+    return regressions
+
+
+def print_report(report):
+    """
+    Prints one line per result of a report.
+    """
+
+    print("%-28s %-10s %10s %10s %10s %10s %12s %8s"
+          % ("maze", "solver", "median s", "p95 s", "expanded", "pushes", "peak bytes", "path"))
+    for each in report["results"]:
+        print("%-28s %-10s %10.4f %10.4f %10i %10i %12i %8i"
+              % (each["maze"], each["solver"], each["median"], each["p95"], each["expanded"],
+                 each["pushes"], each["peak_memory"], each["path_length"]))
+
+
+def parse_size(text):
+    (height, _, width) = text.partition("x")
+    return int(height), int(width or height)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks the maze solvers.")
+    parser.add_argument("mazes", nargs="*", default=list(MAZE_FILES), help="maze .txt files")
+    parser.add_argument("--solvers", nargs="+", choices=tuple(SOLVERS), default=list(SOLVERS))
+    parser.add_argument("--synthetic", nargs="*", type=parse_size, default=list(SYNTHETIC_SIZES),
+                        metavar="HxW", help="sizes of the synthetic mazes")
+    parser.add_argument("--seed", type=int, default=SYNTHETIC_SEED, help="seed of the synthetic mazes")
+    parser.add_argument("--generator", choices=GENERATORS, default=BACKTRACKER,
+                        help="algorithm generating the synthetic mazes")
+    parser.add_argument("--braid", type=float, default=0.0,
+                        help="share of dead ends of the synthetic mazes opened into loops")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per solver and maze")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs before them")
+    parser.add_argument("--index", action="store_true", help="search the adjacency index")
+    parser.add_argument("--open-list", choices=tuple(OPEN_LISTS),
+                        help="open list of astar and bi_a_star, picked from the heuristic by default")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a report saved with --output")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="relative slowdown of the median allowed, default %(default)s")
+    args = parser.parse_args()
+
+    report = run_suite(benchmark_mazes(args.mazes, args.synthetic, args.seed, args.generator, args.braid),
+                       args.solvers, args.repeat, args.warmup, args.index, args.open_list)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(report, json.load(file), args.tolerance)
+        for each in regressions:
+            print("regression: " + each)
+        if regressions:
+            sys.exit(1)
+        print("no regressions against " + args.baseline)
@@ -1,276 +1,400 @@
 # -*- coding: utf-8 -*-
-import time
-import heapq
 import math
+import sys
+import time
+
+from maze import as_maze, trace_path
+from open_list import make_open_list
+from stats import CHECK_EVERY, EXPAND, PUSH, SearchStats, observed
+from workspace import Workspace
 
 FROM_START = 1
 FROM_END = 2
 
+# how bi_a_star picks the direction to expand next
+BALANCE_FRONTIER = "frontier"
+BALANCE_F = "f"
+
 
 class BiStruct:
     """
     To keep a collection of nodes and maze data, to assist
     with the search algorithm
 
+    Open list entries are single ints packing f, g and the cell index,
+    (f << f_shift) | ((mask - g) << shift) | index, as in a_star.astar.
+
     Attributes:
-        start_time     (time): Marks the start of the function runtime.
-        fwd_open       (heap): Open list for the search for direction FROM_START.
-        bwd_open       (heap): Open list for the search for direction FROM_END.
-        fwd_parents    (dict): Stores parents of nodes for direction FROM_START.
-        bwd_parents    (dict): Stores parents of nodes for direction FROM_END.
-        fwd_visited     (set): Stores the visited nodes for direction FROM_START.
-        bwd_visited     (set): Stores the visited nodes for direction FROM_END.
-        start         (Tuple): The starting position of the maze (row, column).
-        end           (Tuple): The end (goal) position of the maze (row, column).
+        fwd_open   (open list): Open list for the search for direction FROM_START.
+        bwd_open   (open list): Open list for the search for direction FROM_END.
+        fwd        (Workspace): g-costs, parents and expansion order of the
+                                search for direction FROM_START.
+        bwd        (Workspace): g-costs, parents and expansion order of the
+                                search for direction FROM_END.
+        start            (int): Flat index of the starting position of the maze.
+        end              (int): Flat index of the end (goal) position of the maze.
+        best       (int/float): Cost of the best path found so far, math.inf if none.
+        meeting          (int): Cell where the best path found so far crosses
+                                from one search to the other, -1 if none.
+        pushes           (int): Number of open list pushes by both directions.
+        reopened         (int): Number of pushes of cells already on an open
+                                list, after a cheaper g was found.
+        max_frontier     (int): Largest size of both open lists together.
+        stats    (SearchStats): Counters and timings, set once the search ends.
+        balance          (str): BALANCE_FRONTIER or BALANCE_F, how bi_run picks
+                                the direction to expand next.
+        done            (bool): Whether the search has finished.
+        fwd_estimate (callable): Estimate of the steps from a cell to the end,
+                                None for the Manhattan distance.
+        bwd_estimate (callable): Estimate of the steps from a cell to the start,
+                                None for the Manhattan distance.
     """
 
-    # default constructor with default values if unset
-    def __init__(self, start_time=time.time(), start=(0, 0), end=(0, 0), fwd_target=(0, 0), bwd_target=(0, 0),
-                 fwd_current=(0, 0), bwd_current=(0, 0)):
-        self.start_time = start_time
+    def __init__(self, size, start, end, fwd=None, bwd=None, observer=None, heuristic=None, open_list=None,
+                 balance=BALANCE_FRONTIER):
+        self.shift = size.bit_length()
+        self.f_shift = 2 * self.shift
+        self.mask = (1 << self.shift) - 1
 
-        self.fwd_open = []
-        self.bwd_open = []
+        self.fwd_open = make_open_list(open_list, self.f_shift, heuristic)
+        self.bwd_open = make_open_list(open_list, self.f_shift, heuristic)
 
-        # takes care of path
-        self.fwd_steps = 0
-        self.bwd_steps = 0
-
-        self.fwd_parents = {}
-        self.bwd_parents = {}
-
-        self.fwd_visited = set()
-        self.bwd_visited = set()
-
-        self.fwd_current = fwd_current
-        self.bwd_current = bwd_current
-        self.fwd_target = fwd_target
-        self.bwd_target = bwd_target
+        # per-cell buffers, reused from an earlier query when given
+        self.fwd = fwd if fwd is not None else Workspace(size)
+        self.bwd = bwd if bwd is not None else Workspace(size)
+        self.fwd.reset()
+        self.bwd.reset()
 
         self.start = start
         self.end = end
 
+        self.best = math.inf
+        self.meeting = -1
 
-def bi_a_star(maze, start, end):
-    """
-    Solves the given maze by applying the bidirectional A* search algorithm
+        self.pushes = 0
+        self.reopened = 0
+        self.max_frontier = 0
+        self.stats = None
+        self.balance = balance
+        self.done = False
 
-    Args:
-        maze   (2-d list): Contains the maze
-        start     (tuple): Position of the starting position
-        end       (tuple): Position of the end position
+        self.fwd_estimate = heuristic(end) if heuristic is not None else None
+        self.bwd_estimate = heuristic(start) if heuristic is not None else None
 
-    Returns:
-        path       (list): Contains all the tiles traversed from the
-                           start node in order to reach the end node.
-        closed      (set): Contains all Nodes explored while trying
-                           to find the path.
-    """
+        self.observe(observer)
 
-    # initialize BiStruct, add start and end to visited, push into open list, set parents
-    bi = BiStruct(start=start, end=end, fwd_target=end, bwd_target=start, fwd_current=start, bwd_current=end)
+    def observe(self, observer):
+        """
+        Sets the observer(event, cell) called on every later stats.EXPAND
+        and stats.PUSH, None for none.
+        """
 
-    # search forwards
-    bi.fwd_visited.add(start)
-    heapq.heappush(bi.fwd_open, (heuristic(start, end, start, FROM_START), start))
-    bi.fwd_parents[start] = None
+        # open list push and expand of both directions, wrapped only when observed
+        mask = self.mask
+        self.fwd_push = observed(self.fwd_open.push, observer, PUSH, lambda key: key & mask)
+        self.bwd_push = observed(self.bwd_open.push, observer, PUSH, lambda key: key & mask)
+        self.fwd_expand = observed(self.fwd.order.append, observer, EXPAND)
+        self.bwd_expand = observed(self.bwd.order.append, observer, EXPAND)
 
-    # search backwards
-    bi.bwd_visited.add(end)
-    heapq.heappush(bi.bwd_open, (heuristic(end, start, end, FROM_END), end))
-    bi.bwd_parents[end] = None
+    @property
+    def expanded(self):
+        """
+        Number of cells expanded by both directions.
+        """
+        return len(self.fwd.order) + len(self.bwd.order)
 
-    while bi.fwd_open and bi.bwd_open:
-        # check for intersections, return path if found
 
-        # explore FROM_START to end
-        intersection = explore_neighbours(bi, FROM_START, maze)
-        if intersection:
-            return bi_get_path(bi, intersection)
+def bi_a_star_search(graph, source, target, fwd=None, bwd=None, balance=BALANCE_FRONTIER, observer=None,
+                     heuristic=None, open_list=None):
+    """
+    Runs bidirectional A* search between two cells.
+
+    Each direction is an A* search towards the other end, with the Manhattan
+    heuristic unless another one is given. Whenever a cell reached by one direction already has a
+    g-cost from the other, the cost of the path through it is recorded.
+    The search stops only once the lowest f on either open list is at least
+    the best cost recorded, at which point no cheaper path can exist.
 
-        # explore FROM_END to start
-        intersection = explore_neighbours(bi, FROM_END, maze)
-        if intersection:
-            return bi_get_path(bi, intersection)
+    Args:
+        graph          (Maze): Contains the maze, or its Adjacency index
+        source          (int): Flat index of the starting position
+        target          (int): Flat index of the end position
+        fwd       (Workspace): Optional buffers for direction FROM_START
+        bwd       (Workspace): Optional buffers for direction FROM_END, must
+                               not be the same as fwd
+        balance         (str): BALANCE_FRONTIER expands the direction with the
+                               smaller open list, BALANCE_F the direction with
+                               the lower minimum f
+        observer   (callable): Optional observer(event, cell), called on
+                               every stats.EXPAND and stats.PUSH
+        heuristic  (callable): Optional heuristic(target) returning an
+                               admissible estimate(index) of the steps to
+                               target, such as landmarks.Landmarks
+        open_list       (str): One of open_list.HEAP, BUCKET and RADIX, or
+                               None to pick one for the heuristic
+
+    Returns:
+        bi         (BiStruct): The finished search, with the best path cost,
+                               meeting cell and stats
+    """
 
-    return "Path not found!"
+    start_time = time.perf_counter()
+    bi = BiStruct(graph.size, source, target, fwd=fwd, bwd=bwd, observer=observer, heuristic=heuristic,
+                  open_list=open_list, balance=balance)
+    bi_start(bi, graph)
+    bi_run(bi, graph)
+    bi.stats = bi_stats(bi)
+    bi.stats.timings["search"] = time.perf_counter() - start_time
+    return bi
 
 
-def heuristic(start, target, current, direction):
+def bi_start(bi: BiStruct, graph):
     """
-    Calculates heuristics depending on the direction
-    The so-called "average function" by Goldberg.
+    Sets the g-costs of the start and end and pushes them onto the open
+    lists of their directions.
 
     Args:
-        start     (tuple): The starting position of the maze (row, column).
-        target    (tuple): Target position
-        current   (tuple): Contains the current Node's position
-        direction   (int): To distinguish between the 2 directions (FROM_START, FROM_END)
+        bi        (BiStruct): The search, freshly created
+        graph         (Maze): Contains the maze or its Adjacency index
     """
 
-    fwd = math.sqrt((current[0] - target[1]) ** 2 + (current[1] - target[1]) ** 2)
-    bwd = math.sqrt((start[0] - current[0]) ** 2 + (start[1] - current[1]) ** 2)
-    heur_value = (fwd - bwd) / 2.0
+    width = graph.width
+    (source, target) = (bi.start, bi.end)
+    start = divmod(source, width)
+    end = divmod(target, width)
+    distance = abs(start[0] - end[0]) + abs(start[1] - end[1])
+    top_g = bi.mask << bi.shift
 
-    if direction == FROM_START:
-        return abs(heur_value)
-    else:
-        return -abs(heur_value)
+    # search forwards
+    bi.fwd.seen[source] = bi.fwd.generation
+    bi.fwd.g[source] = 0
+    bi.fwd.parent[source] = -1
+    h = distance if bi.fwd_estimate is None else bi.fwd_estimate(source)
+    bi.fwd_push((h << bi.f_shift) | top_g | source)
 
+    # search backwards
+    bi.bwd.seen[target] = bi.bwd.generation
+    bi.bwd.g[target] = 0
+    bi.bwd.parent[target] = -1
+    h = distance if bi.bwd_estimate is None else bi.bwd_estimate(target)
+    bi.bwd_push((h << bi.f_shift) | top_g | target)
+    bi.pushes = 2
+    bi.max_frontier = 2
 
-def explore_neighbours(struct: BiStruct, direction, maze):
-    """ 
-    Explore all valid neighbours, store in open lists, visited, and append parents
+    if source == target:
+        bi.best = 0
+        bi.meeting = source
 
-    Args:
-        struct    (BiStruct): A collection of Node and maze data
-        direction      (int): To distinguish between the 2 directions (FROM_START, FROM_END)
-        maze      (2-d list): Contains the maze, used to check if position is valid
 
-    Returns:
-        nodes        (tuple): If found, the intersection node.
+def bi_run(bi: BiStruct, graph, limit=None, deadline=None):
     """
+    Runs a started search until it finishes, or pauses it once limit more
+    cells were popped or time.perf_counter() passes deadline, which is
+    only read every stats.CHECK_EVERY pops.
 
-    if direction == FROM_START:
-        current = heapq.heappop(struct.fwd_open)
-        struct.fwd_target = struct.bwd_current
-        nodes = get_neighbours(current[1], struct, maze, struct.fwd_visited)
-
-        # if a tuple is returned, an intersection is found
-        if isinstance(nodes, tuple):
-            return nodes
+    Args:
+        bi        (BiStruct): The search, started by bi_start
+        graph         (Maze): Contains the maze or its Adjacency index
+        limit          (int): Optional number of cells to pop
+        deadline     (float): Optional time.perf_counter() to pause at
 
-        struct.fwd_steps += 1
-        for each in nodes:
-            # g = manhattan(current[1], struct.fwd_target, FROM_START)
-            g = heuristic(struct.bwd_target, struct.fwd_target, current[1], FROM_START)
-            f = g + struct.fwd_steps
+    Returns:
+        done          (bool): Whether the search has finished
+    """
 
-            heapq.heappush(struct.fwd_open, (f, each))
-            struct.fwd_visited.add(each)
-            struct.fwd_parents[each] = current[1]
+    width = graph.width
+    start = divmod(bi.start, width)
+    end = divmod(bi.end, width)
+    f_shift = bi.f_shift
+    fwd_open = bi.fwd_open
+    bwd_open = bi.bwd_open
+    by_f = bi.balance == BALANCE_F
+    max_frontier = bi.max_frontier
+
+    # pause once popped reaches stop, looking at the clock every CHECK_EVERY pops
+    popped = 0
+    stop = limit if limit is not None else sys.maxsize
+    pause = stop if deadline is None else min(stop, CHECK_EVERY)
+
+    bi.done = True
+    while fwd_open and bwd_open:
+        # stop once neither frontier can lead to a cheaper path
+        fwd_top = fwd_open.peek()
+        bwd_top = bwd_open.peek()
+        if max(fwd_top >> f_shift, bwd_top >> f_shift) >= bi.best:
+            break
+
+        if popped >= pause:
+            if popped >= stop or time.perf_counter() >= deadline:
+                bi.done = False
+                break
+            pause = min(stop, popped + CHECK_EVERY)
+        popped += 1
+
+        # expand the smaller frontier, or the one with the lower f
+        fwd_size = len(fwd_open)
+        bwd_size = len(bwd_open)
+        if fwd_size + bwd_size > max_frontier:
+            max_frontier = fwd_size + bwd_size
+        if fwd_top <= bwd_top if by_f else fwd_size <= bwd_size:
+            explore_neighbours(bi, FROM_START, graph, end)
+        else:
+            explore_neighbours(bi, FROM_END, graph, start)
+
+    bi.max_frontier = max(max_frontier, len(fwd_open) + len(bwd_open)) if bi.done else max_frontier
+    return bi.done
+
+
+def bi_stats(bi: BiStruct):
+    """
+    Returns the counters of a search so far, without timings.
+    """
+    return SearchStats(bi.meeting != -1, bi.expanded, bi.pushes,
+                       bi.pushes - len(bi.fwd_open) - len(bi.bwd_open), bi.max_frontier, bi.reopened)
 
-        # set current node so that FROM_END works towards the intersection
-        struct.fwd_current = current[1]
 
-    else:
-        current = heapq.heappop(struct.bwd_open)
-        struct.bwd_target = struct.fwd_current
-        nodes = get_neighbours(current[1], struct, maze, struct.bwd_visited)
-        struct.bwd_steps += 1
+def bi_a_star(maze, start, end, adjacency=None, balance=BALANCE_FRONTIER, workspaces=None, observer=None,
+              heuristic=None, open_list=None):
+    """
+    Solves the given maze by applying the bidirectional A* search algorithm
 
-        # if a tuple is returned, an intersection is found
-        if isinstance(nodes, tuple):
-            return nodes
+    Args:
+        maze       (Maze): Contains the maze, a list of rows is
+                           also accepted
+        start     (tuple): Position of the starting position
+        end       (tuple): Position of the end position
+        adjacency (Adjacency): Optional precomputed index of the maze,
+                           walked instead of the maze when given
+        balance     (str): BALANCE_FRONTIER expands the direction with the
+                           smaller open list, BALANCE_F the direction with
+                           the lower minimum f
+        workspaces (tuple): Optional pair of Workspaces to reuse from an
+                           earlier query, one per direction
+        observer (callable): Optional observer(event, cell), called on
+                           every stats.EXPAND and stats.PUSH
+        heuristic (callable): Optional heuristic(target) returning an
+                           admissible estimate(index), such as
+                           landmarks.Landmarks, Manhattan when None
+        open_list   (str): One of open_list.HEAP, BUCKET and RADIX, or
+                           None to pick one for the heuristic
 
-        for each in nodes:
-            g = heuristic(struct.bwd_target, struct.fwd_target, current[1], FROM_END)
-            # g = manhattan(current[1], struct.bwd_target, FROM_START)
-            f = g + struct.bwd_steps
+    Returns:
+        path       (list): Contains all the tiles traversed from the
+                           start node in order to reach the end node.
+        closed      (set): Contains all Nodes explored while trying
+                           to find the path.
+        stats (SearchStats): Counters and timings of the search
+    """
 
-            heapq.heappush(struct.bwd_open, (f, each))
-            struct.bwd_visited.add(each)
-            struct.bwd_parents[each] = current[1]
+    graph = adjacency if adjacency is not None else as_maze(maze)
+    width = graph.width
+    (fwd, bwd) = workspaces if workspaces is not None else (None, None)
 
-        struct.bwd_current = current[1]
+    bi = bi_a_star_search(graph, start[0] * width + start[1], end[0] * width + end[1], fwd, bwd, balance, observer,
+                          heuristic, open_list)
+    with bi.stats.timed("path"):
+        path, all_visited = bi_get_path(bi, width)
+    bi.stats.path_length = len(path)
+    return path, all_visited, bi.stats
 
 
-def get_neighbours(current, struct: BiStruct, maze, visited):
+def explore_neighbours(struct: BiStruct, direction, graph, target):
     """
-    Check and return intersection if found, else filter and return
-     all valid neighbours of the current Node
+    Expands the cell with the lowest f in the given direction, pushing
+    every neighbour reached with a cheaper g and recording paths that
+    meet the other direction.
 
     Args:
-        current        (tuple): Contains the current Node's position
-        struct      (BiStruct): A collection of node and maze data
-        maze        (2-d list): Contains the maze
-        visited          (set): Current direction's visited nodes.
-    Returns:
-        each           (tuple): If found, the intersection node
-        neighbours      (list): Contains a list of valid neighbours
-
+        struct    (BiStruct): A collection of Node and maze data
+        direction      (int): To distinguish between the 2 directions (FROM_START, FROM_END)
+        graph         (Maze): Contains the maze or its Adjacency index, used
+                              to list the valid positions next to a Node
+        target       (tuple): Position this direction is searching towards
     """
 
-    r = current[0]
-    c = current[1]
-
-    # top right left bottom priority, but doesn't matter for A*
-    all_neighbours = [(r - 1, c),
-                      (r, c + 1),
-                      (r, c - 1),
-                      (r + 1, c), ]
-    neighbours = []
-
-    # filters valid neighbours
-    for each in all_neighbours:
-        # if node has been visited by both directions, return intersection
-        if each in struct.fwd_visited and each in struct.bwd_visited:
-            return each
-        if each in visited:
-            continue
-        if each[0] < 0 or each[0] > len(maze) - 1:  # row bounds check
-            continue
-        if each[1] < 0 or each[1] > len(maze[0]) - 1:  # column bounds check
-            continue
-        if maze[each[0]][each[1]] == '#':
-            continue
-        # no intersection, return list of valid neighbours
-        neighbours.append(each)
-    return neighbours
-
-
-# an average of 0.5 seconds on VLarge
-def manhattan(current, end, direction):
+    if direction == FROM_START:
+        open, own, other, expand = struct.fwd_open, struct.fwd, struct.bwd, struct.fwd_expand
+        (push, estimate) = (struct.fwd_push, struct.fwd_estimate)
+    else:
+        open, own, other, expand = struct.bwd_open, struct.bwd, struct.fwd, struct.bwd_expand
+        (push, estimate) = (struct.bwd_push, struct.bwd_estimate)
+    g, parents, seen, generation = own.g, own.parent, own.seen, own.generation
+    other_g, other_seen, other_generation = other.g, other.seen, other.generation
+
+    shift = struct.shift
+    f_shift = struct.f_shift
+    mask = struct.mask
+
+    # pop the lowest f, skip entries outdated by a cheaper g
+    key = open.pop()
+    current = key & mask
+    current_g = mask - ((key >> shift) & mask)
+    if current_g != g[current]:
+        return
+    expand(current)
+
+    width = graph.width
+    (target_r, target_c) = target
+    next_g = current_g + 1
+    for each in graph.neighbours(current):
+        if seen[each] == generation:
+            if g[each] <= next_g:
+                continue
+            struct.reopened += 1
+        seen[each] = generation
+        g[each] = next_g
+        parents[each] = current
+
+        # the other direction has reached this cell, record the path through it
+        if other_seen[each] == other_generation and next_g + other_g[each] < struct.best:
+            struct.best = next_g + other_g[each]
+            struct.meeting = each
+
+        if estimate is None:
+            (r, c) = divmod(each, width)
+            f = next_g + abs(r - target_r) + abs(c - target_c)
+        else:
+            f = next_g + estimate(each)
+        push((f << f_shift) | ((mask - next_g) << shift) | each)
+        struct.pushes += 1
+
+
+def bi_trace_path(struct: BiStruct, width):
     """
-    Calculates and returns the Manhattan heuristic of the given Node
+    Joins the paths of both directions at the meeting cell
 
     Args:
-        current  (tuple): Position of the current Node
-        end      (tuple): Position of the end Node
+        struct        (BiStruct): A collection of node and maze data
+        width              (int): Number of columns in the maze
 
     Returns:
-        Manhattan heuristic for the given Node
+        path              (list): Full path from start to end, empty if
+                                  the end cannot be reached
     """
-    value = abs(current[0] - end[0]) + abs(current[1] - end[1])
-    if direction == FROM_START:
-        return value
-    else:
-        return -abs(value)
 
+    if struct.meeting == -1:
+        return []
+
+    # start to the meeting cell, then on to the end without repeating it
+    path = trace_path(struct.fwd.parent, struct.meeting, width)
+    path.extend(trace_path(struct.bwd.parent, struct.meeting, width)[-2::-1])
+    return path
 
-def bi_get_path(struct: BiStruct, intersect_node):
+
+def bi_get_path(struct: BiStruct, width):
     """
     Compiles paths and visited from both directions
 
     Args:
         struct        (BiStruct): A collection of node and maze data
-        intersect_node   (tuple): Intersection node,
-                                  Acts as middle point to combine the 2 paths
+        width              (int): Number of columns in the maze
 
     Returns:
-        path              (list): Full path from start to end
+        path              (list): Full path from start to end, empty if
+                                  the end cannot be reached
         all_visited        (set): All visited paths from the algorithm
     """
 
-    path = list()
-    path.append(intersect_node)
-    i = intersect_node
-
-    while i != struct.start:
-        path.append(struct.fwd_parents[i])
-        i = struct.fwd_parents[i]
-
-    path = path[::-1]
-
-    i = intersect_node
-
-    while i != struct.end:
-        path.append(struct.bwd_parents[i])
-        i = struct.bwd_parents[i]
-
-    all_visited = struct.fwd_visited.union(struct.bwd_visited)
-    print("\nBidirectional A* Search:\nNodes explored: %i\nTime taken: %s\nPath length: %i steps"
-          % (len(all_visited),
-             time.time() - struct.start_time,
-             len(path)))
+    path = bi_trace_path(struct, width)
+    all_visited = struct.fwd.explored(width) | struct.bwd.explored(width)
     return path, all_visited
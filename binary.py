@@ -0,0 +1,223 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+import numpy as np
+
+from adjacency import Adjacency, build_adjacency
+from distance import goal_distances
+from maze import Maze, load_maze
+
+# header of a binary maze: magic, flags, height, width, start and end
+# positions, then the offset and length in bytes of the walls, adjacency
+# offsets, adjacency targets and goal distance sections, 0 when absent
+_MAGIC = b"MZBIN1\0\0"
+_HEADER = struct.Struct("<8sIIIiiii4x" + "QQ" * 4)
+
+# flag of walls stored one bit per cell instead of one byte
+PACKED = 1
+
+# sections start on a page boundary, so each can be mapped on its own
+_ALIGN = 4096
+
+
+def _uint32(values):
+    # little-endian bytes of a sequence of uint32 values
+    values = array("I", values)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+def save_binary(maze, file_name, packed=False, adjacency=None, distances=None):
+    """
+    Writes a maze to a binary file, with its adjacency index and the
+    distances of all cells to its end when given.
+
+    Walls are stored one byte per cell by default, so load_binary can map
+    them straight into the Maze without copying them. Packed walls take a
+    bit per cell and are unpacked when loaded. The file is written under a
+    temporary name first and then renamed, so readers never see it half
+    written.
+
+    Args:
+        maze            (Maze): The maze to save
+        file_name        (str): Path of the binary file
+        packed          (bool): Whether to store one bit per wall
+        adjacency  (Adjacency): Optional adjacency index of the maze
+        distances      (array): Optional distance of every cell to the end,
+                                as returned by distance.goal_distances
+    """
+
+    if packed:
+        walls = np.packbits(np.frombuffer(maze.walls, dtype=np.uint8), bitorder="little").tobytes()
+    else:
+        walls = bytes(maze.walls)
+    sections = [walls]
+    sections.append(_uint32(adjacency.offsets) if adjacency is not None else b"")
+    sections.append(_uint32(adjacency.targets) if adjacency is not None else b"")
+    sections.append(_uint32(distances) if distances is not None else b"")
+
+    (start_r, start_c) = maze.start if maze.start is not None else (-1, -1)
+    (end_r, end_c) = maze.end if maze.end is not None else (-1, -1)
+    layout = []
+    offset = _ALIGN
+    for data in sections:
+        layout.extend((offset if data else 0, len(data)))
+        offset += -(-len(data) // _ALIGN) * _ALIGN
+
+    temp_name = "%s.%i.tmp" % (file_name, os.getpid())
+    with open(temp_name, "wb") as file:
+        file.write(_HEADER.pack(_MAGIC, PACKED if packed else 0, maze.height, maze.width,
+                                start_r, start_c, end_r, end_c, *layout))
+        for (data, start) in zip(sections, layout[::2]):
+            if data:
+                file.seek(start)
+                file.write(data)
+    os.replace(temp_name, file_name)
+
+
+def _section(file, offset, length):
+    """
+    Maps a section of the file read-only, or reads it when the platform
+    cannot map at that offset.
+    """
+
+    if offset % mmap.ALLOCATIONGRANULARITY == 0:
+        return mmap.mmap(file.fileno(), length, access=mmap.ACCESS_READ, offset=offset)
+    file.seek(offset)
+    return bytearray(file.read(length))
+
+
+def _uint32_section(file, offset, length):
+    if sys.byteorder == "big":
+        file.seek(offset)
+        values = array("I")
+        values.frombytes(file.read(length))
+        values.byteswap()
+        return values
+    return memoryview(_section(file, offset, length)).cast("I")
+
+
+def load_binary(file_name):
+    """
+    Loads a maze written by save_binary.
+
+    Unpacked walls, the adjacency index and the distances are memory-mapped
+    instead of read, so loading costs the same whatever the size of the
+    maze, and pages are only read from disk once a solver touches them.
+
+    Args:
+        file_name        (str): Path of the binary file
+
+    Returns:
+        maze            (Maze): The maze, with start and end set
+        adjacency  (Adjacency): Its adjacency index, None if not stored
+        distances   (sequence): uint32 distance of every cell to the end,
+                                None if not stored
+    """
+
+    with open(file_name, "rb") as file:
+        header = file.read(_HEADER.size)
+        if len(header) < _HEADER.size or header[:8] != _MAGIC:
+            raise ValueError("%s is not a binary maze" % file_name)
+        (_, flags, height, width, start_r, start_c, end_r, end_c,
+         walls_at, walls_length, offsets_at, offsets_length,
+         targets_at, targets_length, distances_at, distances_length) = _HEADER.unpack(header)
+        size = height * width
+
+        if flags & PACKED:
+            file.seek(walls_at)
+            bits = np.frombuffer(file.read(walls_length), dtype=np.uint8)
+            walls = bytearray(np.unpackbits(bits, count=size, bitorder="little").tobytes())
+        else:
+            walls = _section(file, walls_at, walls_length)
+
+        adjacency = None
+        if offsets_length:
+            targets = _uint32_section(file, targets_at, targets_length) if targets_length else array("I")
+            adjacency = Adjacency(height, width, _uint32_section(file, offsets_at, offsets_length), targets)
+
+        distances = None
+        if distances_length:
+            distances = _uint32_section(file, distances_at, distances_length)
+
+    maze = Maze(walls, height, width)
+    maze.start = (start_r, start_c) if start_r >= 0 else None
+    maze.end = (end_r, end_c) if end_r >= 0 else None
+    return maze, adjacency, distances
+
+
+def convert(text_name, binary_name=None, packed=False, index=False, heuristic=False):
+    """
+    Converts a .txt maze file into a binary maze file.
+
+    Args:
+        text_name        (str): The .txt file of the maze
+        binary_name      (str): Path of the binary file, defaults to
+                                text_name + ".mzb"
+        packed          (bool): Whether to store one bit per wall
+        index           (bool): Whether to store the adjacency index
+        heuristic       (bool): Whether to store the distance of every
+                                cell to the end
+
+    Returns:
+        binary_name      (str): Path of the binary file written
+    """
+
+    maze = load_maze(text_name)
+    adjacency = build_adjacency(maze) if index else None
+    distances = None
+    if heuristic:
+        distances = goal_distances(maze, maze.end[0] * maze.width + maze.end[1])
+    binary_name = binary_name or text_name + ".mzb"
+    save_binary(maze, binary_name, packed, adjacency, distances)
+    return binary_name
+
+
+def cached_maze(file_name):
+    """
+    Loads a .txt maze file, through its binary cache file_name + ".mzb"
+    when that cache is newer than the text, and writing the cache
+    otherwise.
+
+    Args:
+        file_name        (str): The .txt file of the maze
+
+    Returns:
+        maze            (Maze): The maze, with start and end set
+    """
+
+    cache_name = file_name + ".mzb"
+    try:
+        if os.path.getmtime(cache_name) >= os.path.getmtime(file_name):
+            return load_binary(cache_name)[0]
+    except (OSError, ValueError, struct.error):
+        pass
+
+    maze = load_maze(file_name)
+    try:
+        save_binary(maze, cache_name)
+    except OSError:
+        # a read-only directory only costs the cache
+        pass
+    return maze
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Converts .txt maze files to binary maze files.")
+    parser.add_argument("mazes", nargs="+", help="maze .txt files, each written to <maze>.mzb")
+    parser.add_argument("--packed", action="store_true", help="store one bit per wall")
+    parser.add_argument("--index", action="store_true", help="store the adjacency index")
+    parser.add_argument("--heuristic", action="store_true", help="store the distance of every cell to the end")
+    args = parser.parse_args()
+
+    for text_name in args.mazes:
+        start_time = time.perf_counter()
+        binary_name = convert(text_name, packed=args.packed, index=args.index, heuristic=args.heuristic)
+        print("%s -> %s: %i bytes in %.2f s"
+              % (text_name, binary_name, os.path.getsize(binary_name), time.perf_counter() - start_time))
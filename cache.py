@@ -0,0 +1,298 @@
+import hashlib
+import struct
+from array import array
+from collections import OrderedDict
+
+from a_star import astar
+from batch import ALGORITHMS, ASTAR, BI_A_STAR, DFS
+from bi_a_star import bi_a_star
+from depth_first import dfs
+from maze import as_maze
+
+# algorithms whose paths are shortest paths, so that every sub-path of one
+# of their paths is a shortest path too
+OPTIMAL = (ASTAR, BI_A_STAR)
+
+SOLVERS = {ASTAR: astar, BI_A_STAR: bi_a_star, DFS: dfs}
+
+# approximate bytes taken by the key tuple and the dict slots of an entry,
+# on top of the path itself
+_ENTRY_OVERHEAD = 200
+
+# approximate bytes taken by the index entry of every cell of an OPTIMAL path
+_INDEX_OVERHEAD = 96
+
+DEFAULT_MAX_BYTES = 64 << 20
+
+# low bits of an index entry, the position of the cell on its path
+_POSITION = (1 << 32) - 1
+
+
+def maze_digest(maze):
+    """
+    Hashes the size and walls of a maze, so that equal mazes share cached
+    paths whichever file or object they were loaded from.
+
+    Args:
+        maze       (Maze): Contains the maze
+
+    Returns:
+        digest    (bytes): 16-byte BLAKE2b digest of the maze
+    """
+
+    hasher = hashlib.blake2b(struct.pack("<II", maze.height, maze.width), digest_size=16)
+    hasher.update(maze.walls)
+    return hasher.digest()
+
+
+def _unpack(data):
+    path = array("I")
+    path.frombytes(data)
+    return path
+
+
+class PathCache:
+    """
+    LRU cache of solved paths, keyed by maze digest, algorithm, start and
+    end.
+
+    Paths are stored as packed uint32 flat indices, and the cache evicts
+    the least recently used paths once they take more than max_bytes.
+    Queries on a maze are also answered from the paths of OPTIMAL
+    algorithms that pass through both of their endpoints, as every
+    sub-path of a shortest path is a shortest path, in either direction.
+    Such answers are optimal but may differ from the equally short path
+    the solver would have picked. Every cell of these paths is indexed with
+    the paths through it and its position on them, so finding such a path
+    does not depend on how many paths are cached.
+
+    Attributes:
+        max_bytes      (int): Bound on the bytes taken by cached paths.
+        bytes          (int): Bytes taken by cached paths.
+        hits           (int): Queries answered from the cache, sub-path
+                              answers included.
+        sub_hits       (int): Queries answered from a sub-path of another
+                              cached path.
+        misses         (int): Queries that had to be searched.
+        evictions      (int): Paths evicted to stay under max_bytes.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        if max_bytes < 0:
+            raise ValueError("max_bytes must not be negative, got %i" % max_bytes)
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.sub_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # (digest, algorithm, source, target) -> packed path, least recent first
+        self._entries = OrderedDict()
+        # digest -> {cell: (path id << 32) | position of the cell on the path}
+        # over the non-empty OPTIMAL paths of each maze, a list of them for
+        # cells on several paths
+        self._index = {}
+        # path id of every indexed key, and key of every path id
+        self._ids = {}
+        self._keys = {}
+        self._next_id = 0
+        # digest of the maze solve() was last called with
+        self._last = (None, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, digest, algorithm, source, target):
+        """
+        Looks up the path between two cells, counting a hit or a miss.
+
+        Args:
+            digest       (bytes): maze_digest of the maze
+            algorithm      (str): One of ASTAR, BI_A_STAR and DFS
+            source         (int): Flat index of the starting position
+            target         (int): Flat index of the end position
+
+        Returns:
+            path         (array): uint32 flat indices from source to
+                                  target, empty if the target cannot be
+                                  reached, or None when not cached
+        """
+
+        key = (digest, algorithm, source, target)
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return _unpack(data)
+
+        if algorithm in OPTIMAL:
+            path = self._sub_path(digest, source, target)
+            if path is not None:
+                self.hits += 1
+                self.sub_hits += 1
+                return path
+
+        self.misses += 1
+        return None
+
+    def _sub_path(self, digest, source, target):
+        """
+        Cuts the path between two cells out of a cached optimal path that
+        passes through both, None if there is none.
+        """
+
+        cells = self._index.get(digest)
+        if not cells:
+            return None
+        (first, last) = (cells.get(source), cells.get(target))
+        if first is None or last is None:
+            return None
+        on_last = {code >> 32: code & _POSITION for code in (last if type(last) is list else (last,))}
+        for code in (first if type(first) is list else (first,)):
+            j = on_last.get(code >> 32)
+            if j is None:
+                continue
+            i = code & _POSITION
+            key = self._keys[code >> 32]
+            self._entries.move_to_end(key)
+            path = _unpack(self._entries[key][4 * min(i, j):4 * (max(i, j) + 1)])
+            if j < i:
+                path.reverse()
+            return path
+        return None
+
+    def put(self, digest, algorithm, source, target, path):
+        """
+        Stores the path between two cells, evicting the least recently used
+        paths if it takes the cache over max_bytes.
+
+        Args:
+            digest       (bytes): maze_digest of the maze
+            algorithm      (str): One of ASTAR, BI_A_STAR and DFS
+            source         (int): Flat index of the starting position
+            target         (int): Flat index of the end position
+            path      (iterable): Flat indices from source to target, empty
+                                  if the target cannot be reached
+        """
+
+        key = (digest, algorithm, source, target)
+        self._discard(key)
+        data = array("I", path).tobytes()
+        cost = len(data) + _ENTRY_OVERHEAD
+        if cost > self.max_bytes:
+            return
+
+        if algorithm in OPTIMAL and data:
+            cost += _INDEX_OVERHEAD * (len(data) // 4)
+            if cost > self.max_bytes:
+                return
+            self._add_index(key, data)
+        self._entries[key] = data
+        self.bytes += cost
+        while self.bytes > self.max_bytes:
+            self._discard(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _discard(self, key):
+        data = self._entries.pop(key, None)
+        if data is None:
+            return
+        self.bytes -= len(data) + _ENTRY_OVERHEAD
+        path_id = self._ids.pop(key, None)
+        if path_id is None:
+            return
+        self.bytes -= _INDEX_OVERHEAD * (len(data) // 4)
+        del self._keys[path_id]
+        cells = self._index[key[0]]
+        for (position, cell) in enumerate(_unpack(data)):
+            code = (path_id << 32) | position
+            codes = cells[cell]
+            if type(codes) is not list:
+                del cells[cell]
+                continue
+            codes.remove(code)
+            if len(codes) == 1:
+                cells[cell] = codes[0]
+        if not cells:
+            del self._index[key[0]]
+
+    def _add_index(self, key, data):
+        path_id = self._next_id
+        self._next_id += 1
+        self._ids[key] = path_id
+        self._keys[path_id] = key
+        cells = self._index.setdefault(key[0], {})
+        for (position, cell) in enumerate(_unpack(data)):
+            code = (path_id << 32) | position
+            codes = cells.get(cell)
+            if codes is None:
+                cells[cell] = code
+            elif type(codes) is list:
+                codes.append(code)
+            else:
+                cells[cell] = [codes, code]
+
+    def clear(self):
+        """
+        Drops every cached path, keeping the counters.
+        """
+        self._entries.clear()
+        self._index.clear()
+        self._ids.clear()
+        self._keys.clear()
+        self.bytes = 0
+
+    def counters(self):
+        """
+        Returns the hit and miss counters and the size of the cache as a
+        dict, ready to be written as JSON.
+        """
+        return {"hits": self.hits, "sub_hits": self.sub_hits, "misses": self.misses,
+                "evictions": self.evictions, "entries": len(self._entries), "bytes": self.bytes}
+
+    def digest(self, maze):
+        """
+        Returns the maze_digest of a maze, reusing the last one computed
+        when called with the same maze object again. Mazes are expected
+        not to change once their paths are cached.
+        """
+
+        (last, digest) = self._last
+        if last is not maze:
+            digest = maze_digest(maze)
+            self._last = (maze, digest)
+        return digest
+
+    def solve(self, maze, start, end, algorithm=ASTAR, adjacency=None):
+        """
+        Returns the path between two positions from the cache, or solves
+        it with the given algorithm and caches it.
+
+        Args:
+            maze          (Maze): Contains the maze
+            start        (tuple): Position of the starting position
+            end          (tuple): Position of the end position
+            algorithm      (str): One of ASTAR, BI_A_STAR and DFS
+            adjacency (Adjacency): Optional precomputed index of the maze,
+                                  searched on a miss
+
+        Returns:
+            path          (list): Path from start to end, empty if the end
+                                  cannot be reached
+        """
+
+        if algorithm not in ALGORITHMS:
+            raise ValueError("unknown algorithm %r, expected one of %s" % (algorithm, ", ".join(ALGORITHMS)))
+        maze = as_maze(maze)
+        width = maze.width
+        digest = self.digest(maze)
+        source = start[0] * width + start[1]
+        target = end[0] * width + end[1]
+
+        cells = self.get(digest, algorithm, source, target)
+        if cells is not None:
+            return [divmod(i, width) for i in cells]
+
+        path = SOLVERS[algorithm](maze, start, end, adjacency=adjacency)[0]
+        self.put(digest, algorithm, source, target, [r * width + c for (r, c) in path])
+        return path
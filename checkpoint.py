@@ -0,0 +1,360 @@
+import math
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from a_star import AStarSearch
+from batch import ALGORITHMS, ASTAR, BI_A_STAR, DFS
+from bi_a_star import BALANCE_F, BALANCE_FRONTIER, BiStruct, bi_run, bi_start, bi_stats, bi_trace_path
+from depth_first import DFSSearch
+from maze import as_maze, trace_path
+from open_list import OPEN_LISTS
+from workspace import Workspace
+
+# seconds between two checkpoints of solve_resumable
+CHECKPOINT_SECONDS = 60.0
+
+BALANCES = (BALANCE_FRONTIER, BALANCE_F)
+OPEN_LIST_KINDS = tuple(OPEN_LISTS)
+
+# header of the on-disk checkpoints: magic, algorithm, open list kind,
+# balance of bi_a_star, whether a heuristic was used, found, done, height,
+# width, source, target, pushes, pops, reopened, max_frontier, seconds
+# searched, best cost and meeting cell of bi_a_star, -1 if none
+_MAGIC = b"MZCKP3\0\0"
+_HEADER = struct.Struct("<8sBBBBBBxxIIIIQQQQdqq")
+
+
+class ResumableSearch:
+    """
+    A*, bidirectional A* or DFS search whose state can be saved to a
+    checkpoint file and resumed, in this process or another one.
+
+    The search is an a_star.AStarSearch, a bi_a_star.BiStruct or a
+    depth_first.DFSSearch, the same state astar, bi_a_star and dfs run in
+    one go, here run in slices bounded by a number of pops or seconds.
+    Between slices the state lives in plain arrays, the Workspace of every
+    direction and its open list or stack, so however the search is sliced,
+    saved and resumed, it finds the same path with the same counters as
+    the one-shot solvers. Slices also let a worker interleave long solves
+    with short ones.
+
+    Observers and heuristics are not saved: a search resumed from a
+    checkpoint is given them again by ResumableSearch.load.
+
+    Attributes:
+        graph          (Maze): Contains the maze, or its Adjacency index.
+        algorithm       (str): One of batch.ALGORITHMS.
+        search       (object): The AStarSearch, BiStruct or DFSSearch.
+        heuristic  (callable): The heuristic of astar and bi_a_star, None
+                               for the Manhattan distance.
+        elapsed       (float): Seconds searched over all slices.
+    """
+
+    def __init__(self, graph, algorithm, source, target, observer=None, heuristic=None, open_list=None,
+                 balance=BALANCE_FRONTIER):
+        if algorithm not in ALGORITHMS:
+            raise ValueError("unknown algorithm %r, expected one of %s" % (algorithm, ", ".join(ALGORITHMS)))
+        self.graph = graph
+        self.algorithm = algorithm
+        self.heuristic = heuristic
+        self.elapsed = 0.0
+        if algorithm == ASTAR:
+            self.search = AStarSearch(graph, source, target, Workspace(graph.size), observer, heuristic, open_list)
+        elif algorithm == DFS:
+            self.search = DFSSearch(graph, source, target, Workspace(graph.size), observer)
+        else:
+            self.search = BiStruct(graph.size, source, target, observer=observer, heuristic=heuristic,
+                                   open_list=open_list, balance=balance)
+            bi_start(self.search, graph)
+
+    @property
+    def done(self):
+        """
+        Whether the search has finished.
+        """
+        return self.search.done
+
+    def run(self, expansions=None, seconds=None):
+        """
+        Runs the search until it finishes or the slice ends.
+
+        Args:
+            expansions  (int): Optional number of entries to pop in this
+                               slice
+            seconds   (float): Optional seconds to run this slice for, the
+                               clock is read every stats.CHECK_EVERY pops
+
+        Returns:
+            done       (bool): Whether the search has finished
+        """
+
+        if self.search.done:
+            return True
+        start_time = time.perf_counter()
+        deadline = start_time + seconds if seconds is not None else None
+        if self.algorithm == BI_A_STAR:
+            bi_run(self.search, self.graph, expansions, deadline)
+        else:
+            self.search.run(expansions, deadline)
+        self.elapsed += time.perf_counter() - start_time
+        return self.search.done
+
+    def result(self):
+        """
+        Returns the outcome of the search, as astar, bi_a_star and dfs do.
+
+        Returns:
+            path      (list): Contains all the tiles traversed from the
+                              start node in order to reach the end node,
+                              empty if the end cannot be reached or the
+                              search has not finished.
+            closed     (set): Contains all Nodes expanded so far.
+            stats (SearchStats): Counters and timings of the search so far
+        """
+
+        width = self.graph.width
+        search = self.search
+        if self.algorithm == BI_A_STAR:
+            stats = bi_stats(search)
+            closed = search.fwd.explored(width) | search.bwd.explored(width)
+        else:
+            stats = search.stats()
+            closed = search.workspace.explored(width)
+        stats.timings["search"] = self.elapsed
+        with stats.timed("path"):
+            path = []
+            if search.done and stats.found:
+                if self.algorithm == BI_A_STAR:
+                    path = bi_trace_path(search, width)
+                else:
+                    path = trace_path(search.workspace.parent, search.target, width)
+        stats.path_length = len(path)
+        return path, closed, stats
+
+    def _directions(self):
+        # (workspace, open list or None, stack or None) of every direction
+        search = self.search
+        if self.algorithm == BI_A_STAR:
+            return [(search.fwd, search.fwd_open, None), (search.bwd, search.bwd_open, None)]
+        if self.algorithm == DFS:
+            return [(search.workspace, None, search.stack)]
+        return [(search.workspace, search.open, None)]
+
+    def _key_layout(self):
+        search = self.search
+        return search.shift, search.f_shift, search.mask
+
+    def save(self, file_name):
+        """
+        Writes the state of the search to a binary checkpoint. The file is
+        written under a temporary name first and then renamed, so a solve
+        killed while saving still has its previous checkpoint.
+
+        For every direction, the checkpoint holds the expansion order as an
+        array of indices, repeats included, a bitmap of the cells visited,
+        the parent and g-cost of every visited cell, and the open list as
+        arrays of f, g and index,
+        along with the open list's own extra values, or the stack as an
+        array of indices.
+
+        Args:
+            file_name  (str): Path of the checkpoint file
+        """
+
+        graph = self.graph
+        search = self.search
+        (source, target) = (search.start, search.end) if self.algorithm == BI_A_STAR else \
+            (search.source, search.target)
+        kind = 0
+        balance = 0
+        best = meeting = -1
+        if self.algorithm == BI_A_STAR:
+            kind = OPEN_LIST_KINDS.index(_kind_of(search.fwd_open))
+            balance = BALANCES.index(search.balance)
+            (best, meeting) = (-1 if search.best == math.inf else search.best, search.meeting)
+            (found, pops) = (search.meeting != -1, 0)
+        elif self.algorithm == ASTAR:
+            kind = OPEN_LIST_KINDS.index(_kind_of(search.open))
+            (found, pops) = (search.found, search.pops)
+        else:
+            (found, pops) = (search.found, 0)
+
+        temp_name = "%s.%i.tmp" % (file_name, os.getpid())
+        with open(temp_name, "wb") as file:
+            file.write(_HEADER.pack(_MAGIC, ALGORITHMS.index(self.algorithm), kind, balance,
+                                    self.heuristic is not None, found, search.done,
+                                    graph.size // graph.width, graph.width, source, target, search.pushes, pops,
+                                    getattr(search, "reopened", 0), search.max_frontier, self.elapsed,
+                                    best, meeting))
+            for (workspace, open_list, stack) in self._directions():
+                visited = np.frombuffer(workspace.seen, dtype=np.uint32) == workspace.generation
+                cells = np.flatnonzero(visited)
+                arrays = [np.array([len(workspace.order)], dtype=np.uint64),
+                          np.array(workspace.order, dtype=np.uint32), np.packbits(visited),
+                          np.frombuffer(workspace.parent, dtype=np.int32)[cells],
+                          np.frombuffer(workspace.g, dtype=np.int32)[cells]]
+                if stack is not None:
+                    arrays += [np.array([len(stack)], dtype=np.uint64), np.array(stack, dtype=np.uint32)]
+                else:
+                    (shift, f_shift, mask) = self._key_layout()
+                    (keys, extra) = open_list.state()
+                    keys = np.array(keys, dtype=object)
+                    arrays += [np.array([len(keys), len(extra)], dtype=np.uint64), np.array(extra, dtype=np.uint64),
+                               (keys >> f_shift).astype(np.uint32),
+                               (mask - ((keys >> shift) & mask)).astype(np.uint32),
+                               (keys & mask).astype(np.uint32)]
+                for values in arrays:
+                    file.write(values.astype(values.dtype.newbyteorder("<")).tobytes())
+        os.replace(temp_name, file_name)
+
+    @classmethod
+    def load(cls, graph, file_name, observer=None, heuristic=None):
+        """
+        Reads a checkpoint written by ResumableSearch.save.
+
+        Args:
+            graph          (Maze): The maze the search runs on, or its
+                                   Adjacency index
+            file_name       (str): Path of the checkpoint file
+            observer   (callable): Optional observer(event, cell), called on
+                                   every stats.EXPAND and stats.PUSH
+            heuristic  (callable): The heuristic the search was started
+                                   with, if any
+
+        Returns:
+            search (ResumableSearch): The search, ready to run on
+        """
+
+        with open(file_name, "rb") as file:
+            data = file.read()
+        (magic, algorithm, kind, balance, heuristic_used, found, done, height, width, source, target, pushes, pops,
+         reopened, max_frontier, elapsed, best, meeting) = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("%s is not a search checkpoint" % file_name)
+        if (height * width, width) != (graph.size, graph.width):
+            raise ValueError("%s is for a %i x %i maze, not %i x %i"
+                             % (file_name, height, width, graph.size // graph.width, graph.width))
+        if bool(heuristic_used) != (heuristic is not None):
+            raise ValueError("%s was saved %s a heuristic" % (file_name, "with" if heuristic_used else "without"))
+
+        # observed only from here on, the pushes of the fresh search are replaced below
+        resumed = cls(graph, ALGORITHMS[algorithm], source, target, None, heuristic, OPEN_LIST_KINDS[kind],
+                      BALANCES[balance])
+        resumed.search.observe(observer)
+        resumed.elapsed = elapsed
+        search = resumed.search
+        (search.done, search.pushes, search.max_frontier) = (bool(done), pushes, max_frontier)
+        if resumed.algorithm == BI_A_STAR:
+            (search.best, search.meeting, search.reopened) = (math.inf if best < 0 else best, meeting, reopened)
+        elif resumed.algorithm == ASTAR:
+            (search.found, search.pops, search.reopened) = (bool(found), pops, reopened)
+        else:
+            search.found = bool(found)
+
+        at = _HEADER.size
+
+        def read(dtype, count):
+            nonlocal at
+            dtype = np.dtype(dtype).newbyteorder("<")
+            values = np.frombuffer(data, dtype=dtype, count=count, offset=at)
+            at += values.nbytes
+            return values.astype(values.dtype.newbyteorder("="))
+
+        packed = (graph.size + 7) // 8
+        for (workspace, open_list, stack) in resumed._directions():
+            workspace.order[:] = read(np.uint32, int(read(np.uint64, 1)[0])).tolist()
+            visited = np.unpackbits(read(np.uint8, packed), count=graph.size).astype(bool)
+            cells = np.flatnonzero(visited)
+            np.frombuffer(workspace.seen, dtype=np.uint32)[:] = np.where(visited, workspace.generation, 0)
+            np.frombuffer(workspace.parent, dtype=np.int32)[cells] = read(np.int32, len(cells))
+            np.frombuffer(workspace.g, dtype=np.int32)[cells] = read(np.int32, len(cells))
+            if stack is not None:
+                stack[:] = read(np.uint32, int(read(np.uint64, 1)[0])).tolist()
+            else:
+                (count, extra_count) = read(np.uint64, 2).tolist()
+                extra = read(np.uint64, extra_count).tolist()
+                (f, g, index) = (read(np.uint32, count).tolist(), read(np.uint32, count).tolist(),
+                                 read(np.uint32, count).tolist())
+                (shift, f_shift, mask) = resumed._key_layout()
+                open_list.restore([(each_f << f_shift) | ((mask - each_g) << shift) | each
+                                   for (each_f, each_g, each) in zip(f, g, index)], extra)
+        return resumed
+
+
+def _kind_of(open_list):
+    for (kind, open_list_class) in OPEN_LISTS.items():
+        if type(open_list) is open_list_class:
+            return kind
+    raise ValueError("unknown open list %r" % open_list)
+
+
+def solve_resumable(maze, algorithm, start, end, file_name, adjacency=None, seconds=CHECKPOINT_SECONDS,
+                    observer=None, heuristic=None, open_list=None):
+    """
+    Solves the maze with a ResumableSearch, saving a checkpoint every few
+    seconds, and resuming from the checkpoint left by an earlier, killed
+    solve of the same query if there is one. The checkpoint is removed
+    once the search finishes.
+
+    Args:
+            maze      (Maze): Contains the maze, a list of rows is
+                              also accepted
+            algorithm  (str): One of batch.ALGORITHMS
+            start    (tuple): Position of the starting position
+            end      (tuple): Position of the end position
+            file_name  (str): Path of the checkpoint file
+            adjacency (Adjacency): Optional precomputed index of the maze,
+                              walked instead of the maze when given
+            seconds  (float): Seconds searched between two checkpoints
+            observer (callable): Optional observer(event, cell), called on
+                              every stats.EXPAND and stats.PUSH
+            heuristic (callable): Optional heuristic(target) of astar and
+                              bi_a_star, such as landmarks.Landmarks
+            open_list  (str): One of open_list.HEAP, BUCKET and RADIX, or
+                              None to pick one for the heuristic
+
+    Returns:
+            path      (list): Contains all the tiles traversed from the
+                              start node in order to reach the end node.
+            closed     (set): Contains all Nodes explored while trying
+                              to find the path.
+            stats (SearchStats): Counters and timings of the search
+    """
+
+    graph = adjacency if adjacency is not None else as_maze(maze)
+    source = start[0] * graph.width + start[1]
+    target = end[0] * graph.width + end[1]
+    resumed = None
+    try:
+        resumed = ResumableSearch.load(graph, file_name, observer, heuristic)
+        search = resumed.search
+        ends = (search.start, search.end) if resumed.algorithm == BI_A_STAR else (search.source, search.target)
+        if (resumed.algorithm, ends) != (algorithm, (source, target)):
+            resumed = None
+    except (OSError, ValueError, struct.error):
+        pass
+    if resumed is None:
+        resumed = ResumableSearch(graph, algorithm, source, target, observer, heuristic, open_list)
+
+    while not resumed.run(seconds=seconds):
+        resumed.save(file_name)
+    if os.path.exists(file_name):
+        os.remove(file_name)
+    return resumed.result()
+
+
+if __name__ == '__main__':
+    # usage: python checkpoint.py [maze file] [algorithm] [seconds between checkpoints]
+    from binary import cached_maze
+
+    file_name = sys.argv[1] if len(sys.argv) > 1 else "maze-VLarge.txt"
+    algorithm = sys.argv[2] if len(sys.argv) > 2 else ASTAR
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else CHECKPOINT_SECONDS
+
+    maze = cached_maze(file_name)
+    path, closed, stats = solve_resumable(maze, algorithm, maze.start, maze.end, file_name + ".ckp", seconds=seconds)
+    print(stats.report(algorithm))
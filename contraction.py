@@ -0,0 +1,439 @@
+import time
+import heapq
+from array import array
+
+from maze import OPEN_BYTE, as_maze, bitmap_positions
+from stats import EXPAND, PUSH, SearchStats, observed
+
+
+class Contraction:
+    """
+    Weighted junction graph of a maze, with every corridor of 1-wide
+    cells collapsed into a single edge.
+
+    Dead-ends, junctions and the kept cells (by default the maze's start
+    and end) become nodes. Each edge stores the corridor length as its
+    weight and the first cell of the corridor, which is enough to walk the
+    corridor again and expand a solution back into cells.
+
+    Attributes:
+        graph      (Maze): The maze, or its Adjacency index, that was contracted.
+        cells     (array): Flat cell index of every node.
+        node_of   (array): Node id of every cell, -1 for cells inside corridors
+                           and walls.
+        offsets   (array): Edges of node u are offsets[u] to offsets[u + 1].
+        targets   (array): Node id at the far end of each edge.
+        weights   (array): Number of steps along each edge.
+        steps     (array): First cell of the corridor taken by each edge.
+    """
+
+    def __init__(self, graph, cells, node_of, offsets, targets, weights, steps):
+        self.graph = graph
+        self.cells = cells
+        self.node_of = node_of
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.steps = steps
+
+    def walk(self, first, previous, stop=-1):
+        """
+        Follows a corridor from one of its cells until a node, or the stop
+        cell, is reached.
+
+        Args:
+            first      (int): Flat index of the first cell of the walk
+            previous   (int): Flat index of the cell the walk comes from
+            stop       (int): Flat index of an extra cell to stop at
+
+        Returns:
+            cell       (int): Flat index of the cell the walk stopped at, -1
+                              if the corridor loops back onto itself
+            length     (int): Number of steps taken
+            last       (int): Flat index of the cell before the one stopped at
+        """
+
+        neighbours = self.graph.neighbours
+        node_of = self.node_of
+        origin = previous
+        cell = first
+        length = 1
+        while node_of[cell] == -1 and cell != stop:
+            (a, b) = neighbours(cell)
+            previous, cell = cell, (a if a != previous else b)
+            length += 1
+            if cell == origin:
+                return -1, length, previous
+        return cell, length, previous
+
+    def corridor(self, first, previous, stop):
+        """
+        Returns the flat indices of the cells walked from first up to and
+        including stop.
+        """
+
+        neighbours = self.graph.neighbours
+        cells = [first]
+        cell = first
+        while cell != stop:
+            (a, b) = neighbours(cell)
+            previous, cell = cell, (a if a != previous else b)
+            cells.append(cell)
+        return cells
+
+    def edges(self, cell, other):
+        """
+        Lists the edges from a query endpoint that is not a node, by
+        walking its corridor both ways.
+
+        Args:
+            cell       (int): Flat index of the endpoint
+            other      (int): Flat index of the other endpoint of the query,
+                              reached directly if it lies on the same corridor
+
+        Returns:
+            edges     (list): (far cell, length, first step, last step) of
+                              each way out of the corridor
+        """
+
+        edges = []
+        for first in self.graph.neighbours(cell):
+            far, length, last = self.walk(first, cell, other)
+            if far != -1:
+                edges.append((far, length, first, last))
+        return edges
+
+
+def contract(maze, keep=None, adjacency=None):
+    """
+    Collapses the corridors of a maze into a weighted junction graph.
+
+    Args:
+        maze        (Maze): Contains the maze, a list of rows is also accepted
+        keep        (list): Positions that must stay nodes, defaults to the
+                            maze's start and end
+        adjacency (Adjacency): Optional precomputed index of the maze,
+                            walked instead of the maze when given
+
+    Returns:
+        contraction (Contraction): The junction graph
+    """
+
+    maze = as_maze(maze)
+    graph = adjacency if adjacency is not None else maze
+    neighbours = graph.neighbours
+    walls = maze.walls
+    width = maze.width
+    if keep is None:
+        keep = [each for each in (maze.start, maze.end) if each is not None]
+
+    # every open cell that is not in the middle of a corridor is a node
+    cells = array("i")
+    node_of = array("i", [-1]) * maze.size
+    kept = {r * width + c for (r, c) in keep}
+    i = walls.find(OPEN_BYTE)
+    while i >= 0:
+        if len(neighbours(i)) != 2 or i in kept:
+            node_of[i] = len(cells)
+            cells.append(i)
+        i = walls.find(OPEN_BYTE, i + 1)
+
+    contraction = Contraction(graph, cells, node_of, array("i", [0]), array("i"), array("i"), array("i"))
+
+    # walk every corridor leaving every node
+    offsets = contraction.offsets
+    for u in cells:
+        for first in neighbours(u):
+            far, length, _ = contraction.walk(first, u)
+            if far == -1 or far == u:
+                continue
+            contraction.targets.append(node_of[far])
+            contraction.weights.append(length)
+            contraction.steps.append(first)
+        offsets.append(len(contraction.targets))
+    return contraction
+
+
+def query_graph(contraction, source, target):
+    """
+    Adds a query's endpoints to the junction graph as extra nodes when
+    they lie inside corridors.
+
+    Args:
+        contraction (Contraction): The junction graph
+        source       (int): Flat index of the start position
+        target       (int): Flat index of the end position
+
+    Returns:
+        source_id    (int): Node id of the start
+        target_id    (int): Node id of the end
+        extra       (dict): Extra edges leaving each node, as (node id,
+                            weight, first step) tuples
+        cells      (array): Flat cell index of every node, extra nodes last
+    """
+
+    node_of = contraction.node_of
+    cells = contraction.cells
+    count = len(cells)
+    extra_cells = []
+
+    if node_of[source] != -1:
+        source_id = node_of[source]
+    else:
+        source_id = count
+        extra_cells.append(source)
+    if target == source:
+        target_id = source_id
+    elif node_of[target] != -1:
+        target_id = node_of[target]
+    else:
+        target_id = count + len(extra_cells)
+        extra_cells.append(target)
+
+    def node_id(cell):
+        if node_of[cell] != -1:
+            return node_of[cell]
+        return source_id if cell == source else target_id
+
+    extra = {}
+    if node_of[source] == -1:
+        for far, length, first, _ in contraction.edges(source, target):
+            extra.setdefault(source_id, []).append((node_id(far), length, first))
+    if node_of[target] == -1 and target != source:
+        # edges into the end run backwards along the walks out of it
+        for far, length, _, last in contraction.edges(target, source):
+            if far == source and node_of[source] == -1:
+                continue
+            extra.setdefault(node_id(far), []).append((target_id, length, last))
+
+    if extra_cells:
+        cells = cells + array("i", extra_cells)
+    return source_id, target_id, extra, cells
+
+
+def expand_path(contraction, cells, parent, via, target_id):
+    """
+    Expands the chain of nodes that ends at target_id back into cells.
+
+    Args:
+        contraction (Contraction): The junction graph
+        cells      (array): Flat cell index of every node
+        parent     (array): Parent node id of every reached node, -1 for
+                            the start
+        via        (array): First step of the edge each node was reached by
+        target_id    (int): Node id of the end
+
+    Returns:
+        path        (list): Flat indices of every cell from start to end
+    """
+
+    hops = []
+    u = target_id
+    while parent[u] != -1:
+        hops.append(u)
+        u = parent[u]
+
+    path = [cells[u]]
+    for u in reversed(hops):
+        path.extend(contraction.corridor(via[u], cells[parent[u]], cells[u]))
+    return path
+
+
+def expand_explored(contraction, cells, parent, via, closed, size):
+    """
+    Marks the cells of every closed node and of the corridor it was
+    reached by.
+
+    Returns:
+        explored (bytearray): One byte per maze cell, 1 if explored
+    """
+
+    explored = bytearray(size)
+    u = closed.find(1)
+    while u >= 0:
+        explored[cells[u]] = 1
+        if parent[u] != -1:
+            for each in contraction.corridor(via[u], cells[parent[u]], cells[u]):
+                explored[each] = 1
+        u = closed.find(1, u + 1)
+    return explored
+
+
+def contracted_astar(contraction, start, end, observer=None):
+    """
+    Solves the maze using A-Star Search on its junction graph, returns
+    statistics and pathing.
+
+    Args:
+            contraction (Contraction): The junction graph of the maze
+            start    (tuple): Position of the starting position
+            end      (tuple): Position of the end position
+            observer (callable): Optional observer(event, cell), called on
+                              every stats.EXPAND and stats.PUSH of a junction
+
+    Returns:
+            path      (list): Contains all the tiles traversed from the
+                              start node in order to reach the end node.
+            closed     (set): Contains all Nodes explored while trying
+                              to find the path.
+            stats (SearchStats): Counters and timings of the search
+    """
+
+    graph = contraction.graph
+    width = graph.width
+    stats = SearchStats()
+    start_time = time.perf_counter()
+
+    source = start[0] * width + start[1]
+    target = end[0] * width + end[1]
+    source_id, target_id, extra, cells = query_graph(contraction, source, target)
+    count = len(cells)
+    real = len(contraction.cells)
+    offsets = contraction.offsets
+    targets = contraction.targets
+    weights = contraction.weights
+    steps = contraction.steps
+
+    g = array("i", [-1]) * count
+    parent = array("i", [-1]) * count
+    via = array("i", [-1]) * count
+    closed = bytearray(count)
+    expanded = 0
+    pushes = 1
+    reopened = 0
+    max_frontier = 1
+
+    # open list entries are (f << f_shift) | ((g_mask - g) << shift) | node id
+    shift = count.bit_length()
+    g_mask = (1 << graph.size.bit_length()) - 1
+    f_shift = shift + g_mask.bit_length()
+    mask = (1 << shift) - 1
+    heappush = observed(heapq.heappush, observer, PUSH, lambda key: cells[key & mask])
+
+    (end_r, end_c) = end
+    g[source_id] = 0
+    open = []
+    heappush(open, ((abs(start[0] - end_r) + abs(start[1] - end_c)) << f_shift) | (g_mask << shift) | source_id)
+    found = False
+
+    while open:
+        key = heapq.heappop(open)
+        u = key & mask
+        u_g = g_mask - ((key >> shift) & g_mask)
+        if u_g != g[u]:
+            continue
+        closed[u] = 1
+        expanded += 1
+        if observer is not None:
+            observer(EXPAND, cells[u])
+        if u == target_id:
+            found = True
+            break
+
+        edges = zip(targets[offsets[u]:offsets[u + 1]], weights[offsets[u]:offsets[u + 1]],
+                    steps[offsets[u]:offsets[u + 1]]) if u < real else ()
+        for edge_list in (edges, extra.get(u, ())):
+            for (v, weight, step) in edge_list:
+                next_g = u_g + weight
+                known = g[v]
+                if known != -1:
+                    if known <= next_g:
+                        continue
+                    reopened += 1
+                g[v] = next_g
+                parent[v] = u
+                via[v] = step
+                (r, c) = divmod(cells[v], width)
+                f = next_g + abs(r - end_r) + abs(c - end_c)
+                heappush(open, (f << f_shift) | ((g_mask - next_g) << shift) | v)
+                pushes += 1
+        if len(open) > max_frontier:
+            max_frontier = len(open)
+
+    stats.timings["search"] = time.perf_counter() - start_time
+    (stats.found, stats.expanded, stats.pushes) = (found, expanded, pushes)
+    (stats.pops, stats.max_frontier, stats.reopened) = (pushes - len(open), max_frontier, reopened)
+    with stats.timed("path"):
+        path = []
+        if found:
+            path = [divmod(each, width) for each in expand_path(contraction, cells, parent, via, target_id)]
+        explored = expand_explored(contraction, cells, parent, via, closed, graph.size)
+    stats.path_length = len(path)
+    return path, bitmap_positions(explored, width), stats
+
+
+def contracted_dfs(contraction, start, end, observer=None):
+    """
+    Solves the maze using Depth-First Search on its junction graph, returns
+    statistics and pathing.
+
+    Args:
+        contraction (Contraction): The junction graph of the maze
+        start    (tuple): (r,c) of the starting position
+        end      (tuple): (r,c) of the end position
+        observer (callable): Optional observer(event, cell), called on
+                          every stats.EXPAND and stats.PUSH of a junction
+
+    Returns:
+        path      (list): Contains all the tiles traversed from the
+                          start node in order to reach the end node
+        visited    (set): All Nodes explored while trying to find the path
+        stats (SearchStats): Counters and timings of the search
+    """
+
+    graph = contraction.graph
+    width = graph.width
+    stats = SearchStats()
+    start_time = time.perf_counter()
+
+    source = start[0] * width + start[1]
+    target = end[0] * width + end[1]
+    source_id, target_id, extra, cells = query_graph(contraction, source, target)
+    count = len(cells)
+    real = len(contraction.cells)
+    offsets = contraction.offsets
+    targets = contraction.targets
+    steps = contraction.steps
+
+    parent = array("i", [-1]) * count
+    via = array("i", [-1]) * count
+    visited = bytearray(count)
+    visited[source_id] = 1
+    stack = []
+    push = observed(stack.append, observer, PUSH, cells.__getitem__)
+    push(source_id)
+    expanded = 0
+    pushes = 1
+    max_frontier = 1
+    found = False
+
+    while stack:
+        u = stack.pop()
+        expanded += 1
+        if observer is not None:
+            observer(EXPAND, cells[u])
+        if u == target_id:
+            found = True
+            break
+
+        edges = zip(targets[offsets[u]:offsets[u + 1]], steps[offsets[u]:offsets[u + 1]]) if u < real else ()
+        for (v, step) in list(edges) + [(v, step) for (v, _, step) in extra.get(u, ())]:
+            if not visited[v]:
+                visited[v] = 1
+                parent[v] = u
+                via[v] = step
+                push(v)
+                pushes += 1
+        if len(stack) > max_frontier:
+            max_frontier = len(stack)
+
+    stats.timings["search"] = time.perf_counter() - start_time
+    (stats.found, stats.expanded, stats.pushes) = (found, expanded, pushes)
+    (stats.pops, stats.max_frontier) = (expanded, max_frontier)
+    with stats.timed("path"):
+        path = []
+        if found:
+            path = [divmod(each, width) for each in expand_path(contraction, cells, parent, via, target_id)]
+        explored = expand_explored(contraction, cells, parent, via, visited, graph.size)
+    stats.path_length = len(path)
+    return path, bitmap_positions(explored, width), stats
@@ -1,88 +1,299 @@
+import sys
 import time
 
+from maze import as_maze, trace_path
+from stats import CHECK_EVERY, EXPAND, PUSH, SearchStats, observed
+from workspace import Workspace
 
-def get_neighbours(current, maze, visited):
+
+class DFSSearch:
+    """
+    State of a Depth-First Search between two cells, which can be run to
+    the end in one go, as dfs_search does, or in slices that pause and
+    resume, as checkpoint.ResumableSearch does.
+
+    Cells are marked visited when pushed, so each is pushed at most once,
+    and only their parent index is stored. The path can be rebuilt from
+    the parents once the end is popped, keeping memory linear in the size
+    of the maze.
+
+    Attributes:
+        graph          (Maze): Contains the maze, or its Adjacency index.
+        source          (int): Flat index of the starting position.
+        target          (int): Flat index of the end position.
+        workspace (Workspace): Parents, visited stamps and expansion order.
+        stack          (list): Flat indices of the cells still to expand.
+        pushes          (int): Number of pushes so far.
+        max_frontier    (int): Largest size of the stack so far.
+        found          (bool): Whether the end was reached.
+        done           (bool): Whether the search has finished.
     """
-    Returns all valid neighbours of the current Node
+
+    def __init__(self, graph, source, target, workspace, observer=None):
+        """
+        Resets the workspace and pushes the starting position.
+
+        Args:
+            graph          (Maze): Contains the maze, or its Adjacency index
+            source          (int): Flat index of the starting position
+            target          (int): Flat index of the end position
+            workspace (Workspace): Buffers to search in, reset by this call
+            observer   (callable): Optional observer(event, cell), called on
+                                   every stats.EXPAND and stats.PUSH
+        """
+
+        self.graph = graph
+        self.source = source
+        self.target = target
+        self.workspace = workspace
+        self.stack = []
+        self.pushes = 1
+        self.max_frontier = 1
+        self.found = False
+        self.done = False
+        self.observe(observer)
+
+        generation = workspace.reset()
+        workspace.seen[source] = generation
+        workspace.parent[source] = -1
+        self._push(source)
+
+    def observe(self, observer):
+        """
+        Sets the observer(event, cell) called on every later stats.EXPAND
+        and stats.PUSH, None for none.
+        """
+        self._push = observed(self.stack.append, observer, PUSH)
+        self._expand = observed(self.workspace.order.append, observer, EXPAND)
+
+    def run(self, limit=None, deadline=None):
+        """
+        Runs the search until it finishes, or pauses it once limit more
+        cells were expanded or time.perf_counter() passes deadline, which
+        is only read every stats.CHECK_EVERY expansions.
+
+        Args:
+            limit           (int): Optional number of cells to expand
+            deadline      (float): Optional time.perf_counter() to pause at
+
+        Returns:
+            done           (bool): Whether the search has finished
+        """
+
+        neighbours = self.graph.neighbours
+        workspace = self.workspace
+        (parent, visited, generation) = (workspace.parent, workspace.seen, workspace.generation)
+        order = workspace.order
+        expand = self._expand
+        stack = self.stack
+        push = self._push
+        target = self.target
+        (pushes, max_frontier) = (self.pushes, self.max_frontier)
+
+        # pause once pops reaches stop, looking at the clock every CHECK_EVERY pops
+        pops = len(order)
+        stop = pops + limit if limit is not None else sys.maxsize
+        pause = stop if deadline is None else min(stop, pops + CHECK_EVERY)
+
+        while stack:
+            if pops >= pause:
+                if pops >= stop or time.perf_counter() >= deadline:
+                    break
+                pause = min(stop, pops + CHECK_EVERY)
+
+            # pop the top from stack
+            current = stack.pop()
+            pops += 1
+            expand(current)
+            if current == target:
+                self.found = True
+                break
+
+            # top left right bottom order, so the stack pops bottom right left top
+            for each in neighbours(current):
+                if visited[each] != generation:
+                    visited[each] = generation
+                    parent[each] = current
+                    push(each)
+                    pushes += 1
+            if len(stack) > max_frontier:
+                max_frontier = len(stack)
+
+        (self.pushes, self.max_frontier) = (pushes, max_frontier)
+        self.done = self.found or not stack
+        return self.done
+
+    def stats(self):
+        """
+        Returns the counters of the search so far, without timings.
+        """
+        expanded = len(self.workspace.order)
+        return SearchStats(self.found, expanded, self.pushes, expanded, self.max_frontier)
+
+
+def dfs_search(graph, source, target, workspace, observer=None):
+    """
+    Runs Depth-First Search between two cells, leaving parents and the
+    expansion order in the workspace. See DFSSearch for the details.
 
     Args:
-        current      (tuple): Tuple containing the Node's current position.
-        maze          (list): Contains the maze.
-                              Used to check if Node is within bounds
-        visited        (set): Contains a list of visited nodes. Used to filter out neighbours
-                              that have already been visited.
+        graph          (Maze): Contains the maze, or its Adjacency index
+        source          (int): Flat index of the starting position
+        target          (int): Flat index of the end position
+        workspace (Workspace): Buffers to search in, reset by this call
+        observer   (callable): Optional observer(event, cell), called on
+                               every stats.EXPAND and stats.PUSH
 
     Returns:
-        neighbours    (list): Contains a list of valid neighbours
-
+        stats    (SearchStats): Counters and search time, path_length is
+                               left for the caller to fill in
     """
 
-    r = current[0]
-    c = current[1]
-
-    # top left right bottom priority but
-    # stack: last in first out
-    # so technically bottom right left top
-    all_neighbours = [(r - 1, c),
-                      (r, c - 1),
-                      (r, c + 1),
-                      (r + 1, c), ]
-    neighbours = []
-    # filters valid neighbours
-    for each in all_neighbours:
-        # go next if out of bounds, is a wall or visited
-        if each in visited:
-            continue
-        if each[0] < 0 or each[0] > len(maze) - 1:  # row bounds check
-            continue
-        if each[1] < 0 or each[1] > len(maze[0]) - 1:  # column bounds check
-            continue
-        if maze[each[0]][each[1]] == '#':
-            continue
-
-        # append and return list of valid neighbours
-        neighbours.append(each)
-    return neighbours
-
-
-def dfs(maze, start, end):
+    start_time = time.perf_counter()
+    search = DFSSearch(graph, source, target, workspace, observer)
+    search.run()
+    stats = search.stats()
+    stats.timings["search"] = time.perf_counter() - start_time
+    return stats
+
+
+def dfs(maze, start, end, adjacency=None, workspace=None, observer=None):
     """
     Solves the maze given using Depth-First Search,
         returns statistics and pathing.
 
     Args:
-        maze      (list): Array containing the maze, should be the return
+        maze      (Maze): Contains the maze, should be the return
                             value of read_maze(filename)
         start    (tuple): (r,c) of the starting position
         end      (tuple): (r,c) of the end position
+        adjacency (Adjacency): Optional precomputed index of the maze,
+                          walked instead of the maze when given
+        workspace (Workspace): Optional buffers to reuse from an earlier
+                          query on the same maze
+        observer (callable): Optional observer(event, cell), called on
+                          every stats.EXPAND and stats.PUSH
 
     Returns:
         path      (list): Contains all the tiles traversed from the
-                          start node in order to reach the end node
+                          start node in order to reach the end node,
+                          empty if the end cannot be reached
         visited    (set): All Nodes explored while trying to find the path
+        stats (SearchStats): Counters and timings of the search
+    """
+
+    graph = adjacency if adjacency is not None else as_maze(maze)
+    width = graph.width
+    if workspace is None:
+        workspace = Workspace(graph.size)
+
+    target = end[0] * width + end[1]
+    stats = dfs_search(graph, start[0] * width + start[1], target, workspace, observer)
+    with stats.timed("path"):
+        path = trace_path(workspace.parent, target, width) if stats.found else []
+    stats.path_length = len(path)
+    return path, workspace.explored(width), stats
+
+
+def dfs_deepening(maze, start, end, adjacency=None, limit=None, explored=False):
     """
+    Solves the maze given using iterative deepening Depth-First Search,
+        for mazes too large for the parent array of dfs.
+
+    Each round is a depth-limited search that only keeps the current path,
+    the set of cells on it and the neighbours left to try at each step, so
+    memory grows with the limit rather than with the maze. Cells are only
+    kept off the path they are already on, so a cell is searched again
+    whenever another path reaches it, which is cheap in mazes of 1-wide
+    corridors but grows quickly in open areas. When a round is cut short by
+    the limit without reaching the end, the limit is doubled and the search
+    restarts, so the number of rounds grows with the log of the path
+    length.
+
+    Args:
+        maze      (Maze): Contains the maze, should be the return
+                            value of read_maze(filename)
+        start    (tuple): (r,c) of the starting position
+        end      (tuple): (r,c) of the end position
+        adjacency (Adjacency): Optional precomputed index of the maze,
+                          walked instead of the maze when given
+        limit      (int): Depth limit of the first round, defaults to the
+                          Manhattan distance from start to end
+        explored  (bool): Whether to collect the cells the last round
+                          searched, which costs memory linear in them
+
+    Returns:
+        path      (list): Contains all the tiles traversed from the
+                          start node in order to reach the end node,
+                          empty if the end cannot be reached
+        visited    (set): All Nodes explored by the last round, empty
+                          unless explored is set
+        stats (SearchStats): Counters and timings over all rounds, where
+                          reopened counts the cells expanded again by a
+                          later round and every round is timed separately
+    """
+
+    graph = adjacency if adjacency is not None else as_maze(maze)
+    neighbours = graph.neighbours
+    width = graph.width
+
+    source = start[0] * width + start[1]
+    target = end[0] * width + end[1]
+    if limit is None:
+        limit = abs(start[0] - end[0]) + abs(start[1] - end[1])
+    limit = max(limit, 1)
+    stats = SearchStats()
+    previous = 0
+
+    while True:
+        # depth-limited round, the stack holds the current path only
+        rounds = len(stats.timings) + 1
+        with stats.timed("round %i" % rounds):
+            on_path = {source}
+            seen = {source} if explored else None
+            path = [source]
+            branches = [reversed(neighbours(source))]
+            expanded = 1
+            cut = False
+
+            while path:
+                current = path[-1]
+                if current == target:
+                    stats.found = True
+                    break
+
+                # bottom right left top, the same order dfs pops in
+                if len(path) <= limit:
+                    for each in branches[-1]:
+                        if each not in on_path:
+                            on_path.add(each)
+                            expanded += 1
+                            path.append(each)
+                            branches.append(reversed(neighbours(each)))
+                            if seen is not None:
+                                seen.add(each)
+                            if len(path) > stats.max_frontier:
+                                stats.max_frontier = len(path)
+                            break
+                    else:
+                        on_path.remove(path.pop())
+                        branches.pop()
+                else:
+                    cut = True
+                    on_path.remove(path.pop())
+                    branches.pop()
+
+        # cells of earlier rounds are searched again by this one
+        stats.reopened += min(expanded, previous)
+        previous = expanded
+        stats.expanded += expanded
+        stats.pushes += expanded
+        stats.pops = stats.pushes - len(path)
 
-    # initialize path, stack, visited and start_time
-    path = []
-    stack = []
-    visited = set()
-    start_time = time.time()
-    stack.append((start, [start]))
-
-    while stack:
-        # pop the top from stack
-        (current, path) = stack.pop()
-        if current == end:
-            print("\nDepth-First Search:\nNodes explored: %i\nTime taken: %s\nPath length: %i steps"
-                  % (len(visited),
-                     time.time() - start_time,
-                     len(path)))
-            return path, visited
-
-        neighbours = get_neighbours(current, maze, visited)
-        visited.add(current)
-
-        for neighbour in neighbours:
-            stack.append((neighbour, path + [neighbour]))
-
-    return path
+        # the end was reached, or every path was searched without hitting the limit
+        if stats.found or not cut:
+            path = [divmod(each, width) for each in path]
+            stats.path_length = len(path)
+            visited = {divmod(each, width) for each in seen} if seen is not None else set()
+            return path, visited, stats
+        limit *= 2
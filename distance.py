@@ -0,0 +1,244 @@
+import time
+from array import array
+
+import numpy as np
+
+from maze import OPEN, as_maze
+from stats import SearchStats
+
+# distance of the cells that cannot reach the target
+UNREACHABLE = 0xFFFFFFFF
+
+# direction of the parent of a cell in a DistanceField, NONE for the source
+# and the cells that were not reached
+NONE = 0
+UP = 1
+LEFT = 2
+RIGHT = 3
+DOWN = 4
+
+# frontiers holding more than 1 / DENSE_RATIO of the cells are expanded
+# with whole-grid shifted masks, smaller ones as arrays of indices
+DENSE_RATIO = 32
+
+
+class DistanceField:
+    """
+    Breadth-first distances from one source cell to every cell of a maze,
+    with the direction of the parent each cell was reached from, so the
+    shortest path to any cell can be read off without searching again.
+
+    Attributes:
+        height       (int): Number of rows in the maze.
+        width        (int): Number of columns in the maze.
+        source       (int): Flat index of the source cell.
+        distances (ndarray): (height, width) uint32 steps from the source,
+                            UNREACHABLE for walls and cells not reached.
+        parents  (ndarray): (height, width) uint8 direction of the parent
+                            of every cell, UP, LEFT, RIGHT or DOWN, NONE
+                            for the source and the cells not reached.
+        stats (SearchStats): Counters and timings of the search.
+    """
+
+    __slots__ = ("height", "width", "source", "distances", "parents", "stats")
+
+    def __init__(self, height, width, source, distances, parents, stats):
+        self.height = height
+        self.width = width
+        self.source = source
+        self.distances = distances
+        self.parents = parents
+        self.stats = stats
+
+    @property
+    def reachable(self):
+        """
+        (height, width) bool mask of the cells reached from the source.
+        """
+        return self.distances != UNREACHABLE
+
+    def path_to(self, position):
+        """
+        Reads the shortest path from the source to a cell off the parent
+        directions.
+
+        Args:
+            position  (tuple): (row, column) of the cell
+
+        Returns:
+            path       (list): Positions from the source to the cell, empty
+                               if the cell was not reached
+        """
+
+        (r, c) = position
+        if self.distances[r, c] == UNREACHABLE:
+            return []
+        parents = self.parents
+        path = [(r, c)]
+        for _ in range(int(self.distances[r, c])):
+            direction = parents[r, c]
+            if direction == UP:
+                r -= 1
+            elif direction == DOWN:
+                r += 1
+            elif direction == LEFT:
+                c -= 1
+            else:
+                c += 1
+            path.append((r, c))
+        return path[::-1]
+
+
+def distance_field(maze, source, target=None):
+    """
+    Computes the breadth-first distance from a source cell to every cell of
+    a maze, expanding the whole frontier at each step with NumPy.
+
+    The maze is padded with a border of walls, so the four neighbours of a
+    cell are always at -width, -1, +1 and +width in the padded grid. Small
+    frontiers are kept as arrays of flat indices and shifted by these
+    offsets; a frontier holding a large part of the grid is expanded with
+    shifted boolean masks of the whole grid instead. Either way the cost
+    per step is a handful of NumPy calls, with no per-cell Python code.
+    Cells reached by several frontier cells take the parent found first in
+    the order up, left, right, down.
+
+    Args:
+        maze         (Maze): Contains the maze, a list of rows is
+                             also accepted
+        source        (int): Flat index of the source cell
+        target        (int): Optional flat index of a cell, the sweep stops
+                             once it is reached and the distances of cells
+                             farther than it are left UNREACHABLE
+
+    Returns:
+        field (DistanceField): The distances and parent directions
+    """
+
+    start_time = time.perf_counter()
+    maze = as_maze(maze)
+    (height, width) = (maze.height, maze.width)
+    padded = width + 2
+    size = (height + 2) * padded
+
+    # open cells not reached yet, in the padded grid
+    free = np.zeros((height + 2, padded), dtype=bool)
+    free[1:-1, 1:-1] = np.frombuffer(maze.walls, dtype=np.uint8).reshape(height, width) == OPEN
+    free = free.reshape(-1)
+    distances = np.full(size, UNREACHABLE, dtype=np.uint32)
+    parents = np.zeros(size, dtype=np.uint8)
+
+    # moving by each offset, the parent of the cell reached lies the opposite way
+    offsets = np.array([-padded, -1, 1, padded], dtype=np.int64)
+    directions = np.array([DOWN, RIGHT, LEFT, UP], dtype=np.uint8)
+
+    (r, c) = divmod(source, width)
+    frontier = np.array([(r + 1) * padded + c + 1], dtype=np.int64)
+    if target is not None:
+        (r, c) = divmod(target, width)
+        target = (r + 1) * padded + c + 1
+    reached = 0
+    max_frontier = 0
+    if free[frontier[0]]:
+        free[frontier] = False
+        distances[frontier] = 0
+        reached = 1
+        max_frontier = 1
+    else:
+        frontier = frontier[:0]
+
+    step = 0
+    while len(frontier) and (target is None or distances[target] == UNREACHABLE):
+        step += 1
+        if len(frontier) * DENSE_RATIO > size:
+            frontier = _dense_step(frontier, free, parents, offsets, directions, size)
+        else:
+            frontier = _sparse_step(frontier, free, parents, offsets, directions)
+        distances[frontier] = step
+        reached += len(frontier)
+        if len(frontier) > max_frontier:
+            max_frontier = len(frontier)
+
+    found = target is not None and distances[target] != UNREACHABLE
+    stats = SearchStats(found, reached, reached, reached - len(frontier), max_frontier)
+    stats.timings["search"] = time.perf_counter() - start_time
+    return DistanceField(height, width, source,
+                         np.ascontiguousarray(distances.reshape(height + 2, padded)[1:-1, 1:-1]),
+                         np.ascontiguousarray(parents.reshape(height + 2, padded)[1:-1, 1:-1]), stats)
+
+
+def _sparse_step(frontier, free, parents, offsets, directions):
+    """
+    Expands a frontier of flat indices, returning the sorted indices of the
+    cells it reaches.
+    """
+
+    cells = (offsets[:, None] + frontier).reshape(-1)
+    codes = np.repeat(directions, len(frontier))
+    keep = free[cells]
+    (cells, first) = np.unique(cells[keep], return_index=True)
+    free[cells] = False
+    parents[cells] = codes[keep][first]
+    return cells
+
+
+def _dense_step(frontier, free, parents, offsets, directions, size):
+    """
+    Expands a frontier with shifted boolean masks of the whole padded grid,
+    returning the sorted indices of the cells it reaches.
+    """
+
+    current = np.zeros(size, dtype=bool)
+    current[frontier] = True
+    reached = np.zeros(size, dtype=bool)
+    for (offset, direction) in zip(offsets.tolist(), directions.tolist()):
+        shifted = np.zeros(size, dtype=bool)
+        if offset > 0:
+            shifted[offset:] = current[:-offset]
+        else:
+            shifted[:offset] = current[-offset:]
+        shifted &= free
+        shifted &= ~reached
+        parents[shifted] = direction
+        reached |= shifted
+    free &= ~reached
+    return np.flatnonzero(reached)
+
+
+def goal_distances(graph, target):
+    """
+    Computes the exact number of steps from every cell to a target cell,
+    with a breadth-first search outwards from the target.
+
+    Mazes are swept with distance_field; an Adjacency index, which has no
+    grid to sweep, is searched one cell at a time.
+
+    Args:
+        graph    (Maze): Contains the maze, or its Adjacency index
+        target    (int): Flat index of the target cell
+
+    Returns:
+        distances (array): uint32 distance of every cell, UNREACHABLE for
+                           walls and cells cut off from the target
+    """
+
+    if hasattr(graph, "walls"):
+        distances = array("I")
+        distances.frombytes(distance_field(graph, target).distances.tobytes())
+        return distances
+
+    neighbours = graph.neighbours
+    distances = array("I", [UNREACHABLE]) * graph.size
+    distances[target] = 0
+    frontier = [target]
+    steps = 0
+    while frontier:
+        steps += 1
+        reached = []
+        for cell in frontier:
+            for each in neighbours(cell):
+                if distances[each] == UNREACHABLE:
+                    distances[each] = steps
+                    reached.append(each)
+        frontier = reached
+    return distances
@@ -0,0 +1,403 @@
+import argparse
+import random
+import time
+from array import array
+
+import numpy as np
+
+from maze import OPEN, WALL, Maze
+
+BACKTRACKER = "backtracker"
+KRUSKAL = "kruskal"
+PRIM = "prim"
+ELLER = "eller"
+ALGORITHMS = (BACKTRACKER, KRUSKAL, PRIM, ELLER)
+
+# passage bits of a cell, towards its right and lower neighbours
+EAST = 1
+SOUTH = 2
+
+# one character per cell followed by a space, as in the maze files
+_CHARS = bytes.maketrans(bytes([OPEN, WALL]), b"-#")
+
+# edges of kruskal shuffled and walked through per chunk
+_EDGE_CHUNK = 1 << 16
+
+
+def _backtracker(h, w, rng):
+    """
+    Carves a perfect maze with a randomized depth-first search.
+
+    Returns:
+        passages (bytearray): EAST and SOUTH bits of every cell
+    """
+
+    size = h * w
+    passages = bytearray(size)
+    visited = bytearray(size)
+    rand = rng.random
+
+    cell = rng.randrange(size)
+    visited[cell] = 1
+    stack = array("i", [cell])
+    while stack:
+        cell = stack[-1]
+        (r, c) = divmod(cell, w)
+        options = []
+        if r > 0 and not visited[cell - w]:
+            options.append(cell - w)
+        if c > 0 and not visited[cell - 1]:
+            options.append(cell - 1)
+        if c < w - 1 and not visited[cell + 1]:
+            options.append(cell + 1)
+        if r < h - 1 and not visited[cell + w]:
+            options.append(cell + w)
+        if not options:
+            stack.pop()
+            continue
+
+        each = options[int(rand() * len(options))]
+        _carve(passages, cell, each, w)
+        visited[each] = 1
+        stack.append(each)
+    return passages
+
+
+def _prim(h, w, rng):
+    """
+    Grows a perfect maze from a random cell, joining a random frontier cell
+    to a random neighbour already in the maze at every step.
+
+    Returns:
+        passages (bytearray): EAST and SOUTH bits of every cell
+    """
+
+    size = h * w
+    passages = bytearray(size)
+    # 0 outside the maze, 1 on the frontier, 2 in the maze
+    state = bytearray(size)
+    frontier = array("i")
+    rand = rng.random
+
+    def neighbours(cell):
+        (r, c) = divmod(cell, w)
+        if r > 0:
+            yield cell - w
+        if c > 0:
+            yield cell - 1
+        if c < w - 1:
+            yield cell + 1
+        if r < h - 1:
+            yield cell + w
+
+    cell = rng.randrange(size)
+    while True:
+        state[cell] = 2
+        for each in neighbours(cell):
+            if not state[each]:
+                state[each] = 1
+                frontier.append(each)
+        if not frontier:
+            return passages
+
+        # swap a random frontier cell to the end and take it
+        k = int(rand() * len(frontier))
+        cell = frontier[k]
+        frontier[k] = frontier[-1]
+        frontier.pop()
+        inside = [each for each in neighbours(cell) if state[each] == 2]
+        _carve(passages, cell, inside[int(rand() * len(inside))], w)
+
+
+def _kruskal(h, w, rng):
+    """
+    Builds a perfect maze by removing the walls between cells in random
+    order, whenever the cells are not connected yet.
+
+    Returns:
+        passages (bytearray): EAST and SOUTH bits of every cell
+    """
+
+    size = h * w
+    passages = bytearray(size)
+    parent = array("i")
+    parent.frombytes(np.arange(size, dtype=np.int32).tobytes())
+    shuffle = np.random.default_rng(rng.getrandbits(64))
+
+    # edge e is the EAST (e even) or SOUTH (e odd) wall of cell e >> 1, shuffled
+    # in place as uint32 so the edges cost 8 bytes per cell at most
+    order = np.arange(2 * size, dtype=np.uint32)
+    shuffle.shuffle(order)
+    for first in range(0, len(order), _EDGE_CHUNK):
+        for edge in order[first:first + _EDGE_CHUNK].tolist():
+            cell = edge >> 1
+            if edge & 1:
+                if cell >= size - w:
+                    continue
+                other = cell + w
+            else:
+                if cell % w == w - 1:
+                    continue
+                other = cell + 1
+
+            # find both roots, halving the paths on the way
+            a = cell
+            while parent[a] != a:
+                parent[a] = parent[parent[a]]
+                a = parent[a]
+            b = other
+            while parent[b] != b:
+                parent[b] = parent[parent[b]]
+                b = parent[b]
+            if a != b:
+                parent[b] = a
+                passages[cell] |= SOUTH if edge & 1 else EAST
+    return passages
+
+
+def _carve(passages, cell, other, w):
+    # the passage bit is kept on the upper or left cell of the two
+    if other == cell + 1:
+        passages[cell] |= EAST
+    elif other == cell - 1:
+        passages[other] |= EAST
+    elif other == cell + w:
+        passages[cell] |= SOUTH
+    else:
+        passages[other] |= SOUTH
+
+
+def _grid_rows(passages, h, w):
+    cells = np.frombuffer(passages, dtype=np.uint8).reshape(h, w)
+    for row in cells:
+        yield (row[:-1] & EAST).astype(bool), (row & SOUTH).astype(bool)
+
+
+def _eller(h, w, rng):
+    """
+    Builds a perfect maze one row of cells at a time with Eller's
+    algorithm, the row by row form of Kruskal's. Only the sets of the
+    current row are kept, so memory grows with the width alone.
+
+    Yields:
+        east    (ndarray): Whether each cell but the last opens to its right
+        south   (ndarray): Whether each cell opens to the cell below
+    """
+
+    rand = rng.random
+    labels = list(range(w))
+    for i in range(h):
+        last = i == h - 1
+        parent = list(range(w))
+
+        def find(a):
+            while parent[a] != a:
+                parent[a] = parent[parent[a]]
+                a = parent[a]
+            return a
+
+        # join neighbours of different sets at random, all of them on the last row
+        east = np.zeros(max(w - 1, 0), dtype=bool)
+        for j in range(w - 1):
+            a = find(labels[j])
+            b = find(labels[j + 1])
+            if a != b and (last or rand() < 0.5):
+                parent[b] = a
+                east[j] = True
+
+        south = np.zeros(w, dtype=bool)
+        if not last:
+            # every set goes down at least once, the rest start new sets
+            groups = {}
+            for j in range(w):
+                groups.setdefault(find(labels[j]), []).append(j)
+            for columns in groups.values():
+                down = [j for j in columns if rand() < 0.5]
+                if not down:
+                    down = [columns[int(rand() * len(columns))]]
+                south[down] = True
+
+            roots = set(groups)
+            fresh = (label for label in range(w) if label not in roots)
+            labels = [find(labels[j]) if south[j] else next(fresh) for j in range(w)]
+        yield east, south
+
+
+def _braid(rows, w, braid, loops, rng):
+    """
+    Adds loops to the rows of a perfect maze, by opening one more wall of
+    a share of the dead ends and a share of all remaining walls.
+
+    Only the right, left and lower walls of a cell are opened, so the row
+    above never changes once it has been yielded.
+    """
+
+    shuffle = np.random.default_rng(rng.getrandbits(64))
+    rand = rng.random
+    north = np.zeros(w, dtype=bool)
+    rows = iter(rows)
+    row = next(rows, None)
+    while row is not None:
+        (east, south) = row
+        row = next(rows, None)
+        last = row is None
+
+        if braid:
+            degree = north.astype(np.int8) + south
+            degree[:-1] += east
+            degree[1:] += east
+            for j in np.flatnonzero((degree == 1) & (shuffle.random(w) < braid)).tolist():
+                options = []
+                if j > 0 and not east[j - 1]:
+                    options.append(j - 1)
+                if j < w - 1 and not east[j]:
+                    options.append(j)
+                if not last and not south[j]:
+                    options.append(-1)
+                if options:
+                    each = options[int(rand() * len(options))]
+                    if each == -1:
+                        south[j] = True
+                    else:
+                        east[each] = True
+
+        if loops:
+            east |= shuffle.random(len(east)) < loops
+            if not last:
+                south |= shuffle.random(w) < loops
+
+        north = south
+        yield east, south
+
+
+def generate_rows(height, width, algorithm=BACKTRACKER, seed=0, braid=0.0, loops=0.0):
+    """
+    Generates a maze row by row, as WALL and OPEN bytes.
+
+    Cells sit on the odd rows and columns, with the walls between them in
+    between, and the entrance in the top row and exit in the bottom row as
+    get_start_end expects. When the height or width is even, the last row
+    or column is an extra wall that the exit passes through.
+
+    ELLER keeps only one row of cells in memory, so it reaches any size.
+    The other algorithms keep the whole grid of cells, one per 2 x 2
+    squares of the maze, but never the rows themselves. BACKTRACKER and
+    PRIM need 2 bytes per cell, plus up to 4 for their stack or frontier.
+    KRUSKAL needs 13: a byte of passages, a 4 byte parent and 8 bytes for
+    the shuffled walls, about 330 MB for a 10001 x 10001 maze.
+
+    Args:
+        height       (int): Number of rows, at least 3
+        width        (int): Number of columns, at least 3
+        algorithm    (str): One of ALGORITHMS
+        seed         (int): Seed of the random generator
+        braid      (float): Share of the dead ends opened into a loop
+        loops      (float): Share of all remaining walls between cells removed
+
+    Yields:
+        row    (bytearray): WALL or OPEN for every column of the row
+    """
+
+    if algorithm not in ALGORITHMS:
+        raise ValueError("unknown algorithm %r, expected one of %s" % (algorithm, ", ".join(ALGORITHMS)))
+    if height < 3 or width < 3:
+        raise ValueError("mazes need at least 3 rows and columns, got %i x %i" % (height, width))
+
+    rng = random.Random(seed)
+    (h, w) = ((height - 1) // 2, (width - 1) // 2)
+    entrance = 2 * rng.randrange(w) + 1
+    exit = 2 * rng.randrange(w) + 1
+
+    if algorithm == ELLER:
+        rows = _eller(h, w, rng)
+    else:
+        carve = {BACKTRACKER: _backtracker, KRUSKAL: _kruskal, PRIM: _prim}[algorithm]
+        rows = _grid_rows(carve(h, w, rng), h, w)
+    if braid or loops:
+        rows = _braid(rows, w, braid, loops, rng)
+
+    row = np.full(width, WALL, dtype=np.uint8)
+    row[entrance] = OPEN
+    yield bytearray(row.tobytes())
+
+    for (i, (east, south)) in enumerate(rows):
+        # cells and the passages to their right
+        row = np.full(width, WALL, dtype=np.uint8)
+        row[1:2 * w:2] = OPEN
+        row[2:2 * w - 1:2][east] = OPEN
+        yield bytearray(row.tobytes())
+
+        # passages down, only the exit on the last row
+        row = np.full(width, WALL, dtype=np.uint8)
+        if i < h - 1:
+            row[1:2 * w:2][south] = OPEN
+        else:
+            row[exit] = OPEN
+        yield bytearray(row.tobytes())
+
+    # the extra last row of an even height
+    if 2 * h + 1 < height:
+        row = np.full(width, WALL, dtype=np.uint8)
+        row[exit] = OPEN
+        yield bytearray(row.tobytes())
+
+
+def write_maze(file_name, height, width, algorithm=BACKTRACKER, seed=0, braid=0.0, loops=0.0):
+    """
+    Writes a generated maze in the '#'/'-' format of the maze files, one
+    row at a time.
+
+    Args:
+        file_name    (str): The .txt file to write
+        height       (int): Number of rows, at least 3
+        width        (int): Number of columns, at least 3
+        algorithm    (str): One of ALGORITHMS
+        seed         (int): Seed of the random generator
+        braid      (float): Share of the dead ends opened into a loop
+        loops      (float): Share of all remaining walls between cells removed
+    """
+
+    line = bytearray(b" " * (2 * width) + b"\n")
+    with open(file_name, "wb") as file:
+        for row in generate_rows(height, width, algorithm, seed, braid, loops):
+            line[0:2 * width:2] = row.translate(_CHARS)
+            file.write(line)
+
+
+def generate_maze(height, width, algorithm=BACKTRACKER, seed=0, braid=0.0, loops=0.0):
+    """
+    Generates a maze straight into a Maze, without writing it out.
+
+    Args:
+        height       (int): Number of rows, at least 3
+        width        (int): Number of columns, at least 3
+        algorithm    (str): One of ALGORITHMS
+        seed         (int): Seed of the random generator
+        braid      (float): Share of the dead ends opened into a loop
+        loops      (float): Share of all remaining walls between cells removed
+
+    Returns:
+        maze        (Maze): The generated maze, with its start and end set
+    """
+
+    walls = bytearray().join(generate_rows(height, width, algorithm, seed, braid, loops))
+    maze = Maze(walls, height, width)
+    (maze.start, maze.end) = maze.find_start_end()
+    return maze
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generates a maze file.")
+    parser.add_argument("file_name", help="the .txt file to write")
+    parser.add_argument("height", type=int, help="number of rows")
+    parser.add_argument("width", type=int, help="number of columns")
+    parser.add_argument("--algorithm", choices=ALGORITHMS, default=BACKTRACKER)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--braid", type=float, default=0.0, help="share of dead ends opened into loops")
+    parser.add_argument("--loops", type=float, default=0.0, help="share of remaining walls removed")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    write_maze(args.file_name, args.height, args.width, args.algorithm, args.seed, args.braid, args.loops)
+    print("%s: %i x %i %s maze in %.2f s"
+          % (args.file_name, args.height, args.width, args.algorithm, time.perf_counter() - start_time))
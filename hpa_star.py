@@ -0,0 +1,563 @@
+import heapq
+import os
+import struct
+import sys
+import time
+from array import array
+
+from distance import UNREACHABLE
+from maze import WALL, Maze, as_maze
+from stats import EXPAND, PUSH, SearchStats, observed
+
+# side of the square clusters, in cells
+CLUSTER_SIZE = 32
+
+# runs of open border crossings at least this long get a transition at
+# each end instead of a single one in the middle
+WIDE_RUN = 6
+
+# header of the on-disk clusters: magic, height, width, cluster size,
+# number of clusters and of borders stored
+_MAGIC = b"MZHPA2\0\0"
+_HEADER = struct.Struct("<8sIIIII")
+
+
+class Cluster:
+    """
+    Entrances of one cluster and the distances between them inside it.
+
+    Attributes:
+        entrances  (list): Flat index of every entrance cell, ascending.
+        index      (dict): Position of every entrance in entrances.
+        distances (array): uint32 k * k distances between the entrances,
+                           walking inside the cluster only, UNREACHABLE if
+                           they are not connected inside it.
+        partners   (dict): Cells across the cluster's borders each entrance
+                           leads to in one step.
+    """
+
+    __slots__ = ("entrances", "index", "distances", "partners")
+
+    def __init__(self, entrances, distances, partners):
+        self.entrances = entrances
+        self.index = {cell: i for (i, cell) in enumerate(entrances)}
+        self.distances = distances
+        self.partners = partners
+
+
+class Hierarchy:
+    """
+    Two-level abstraction of a maze for hierarchical path-finding (HPA*).
+
+    The grid is split into square clusters. Wherever open cells face each
+    other across the border of two clusters, a transition links them, and
+    both cells become entrances of their cluster. Each cluster stores the
+    distances between its entrances inside it, so the entrances and these
+    distances form a small abstract graph that queries search instead of
+    the grid.
+
+    Borders and clusters are built the first time a query needs them, and
+    dropped again when a wall on them toggles, so the hierarchy of a huge
+    maze costs nothing up front and edits only rebuild the clusters they
+    touch. The hierarchy keeps its own copy of the walls.
+
+    Attributes:
+        maze          (Maze): The hierarchy's copy of the maze.
+        cluster_size   (int): Side of the clusters, in cells.
+        rows           (int): Number of rows of clusters.
+        columns        (int): Number of columns of clusters.
+        clusters      (dict): Cluster of every cluster id built so far.
+        borders       (dict): (cluster id, cluster id) of two neighbouring
+                              clusters, lower first, to the list of
+                              (cell, cell) transitions across their border.
+    """
+
+    def __init__(self, maze, cluster_size=CLUSTER_SIZE):
+        if cluster_size < 1:
+            raise ValueError("cluster_size must be at least 1, got %i" % cluster_size)
+        maze = as_maze(maze)
+        self.maze = Maze(bytearray(maze.walls), maze.height, maze.width, maze.start, maze.end)
+        self.cluster_size = cluster_size
+        self.rows = -(-maze.height // cluster_size)
+        self.columns = -(-maze.width // cluster_size)
+        self.clusters = {}
+        self.borders = {}
+
+    def cluster_of(self, cell):
+        """
+        Returns the id of the cluster a flat cell index lies in.
+        """
+        (r, c) = divmod(cell, self.maze.width)
+        return (r // self.cluster_size) * self.columns + c // self.cluster_size
+
+    def box(self, cluster_id):
+        """
+        Returns the (top, left, bottom, right) cells of a cluster, bottom
+        and right excluded.
+        """
+        (cr, cc) = divmod(cluster_id, self.columns)
+        size = self.cluster_size
+        return (cr * size, cc * size, min((cr + 1) * size, self.maze.height), min((cc + 1) * size, self.maze.width))
+
+    def border(self, a, b):
+        """
+        Returns the transitions across the border of two neighbouring
+        clusters, a before b, finding them if needed.
+
+        Along the border, every maximal run of rows or columns whose cells
+        are open on both sides gets one transition in its middle, or one
+        at each end when it is WIDE_RUN long or more.
+
+        Returns:
+            pairs     (list): (cell in a, cell in b) of every transition
+        """
+
+        pairs = self.borders.get((a, b))
+        if pairs is not None:
+            return pairs
+
+        walls = self.maze.walls
+        width = self.maze.width
+        (top, left, bottom, right) = self.box(a)
+        if b == a + 1 and a % self.columns + 1 < self.columns:
+            # b lies right of a, walk down the columns either side, with a
+            # single column of clusters a + 1 is the cluster below instead
+            (first, stride, count, across) = ((top * width) + right - 1, width, bottom - top, 1)
+        else:
+            # b lies below a, walk along the rows either side
+            (first, stride, count, across) = ((bottom - 1) * width + left, 1, right - left, width)
+
+        pairs = []
+        run = []
+        for i in range(count + 1):
+            cell = first + i * stride
+            if i < count and not walls[cell] and not walls[cell + across]:
+                run.append(cell)
+                continue
+            if run:
+                ends = (run[0], run[-1]) if len(run) >= WIDE_RUN else (run[len(run) // 2],)
+                pairs.extend((each, each + across) for each in ends)
+                run = []
+        self.borders[(a, b)] = pairs
+        return pairs
+
+    def cluster(self, cluster_id):
+        """
+        Returns a cluster, building its entrances and the distances between
+        them if needed.
+        """
+
+        cluster = self.clusters.get(cluster_id)
+        if cluster is not None:
+            return cluster
+
+        (cr, cc) = divmod(cluster_id, self.columns)
+        partners = {}
+        neighbours = []
+        if cr > 0:
+            neighbours.append((cluster_id - self.columns, cluster_id))
+        if cc > 0:
+            neighbours.append((cluster_id - 1, cluster_id))
+        if cc + 1 < self.columns:
+            neighbours.append((cluster_id, cluster_id + 1))
+        if cr + 1 < self.rows:
+            neighbours.append((cluster_id, cluster_id + self.columns))
+        for (a, b) in neighbours:
+            for (cell_a, cell_b) in self.border(a, b):
+                (mine, other) = (cell_a, cell_b) if a == cluster_id else (cell_b, cell_a)
+                partners.setdefault(mine, []).append(other)
+
+        entrances = sorted(partners)
+        count = len(entrances)
+        distances = array("I", [UNREACHABLE]) * (count * count)
+        box = self.box(cluster_id)
+        for (i, cell) in enumerate(entrances):
+            (reached, _) = local_search(self.maze, box, cell)
+            for (j, other) in enumerate(entrances):
+                distances[i * count + j] = reached.get(other, UNREACHABLE)
+
+        cluster = Cluster(entrances, distances, partners)
+        self.clusters[cluster_id] = cluster
+        return cluster
+
+    def build(self):
+        """
+        Builds every cluster now instead of on first use.
+        """
+        for cluster_id in range(self.rows * self.columns):
+            self.cluster(cluster_id)
+
+    def update(self, cells):
+        """
+        Toggles the given cells between wall and open, dropping the
+        clusters and borders they lie on so they are rebuilt when next
+        needed.
+
+        Args:
+            cells   (iterable): Positions of the cells that changed from
+                                '#' to '-' or back
+        """
+
+        maze = self.maze
+        size = self.cluster_size
+        for position in cells:
+            if not maze.in_bounds(position):
+                raise ValueError("cell %r lies outside the %i x %i maze" % (position, maze.height, maze.width))
+            (r, c) = position
+            maze.walls[r * maze.width + c] ^= WALL
+            cluster_id = (r // size) * self.columns + c // size
+            self.clusters.pop(cluster_id, None)
+
+            # a cell on the edge of its cluster also changes the border and the cluster beyond it
+            (top, left, bottom, right) = self.box(cluster_id)
+            beyond = []
+            if r == top and r > 0:
+                beyond.append((cluster_id - self.columns, cluster_id))
+            if c == left and c > 0:
+                beyond.append((cluster_id - 1, cluster_id))
+            if c == right - 1 and c + 1 < maze.width:
+                beyond.append((cluster_id, cluster_id + 1))
+            if r == bottom - 1 and r + 1 < maze.height:
+                beyond.append((cluster_id, cluster_id + self.columns))
+            for (a, b) in beyond:
+                self.borders.pop((a, b), None)
+                self.clusters.pop(b if a == cluster_id else a, None)
+
+    def save(self, file_name):
+        """
+        Writes the clusters built so far, and their borders, to a binary
+        file. Clusters that were never built are left out and are built on
+        first use after loading, as usual. The file is written under a
+        temporary name first and then renamed, so processes reading it
+        never see it half written.
+
+        Args:
+            file_name  (str): Path of the hierarchy file
+        """
+
+        maze = self.maze
+        values = array("I")
+        for (cluster_id, cluster) in sorted(self.clusters.items()):
+            values.extend((cluster_id, len(cluster.entrances)))
+            values.extend(cluster.entrances)
+            values.extend(cluster.distances)
+        for ((a, b), pairs) in sorted(self.borders.items()):
+            values.extend((a, b, len(pairs)))
+            for pair in pairs:
+                values.extend(pair)
+        if sys.byteorder == "big":
+            values.byteswap()
+
+        temp_name = "%s.%i.tmp" % (file_name, os.getpid())
+        with open(temp_name, "wb") as file:
+            file.write(_HEADER.pack(_MAGIC, maze.height, maze.width, self.cluster_size,
+                                    len(self.clusters), len(self.borders)))
+            values.tofile(file)
+        os.replace(temp_name, file_name)
+
+    @classmethod
+    def load(cls, maze, file_name):
+        """
+        Reads a hierarchy written by Hierarchy.save. The clusters it holds
+        are ready to use, and the others are built on first use.
+
+        Args:
+            maze        (Maze): The maze the hierarchy was built for
+            file_name    (str): Path of the hierarchy file
+
+        Returns:
+            hierarchy (Hierarchy): The loaded hierarchy
+        """
+
+        with open(file_name, "rb") as file:
+            magic, height, width, cluster_size, cluster_count, border_count = \
+                _HEADER.unpack(file.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError("%s is not a maze hierarchy" % file_name)
+            values = array("I")
+            values.frombytes(file.read())
+        if sys.byteorder == "big":
+            values.byteswap()
+        maze = as_maze(maze)
+        if (height, width) != (maze.height, maze.width):
+            raise ValueError("%s is for a %i x %i maze, not %i x %i"
+                             % (file_name, height, width, maze.height, maze.width))
+
+        hierarchy = cls(maze, cluster_size)
+        at = 0
+        stored = []
+        for _ in range(cluster_count):
+            (cluster_id, count) = values[at:at + 2]
+            at += 2
+            stored.append((cluster_id, values[at:at + count], values[at + count:at + count + count * count]))
+            at += count + count * count
+        for _ in range(border_count):
+            (a, b, count) = values[at:at + 3]
+            at += 3
+            hierarchy.borders[(a, b)] = [(values[at + 2 * i], values[at + 2 * i + 1]) for i in range(count)]
+            at += 2 * count
+
+        # a built cluster always has its borders built, so its partners can be rebuilt from them
+        for (cluster_id, cells, distances) in stored:
+            partners = {}
+            for (a, b) in hierarchy._borders_of(cluster_id):
+                for (cell_a, cell_b) in hierarchy.borders[(a, b)]:
+                    (mine, other) = (cell_a, cell_b) if a == cluster_id else (cell_b, cell_a)
+                    partners.setdefault(mine, []).append(other)
+            hierarchy.clusters[cluster_id] = Cluster(list(cells), distances, partners)
+        return hierarchy
+
+    def _borders_of(self, cluster_id):
+        (cr, cc) = divmod(cluster_id, self.columns)
+        if cr > 0:
+            yield (cluster_id - self.columns, cluster_id)
+        if cc > 0:
+            yield (cluster_id - 1, cluster_id)
+        if cc + 1 < self.columns:
+            yield (cluster_id, cluster_id + 1)
+        if cr + 1 < self.rows:
+            yield (cluster_id, cluster_id + self.columns)
+
+
+def local_search(maze, box, source, target=-1):
+    """
+    Breadth-first search from a cell that never leaves a box of the maze.
+
+    Args:
+        maze         (Maze): Contains the maze
+        box         (tuple): (top, left, bottom, right) cells of the box,
+                             bottom and right excluded
+        source        (int): Flat index of the cell to start from
+        target        (int): Optional flat index to stop at once reached
+
+    Returns:
+        reached      (dict): Steps from the source of every cell reached
+        parent       (dict): Cell every reached cell was reached from, -1
+                             for the source
+    """
+
+    walls = maze.walls
+    width = maze.width
+    (top, left, bottom, right) = box
+    low = top * width
+    high = bottom * width
+    reached = {source: 0}
+    parent = {source: -1}
+    frontier = [source]
+    steps = 0
+    while frontier and target not in reached:
+        steps += 1
+        next_frontier = []
+        for cell in frontier:
+            column = cell % width
+            for (each, inside) in ((cell - width, cell - width >= low), (cell - 1, column > left),
+                                   (cell + 1, column + 1 < right), (cell + width, cell + width < high)):
+                if inside and not walls[each] and each not in reached:
+                    reached[each] = steps
+                    parent[each] = cell
+                    next_frontier.append(each)
+        frontier = next_frontier
+    return reached, parent
+
+
+def hpa_star(hierarchy, start, end, observer=None):
+    """
+    Solves the maze using hierarchical A* on its clusters, returns
+    statistics and pathing.
+
+    The start and end are linked to the entrances of their clusters with a
+    search inside each cluster, A* then searches the abstract graph of
+    entrances, and only the clusters along the abstract path are searched
+    again, cell by cell, to refine it. The work depends on the length of
+    the path, not on the size of the maze. Paths are optimal whenever every
+    border crossing they need is a transition, as in mazes of 1-wide
+    corridors, and otherwise near-optimal.
+
+    Args:
+            hierarchy (Hierarchy): The hierarchy of the maze
+            start    (tuple): Position of the starting position
+            end      (tuple): Position of the end position
+            observer (callable): Optional observer(event, cell), called on
+                              every stats.EXPAND and stats.PUSH of an
+                              entrance
+
+    Returns:
+            path      (list): Contains all the tiles traversed from the
+                              start node in order to reach the end node.
+            closed     (set): Contains all entrances expanded while
+                              trying to find the path.
+            stats (SearchStats): Counters and timings of the search
+    """
+
+    maze = hierarchy.maze
+    width = maze.width
+    stats = SearchStats()
+    start_time = time.perf_counter()
+    source = start[0] * width + start[1]
+    target = end[0] * width + end[1]
+    if maze.walls[source] or maze.walls[target]:
+        stats.timings["search"] = time.perf_counter() - start_time
+        return [], set(), stats
+
+    # link the start and end to the entrances of their clusters
+    source_cluster = hierarchy.cluster_of(source)
+    target_cluster = hierarchy.cluster_of(target)
+    (from_source, _) = local_search(maze, hierarchy.box(source_cluster), source)
+    (to_target, _) = local_search(maze, hierarchy.box(target_cluster), target)
+    into_target = {cell: steps for (cell, steps) in to_target.items()
+                   if cell in hierarchy.cluster(target_cluster).index}
+    if source_cluster == target_cluster and target in from_source:
+        into_target[source] = from_source[target]
+
+    # open list entries are (f << f_shift) | ((mask - g) << shift) | cell, as in astar
+    shift = maze.size.bit_length()
+    g_mask = (1 << (shift + 1)) - 1
+    f_shift = shift + g_mask.bit_length()
+    mask = (1 << shift) - 1
+    heappush = observed(heapq.heappush, observer, PUSH, lambda key: key & mask)
+    (end_r, end_c) = end
+    g = {source: 0}
+    parent = {source: -1}
+    closed = set()
+    open_list = []
+    heappush(open_list, ((abs(start[0] - end_r) + abs(start[1] - end_c)) << f_shift) | (g_mask << shift) | source)
+    pushes = 1
+    reopened = 0
+    max_frontier = 1
+    found = False
+
+    while open_list:
+        key = heapq.heappop(open_list)
+        u = key & mask
+        u_g = g_mask - ((key >> shift) & g_mask)
+        if u_g != g[u]:
+            continue
+        closed.add(u)
+        if observer is not None:
+            observer(EXPAND, u)
+        if u == target:
+            found = True
+            break
+
+        edges = []
+        if u == source:
+            cluster = hierarchy.cluster(source_cluster)
+            edges.extend((cell, from_source[cell]) for cell in cluster.entrances if cell in from_source)
+        cluster = hierarchy.cluster(hierarchy.cluster_of(u))
+        i = cluster.index.get(u)
+        if i is not None:
+            count = len(cluster.entrances)
+            row = cluster.distances[i * count:(i + 1) * count]
+            edges.extend((cell, steps) for (cell, steps) in zip(cluster.entrances, row)
+                         if steps != UNREACHABLE and cell != u)
+            edges.extend((cell, 1) for cell in cluster.partners[u])
+        if u in into_target:
+            edges.append((target, into_target[u]))
+
+        for (v, weight) in edges:
+            next_g = u_g + weight
+            known = g.get(v)
+            if known is not None:
+                if known <= next_g:
+                    continue
+                reopened += 1
+            g[v] = next_g
+            parent[v] = u
+            (r, c) = divmod(v, width)
+            f = next_g + abs(r - end_r) + abs(c - end_c)
+            heappush(open_list, (f << f_shift) | ((g_mask - next_g) << shift) | v)
+            pushes += 1
+        if len(open_list) > max_frontier:
+            max_frontier = len(open_list)
+
+    stats.timings["search"] = time.perf_counter() - start_time
+    (stats.found, stats.expanded, stats.pushes) = (found, len(closed), pushes)
+    (stats.pops, stats.max_frontier, stats.reopened) = (pushes - len(open_list), max_frontier, reopened)
+    with stats.timed("path"):
+        path = []
+        if found:
+            path = [divmod(each, width) for each in refine(hierarchy, parent, target)]
+    stats.path_length = len(path)
+    return path, {divmod(each, width) for each in closed}, stats
+
+
+def refine(hierarchy, parent, target):
+    """
+    Expands the chain of abstract nodes that ends at target back into
+    cells, searching again inside the cluster of every hop.
+
+    Args:
+        hierarchy (Hierarchy): The hierarchy of the maze
+        parent        (dict): Abstract node every node was reached from, -1
+                              for the start
+        target         (int): Flat index of the end
+
+    Returns:
+        path          (list): Flat indices of every cell from start to end
+    """
+
+    hops = [target]
+    while parent[hops[-1]] != -1:
+        hops.append(parent[hops[-1]])
+    hops.reverse()
+
+    path = [hops[0]]
+    for (a, b) in zip(hops, hops[1:]):
+        cluster_id = hierarchy.cluster_of(a)
+        if cluster_id != hierarchy.cluster_of(b):
+            # a transition, b is next to a
+            path.append(b)
+            continue
+        (_, came_from) = local_search(hierarchy.maze, hierarchy.box(cluster_id), a, b)
+        cells = []
+        cell = b
+        while cell != a:
+            cells.append(cell)
+            cell = came_from[cell]
+        path.extend(reversed(cells))
+    return path
+
+
+def cached_hierarchy(maze, file_name, cluster_size=CLUSTER_SIZE):
+    """
+    Returns the hierarchy of a maze loaded from file_name, reading the
+    clusters built so far from file_name + ".hpa" when that cache is newer
+    than the maze file and has the same cluster size, and starting with
+    none built otherwise. Nothing is built up front: clusters are built as
+    queries reach them, and hierarchy.save(file_name + ".hpa") keeps them
+    for the next run.
+
+    Args:
+        maze          (Maze): Contains the maze
+        file_name      (str): The .txt file the maze was read from
+        cluster_size   (int): Side of the clusters, in cells
+
+    Returns:
+        hierarchy (Hierarchy): The hierarchy of the maze
+    """
+
+    cache_name = file_name + ".hpa"
+    try:
+        if os.path.getmtime(cache_name) >= os.path.getmtime(file_name):
+            hierarchy = Hierarchy.load(maze, cache_name)
+            if hierarchy.cluster_size == cluster_size:
+                return hierarchy
+    except (OSError, ValueError, EOFError, struct.error):
+        pass
+    return Hierarchy(maze, cluster_size)
+
+
+def build_hierarchy(maze, cluster_size=CLUSTER_SIZE):
+    """
+    Creates the hierarchy of a maze, whose clusters are built as queries
+    reach them.
+
+    Args:
+        maze          (Maze): Contains the maze, a list of rows is also accepted
+        cluster_size   (int): Side of the clusters, in cells
+
+    Returns:
+        hierarchy (Hierarchy): The hierarchy of the maze
+    """
+
+    return Hierarchy(maze, cluster_size)
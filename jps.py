@@ -0,0 +1,295 @@
+import time
+import heapq
+
+from maze import as_maze
+from stats import EXPAND, PUSH, SearchStats, observed
+from workspace import Workspace
+
+
+def jump_horizontal(maze, current, step, target):
+    """
+    Moves from the current cell along its row until a jump point is found.
+
+    A cell on the row is a jump point if it is the target, or if the cell
+    above or below it is open while the one diagonally behind it is a wall,
+    so that the only shortest way up or down goes through this cell.
+
+    Args:
+        maze      (Maze): Contains the maze
+        current    (int): Flat index of the cell to move from
+        step       (int): 1 to move right, -1 to move left
+        target     (int): Flat index of the end position
+
+    Returns:
+        jump_point (int): Flat index of the jump point, -1 if a wall or the
+                          edge of the maze is reached first
+    """
+
+    walls = maze.walls
+    width = maze.width
+    size = maze.size
+
+    # cells of the current row are row_start <= i < row_start + width
+    row_start = current - current % width
+    row_end = row_start + width
+    i = current
+    while True:
+        i += step
+        if i < row_start or i >= row_end or walls[i]:
+            return -1
+        if i == target:
+            return i
+        behind = i - step
+        if i >= width and not walls[i - width] and walls[behind - width]:
+            return i
+        if i + width < size and not walls[i + width] and walls[behind + width]:
+            return i
+
+
+def jump_vertical(maze, current, step, target):
+    """
+    Moves from the current cell along its column until a jump point is found.
+
+    A cell on the column is a jump point if it is the target, or if a
+    horizontal jump to either side of it finds a jump point.
+
+    Args:
+        maze      (Maze): Contains the maze
+        current    (int): Flat index of the cell to move from
+        step       (int): width to move down, -width to move up
+        target     (int): Flat index of the end position
+
+    Returns:
+        jump_point (int): Flat index of the jump point, -1 if a wall or the
+                          edge of the maze is reached first
+    """
+
+    walls = maze.walls
+    size = maze.size
+    i = current
+    while True:
+        i += step
+        if i < 0 or i >= size or walls[i]:
+            return -1
+        if i == target:
+            return i
+        if jump_horizontal(maze, i, 1, target) != -1 or jump_horizontal(maze, i, -1, target) != -1:
+            return i
+
+
+def directions(maze, current, parent):
+    """
+    Returns the directions to jump in from a jump point, pruning those that
+    an equally short path reaches without passing through the jump point.
+
+    Paths are kept in a canonical form that turns from vertical to
+    horizontal freely, but from horizontal to vertical only where forced.
+
+    Args:
+        maze      (Maze): Contains the maze
+        current    (int): Flat index of the jump point
+        parent     (int): Flat index of the jump point it was reached from,
+                          -1 for the start
+
+    Returns:
+        steps     (list): (jump function, index offset) of each direction
+                          to jump in
+    """
+
+    width = maze.width
+    if parent == -1:
+        return [(jump_vertical, -width), (jump_horizontal, -1),
+                (jump_horizontal, 1), (jump_vertical, width)]
+
+    # moving along a column: carry on, or turn either way along the row
+    if current // width != parent // width:
+        step = width if current > parent else -width
+        return [(jump_vertical, step), (jump_horizontal, -1), (jump_horizontal, 1)]
+
+    # moving along a row: carry on, or turn only where forced
+    walls = maze.walls
+    step = 1 if current > parent else -1
+    behind = current - step
+    steps = [(jump_horizontal, step)]
+    if current >= width and not walls[current - width] and walls[behind - width]:
+        steps.append((jump_vertical, -width))
+    if current + width < maze.size and not walls[current + width] and walls[behind + width]:
+        steps.append((jump_vertical, width))
+    return steps
+
+
+def segment(first, last, width):
+    """
+    Returns the flat indices of the straight line of cells after first,
+    up to and including last.
+    """
+
+    if first // width == last // width:
+        step = 1 if last > first else -1
+    else:
+        step = width if last > first else -width
+    return range(first + step, last + step, step)
+
+
+def jps_search(maze, source, target, workspace, observer=None):
+    """
+    Runs Jump Point Search between two cells, leaving g-costs, parents and
+    the expansion order of the jump points in the workspace.
+
+    Jump Point Search is A* on a uniform-cost grid that only puts jump
+    points on the open list, skipping along straight corridors instead of
+    expanding every cell in them.
+
+    Args:
+        maze           (Maze): Contains the maze
+        source          (int): Flat index of the starting position
+        target          (int): Flat index of the end position
+        workspace (Workspace): Buffers to search in, reset by this call
+        observer   (callable): Optional observer(event, cell), called on
+                               every stats.EXPAND and stats.PUSH of a jump point
+
+    Returns:
+        stats    (SearchStats): Counters and search time, path_length is
+                               left for the caller to fill in
+    """
+
+    start_time = time.perf_counter()
+    width = maze.width
+    generation = workspace.reset()
+    g = workspace.g
+    parent = workspace.parent
+    seen = workspace.seen
+    order = workspace.order
+    pushes = 1
+    reopened = 0
+    max_frontier = 1
+    found = False
+
+    # open list entries are (f << f_shift) | ((mask - g) << shift) | index
+    shift = maze.size.bit_length()
+    f_shift = 2 * shift
+    mask = (1 << shift) - 1
+    heappush = observed(heapq.heappush, observer, PUSH, lambda key: key & mask)
+    expand = observed(order.append, observer, EXPAND)
+
+    (end_r, end_c) = divmod(target, width)
+    (start_r, start_c) = divmod(source, width)
+    seen[source] = generation
+    g[source] = 0
+    parent[source] = -1
+    open = []
+    heappush(open, ((abs(start_r - end_r) + abs(start_c - end_c)) << f_shift) | (mask << shift) | source)
+
+    while open:
+        # retrieve the jump point with the smallest f value, skip outdated entries
+        key = heapq.heappop(open)
+        current = key & mask
+        current_g = mask - ((key >> shift) & mask)
+        if current_g != g[current]:
+            continue
+        expand(current)
+
+        if current == target:
+            found = True
+            break
+
+        # jump in every direction left after pruning, push the jump points found
+        (current_r, current_c) = divmod(current, width)
+        for (jump, step) in directions(maze, current, parent[current]):
+            each = jump(maze, current, step, target)
+            if each == -1:
+                continue
+
+            (r, c) = divmod(each, width)
+            next_g = current_g + abs(r - current_r) + abs(c - current_c)
+            if seen[each] == generation:
+                if g[each] <= next_g:
+                    continue
+                reopened += 1
+            seen[each] = generation
+            g[each] = next_g
+            parent[each] = current
+            f = next_g + abs(r - end_r) + abs(c - end_c)
+            heappush(open, (f << f_shift) | ((mask - next_g) << shift) | each)
+            pushes += 1
+        if len(open) > max_frontier:
+            max_frontier = len(open)
+
+    stats = SearchStats(found, len(order), pushes, pushes - len(open), max_frontier, reopened)
+    stats.timings["search"] = time.perf_counter() - start_time
+    return stats
+
+
+def jps_path(workspace, target, width):
+    """
+    Rebuilds the path to the target from the parents of the jump points,
+    filling in every cell jumped over.
+
+    Returns:
+        path     (list): Positions from the start cell to the end cell
+    """
+
+    parent = workspace.parent
+    path = []
+    i = target
+    while parent[i] != -1:
+        path.extend(reversed(segment(parent[i], i, width)))
+        i = parent[i]
+    path.append(i)
+    return [divmod(each, width) for each in reversed(path)]
+
+
+def jps_explored(workspace, width):
+    """
+    Returns the positions of the expanded jump points and of every cell
+    jumped over to reach them.
+
+    Returns:
+        explored  (set): (row, column) of every explored cell
+    """
+
+    parent = workspace.parent
+    explored = set()
+    for i in workspace.order:
+        explored.add(divmod(i, width))
+        if parent[i] != -1:
+            explored.update(divmod(each, width) for each in segment(parent[i], i, width))
+    return explored
+
+
+def jps(maze, start, end, workspace=None, observer=None):
+    """
+    Solves the maze given using Jump Point Search, returns statistics and pathing.
+
+    The path and the explored cells are expanded back to every cell in
+    between the jump points, as returned by a_star.astar.
+
+    Args:
+            maze      (Maze): Contains the maze, a list of rows is
+                              also accepted
+            start    (tuple): Position of the starting position
+            end      (tuple): Position of the end position
+            workspace (Workspace): Optional buffers to reuse from an earlier
+                              query on the same maze
+            observer (callable): Optional observer(event, cell), called on
+                              every stats.EXPAND and stats.PUSH of a jump point
+
+    Returns:
+            path      (list): Contains all the tiles traversed from the
+                              start node in order to reach the end node.
+            closed     (set): Contains all Nodes explored while trying
+                              to find the path.
+            stats (SearchStats): Counters and timings of the search
+    """
+
+    maze = as_maze(maze)
+    width = maze.width
+    if workspace is None:
+        workspace = Workspace(maze.size)
+
+    target = end[0] * width + end[1]
+    stats = jps_search(maze, start[0] * width + start[1], target, workspace, observer)
+    with stats.timed("path"):
+        path = jps_path(workspace, target, width) if stats.found else []
+    stats.path_length = len(path)
+    return path, jps_explored(workspace, width), stats
@@ -0,0 +1,257 @@
+import os
+import struct
+import sys
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+
+from distance import UNREACHABLE, goal_distances
+from maze import OPEN_BYTE
+
+# header of the on-disk tables: magic, height, width, number of landmarks
+_MAGIC = b"MZALT1\0\0"
+_HEADER = struct.Struct("<8sIII")
+
+# lower bound arrays kept per target, enough for both ends of a query
+_BOUNDS_CACHED = 4
+
+
+class Landmarks:
+    """
+    Distance tables of a few landmark cells, giving the ALT lower bound on
+    the number of steps between any two cells.
+
+    By the triangle inequality, the distance between cells a and b is at
+    least |d(L, a) - d(L, b)| for every landmark L, and the largest of
+    these bounds is an admissible, consistent heuristic for A*. In a maze
+    it is usually far closer to the true distance than the Manhattan
+    distance. With a landmark on the target itself the bound is exact.
+
+    A Landmarks object is called with a target cell and returns the
+    heuristic h(index) towards it, as taken by astar and bi_a_star. The
+    bounds towards a target are computed for all cells at once with NumPy
+    and kept for the last few targets, so queries sharing an end only pay
+    for them once.
+
+    Attributes:
+        height       (int): Number of rows in the maze.
+        width        (int): Number of columns in the maze.
+        size         (int): Total number of cells, height * width.
+        cells       (list): Flat index of every landmark.
+        tables      (list): uint32 array of the distance of every cell to
+                            each landmark, UNREACHABLE for walls and cells
+                            cut off from it.
+    """
+
+    # the bounds are whole steps, so searches can use a bucket queue
+    integer = True
+
+    def __init__(self, height, width, cells, tables):
+        self.height = height
+        self.width = width
+        self.size = height * width
+        self.cells = list(cells)
+        self.tables = list(tables)
+        self._bounds = OrderedDict()
+
+    def __call__(self, target):
+        """
+        Returns the heuristic towards a target cell.
+
+        Args:
+            target         (int): Flat index of the target cell
+
+        Returns:
+            estimate  (callable): estimate(index), a lower bound on the
+                                  steps from the cell to the target
+        """
+
+        bounds = self._bounds.get(target)
+        if bounds is None:
+            bounds = self.bounds(target)
+            self._bounds[target] = bounds
+            if len(self._bounds) > _BOUNDS_CACHED:
+                self._bounds.popitem(last=False)
+        else:
+            self._bounds.move_to_end(target)
+        return bounds.__getitem__
+
+    def bounds(self, target):
+        """
+        Computes the ALT lower bound from every cell to a target cell.
+
+        Args:
+            target     (int): Flat index of the target cell
+
+        Returns:
+            bounds   (array): uint32 lower bound of every cell
+        """
+
+        bounds = np.zeros(self.size, dtype=np.int64)
+        for table in self.tables:
+            distance = table[target]
+            if distance == UNREACHABLE:
+                continue
+            values = np.frombuffer(table, dtype=np.uint32)
+            difference = np.abs(values.astype(np.int64) - distance)
+            difference[values == UNREACHABLE] = 0
+            np.maximum(bounds, difference, out=bounds)
+        result = array("I")
+        result.frombytes(bounds.astype(np.uint32).tobytes())
+        return result
+
+    def save(self, file_name):
+        """
+        Writes the tables to a binary file. The file is written under a
+        temporary name first and then renamed, so processes reading the
+        tables never see them half written.
+
+        Args:
+            file_name  (str): Path of the tables file
+        """
+
+        temp_name = "%s.%i.tmp" % (file_name, os.getpid())
+        with open(temp_name, "wb") as file:
+            file.write(_HEADER.pack(_MAGIC, self.height, self.width, len(self.cells)))
+            for values in [array("I", self.cells)] + self.tables:
+                if sys.byteorder == "big":
+                    values = array("I", values)
+                    values.byteswap()
+                values.tofile(file)
+        os.replace(temp_name, file_name)
+
+    @classmethod
+    def load(cls, file_name):
+        """
+        Reads tables written by Landmarks.save.
+
+        Args:
+            file_name    (str): Path of the tables file
+
+        Returns:
+            landmarks (Landmarks): The loaded tables
+        """
+
+        with open(file_name, "rb") as file:
+            magic, height, width, count = _HEADER.unpack(file.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError("%s is not a landmark table" % file_name)
+            cells = array("I")
+            cells.fromfile(file, count)
+            tables = []
+            for _ in range(count):
+                table = array("I")
+                table.fromfile(file, height * width)
+                tables.append(table)
+        if sys.byteorder == "big":
+            for values in [cells] + tables:
+                values.byteswap()
+        return cls(height, width, cells, tables)
+
+
+def select_landmarks(graph, count, seed_cell=None):
+    """
+    Picks landmarks by farthest-point selection and computes their tables.
+
+    The first landmark is the cell farthest from seed_cell, and every next
+    one is the reachable cell farthest from all landmarks picked so far,
+    so the landmarks spread out to the dead ends of the maze, where their
+    bounds are tightest. Each landmark costs one breadth-first search.
+
+    Args:
+        graph       (Maze): Contains the maze, or its Adjacency index
+        count        (int): Number of landmarks to pick
+        seed_cell    (int): Flat index of an open cell to start from,
+                            defaults to the first open cell
+
+    Returns:
+        landmarks (Landmarks): The landmarks and their tables
+    """
+
+    if count < 1:
+        raise ValueError("count must be at least 1, got %i" % count)
+    if seed_cell is None:
+        seed_cell = _first_open(graph)
+
+    distances = np.frombuffer(goal_distances(graph, seed_cell), dtype=np.uint32)
+    reachable = distances != UNREACHABLE
+    nearest = np.where(reachable, distances, 0).astype(np.int64)
+    cells = []
+    tables = []
+    for _ in range(count):
+        cell = int(np.argmax(nearest))
+        if cells and nearest[cell] == 0:
+            # every reachable cell already is a landmark
+            break
+        table = goal_distances(graph, cell)
+        cells.append(cell)
+        tables.append(table)
+        np.minimum(nearest, np.frombuffer(table, dtype=np.uint32), out=nearest, where=reachable)
+    return Landmarks(graph.size // graph.width, graph.width, cells, tables)
+
+
+def goal_table(graph, target):
+    """
+    Computes the exact distance of every cell to a fixed exit, as a single
+    landmark on it. Its heuristic is the true distance towards that exit,
+    so A* only expands cells of the path, and it stays an admissible ALT
+    bound towards any other target.
+
+    Args:
+        graph       (Maze): Contains the maze, or its Adjacency index
+        target       (int): Flat index of the exit
+
+    Returns:
+        landmarks (Landmarks): The table, with target as its only landmark
+    """
+
+    return Landmarks(graph.size // graph.width, graph.width, [target], [goal_distances(graph, target)])
+
+
+def _first_open(graph):
+    walls = getattr(graph, "walls", None)
+    if walls is not None:
+        cell = walls.find(OPEN_BYTE)
+    else:
+        # an Adjacency index, the first cell with a neighbour
+        offsets = np.frombuffer(graph.offsets, dtype=np.uint32)
+        cell = int(np.argmax(offsets[1:] > offsets[:-1])) if offsets[-1] else -1
+    if cell < 0:
+        raise ValueError("maze has no open cells")
+    return cell
+
+
+def cached_landmarks(graph, file_name, count):
+    """
+    Returns the landmark tables of a maze loaded from file_name, reading
+    them from file_name + ".alt" when that cache is newer than the maze
+    file and holds as many landmarks, and building and saving them
+    otherwise.
+
+    Args:
+        graph       (Maze): Contains the maze, or its Adjacency index
+        file_name    (str): The .txt file the maze was read from
+        count        (int): Number of landmarks to pick
+
+    Returns:
+        landmarks (Landmarks): The landmarks and their tables
+    """
+
+    cache_name = file_name + ".alt"
+    try:
+        if os.path.getmtime(cache_name) >= os.path.getmtime(file_name):
+            landmarks = Landmarks.load(cache_name)
+            if (landmarks.size == graph.size and landmarks.width == graph.width
+                    and len(landmarks.cells) == count):
+                return landmarks
+    except (OSError, ValueError, EOFError, struct.error):
+        pass
+
+    landmarks = select_landmarks(graph, count)
+    try:
+        landmarks.save(cache_name)
+    except OSError:
+        # a read-only directory only costs the cache
+        pass
+    return landmarks
@@ -0,0 +1,205 @@
+import heapq
+import time
+from array import array
+
+from maze import WALL, Maze, as_maze
+from stats import EXPAND, PUSH, SearchStats, observed
+
+# g and rhs of cells that have not been reached
+INFINITY = 0x7FFFFFFF
+
+
+class LPAStar:
+    """
+    Incremental planner that keeps its search state between queries on a
+    maze whose walls change, using Lifelong Planning A*.
+
+    Every cell has a g-cost, its distance from the start as last expanded,
+    and an rhs-cost, one more than the lowest g of its open neighbours. A
+    cell whose two costs differ is inconsistent and sits on the open list,
+    ordered by (min(g, rhs) + manhattan, min(g, rhs)) packed into one int
+    like the keys of astar_search. When walls toggle, only the toggled
+    cells and their neighbours get new rhs-costs, and the search repairs
+    the costs outwards from them until the end is consistent again, so
+    replanning after a few edits only touches the cells whose distance
+    from the start changed. Outdated open list entries are skipped when
+    popped.
+
+    The planner works on its own copy of the walls. The start and end are
+    fixed for the life of the planner.
+
+    Attributes:
+        maze         (Maze): The planner's copy of the maze.
+        source        (int): Flat index of the start.
+        target        (int): Flat index of the end.
+        g           (array): g-cost of every cell, INFINITY if unknown.
+        rhs         (array): rhs-cost of every cell, INFINITY if unknown.
+        stats (SearchStats): Counters and timings of the last plan, None
+                             before the first.
+    """
+
+    def __init__(self, maze, start, end):
+        maze = as_maze(maze)
+        self.maze = Maze(bytearray(maze.walls), maze.height, maze.width, start, end)
+        width = maze.width
+        self.source = start[0] * width + start[1]
+        self.target = end[0] * width + end[1]
+        self.g = array("i", [INFINITY]) * maze.size
+        self.rhs = array("i", [INFINITY]) * maze.size
+        self.stats = None
+        # cells whose walls toggled since the last plan
+        self._changed = []
+
+        # keys are (k1 << k1_shift) | (k2 << shift) | index
+        self._shift = maze.size.bit_length()
+        self._k1_shift = 2 * self._shift
+        self._open = []
+        if not self.maze.walls[self.source]:
+            self.rhs[self.source] = 0
+            self._open.append(self._key(self.source))
+
+    def _key(self, index):
+        (r, c) = divmod(index, self.maze.width)
+        (end_r, end_c) = divmod(self.target, self.maze.width)
+        k2 = min(self.g[index], self.rhs[index])
+        return ((k2 + abs(r - end_r) + abs(c - end_c)) << self._k1_shift) | (k2 << self._shift) | index
+
+    def plan(self, observer=None):
+        """
+        Brings the search up to date with the walls and returns the path,
+        the whole search on the first call and only its repair afterwards.
+
+        Args:
+            observer   (callable): Optional observer(event, cell), called on
+                                   every stats.EXPAND and stats.PUSH
+
+        Returns:
+            path           (list): Contains all the tiles traversed from the
+                                   start node in order to reach the end node,
+                                   empty if the end cannot be reached.
+            closed          (set): Contains all Nodes expanded by this call.
+            stats   (SearchStats): Counters and timings of this call
+        """
+
+        start_time = time.perf_counter()
+        maze = self.maze
+        walls = maze.walls
+        width = maze.width
+        neighbours = maze.neighbours
+        g = self.g
+        rhs = self.rhs
+        source = self.source
+        target = self.target
+        key = self._key
+        open_list = self._open
+        mask = (1 << self._shift) - 1
+        push = observed(heapq.heappush, observer, PUSH, lambda entry: entry & mask)
+        order = []
+        expand = observed(order.append, observer, EXPAND)
+        pushes = 0
+        pops = 0
+        reopened = 0
+        max_frontier = len(open_list)
+
+        def update(index):
+            # recomputes the rhs-cost of a cell, queuing it if inconsistent
+            nonlocal pushes
+            if index == source:
+                rhs[index] = INFINITY if walls[index] else 0
+            else:
+                if walls[index]:
+                    rhs[index] = INFINITY
+                else:
+                    best = INFINITY
+                    for each in neighbours(index):
+                        if g[each] < best:
+                            best = g[each]
+                    rhs[index] = best + 1 if best < INFINITY else INFINITY
+            if g[index] != rhs[index]:
+                push(open_list, key(index))
+                pushes += 1
+
+        # the toggled cells and the cells next to them can now be reached differently
+        for index in self._changed:
+            update(index)
+            for each in neighbours(index):
+                update(each)
+        self._changed = []
+
+        while open_list:
+            entry = open_list[0]
+            index = entry & mask
+            if g[index] == rhs[index] or entry != key(index):
+                heapq.heappop(open_list)
+                pops += 1
+                continue
+            if rhs[target] == g[target] and entry >= key(target):
+                break
+
+            heapq.heappop(open_list)
+            pops += 1
+            expand(index)
+            if g[index] > rhs[index]:
+                g[index] = rhs[index]
+            else:
+                # the cell got more expensive, its neighbours may have relied on it
+                g[index] = INFINITY
+                reopened += 1
+                update(index)
+            for each in neighbours(index):
+                update(each)
+            if len(open_list) > max_frontier:
+                max_frontier = len(open_list)
+
+        found = g[target] < INFINITY
+        stats = SearchStats(found, len(order), pushes, pops, max_frontier, reopened)
+        stats.timings["search"] = time.perf_counter() - start_time
+        with stats.timed("path"):
+            path = self._trace() if found else []
+        stats.path_length = len(path)
+        self.stats = stats
+        return path, {divmod(i, width) for i in order}, stats
+
+    def _trace(self):
+        """
+        Walks back from the end to the start, always to the neighbour with
+        the lowest g, which is one less than the g of the current cell.
+        """
+
+        g = self.g
+        neighbours = self.maze.neighbours
+        width = self.maze.width
+        i = self.target
+        path = [divmod(i, width)]
+        while i != self.source:
+            i = min(neighbours(i), key=g.__getitem__)
+            path.append(divmod(i, width))
+        return path[::-1]
+
+    def update(self, cells, observer=None):
+        """
+        Toggles the given cells between wall and open, and replans.
+
+        Args:
+            cells      (iterable): Positions of the cells that changed from
+                                   '#' to '-' or back
+            observer   (callable): Optional observer(event, cell), called on
+                                   every stats.EXPAND and stats.PUSH
+
+        Returns:
+            path           (list): Contains all the tiles traversed from the
+                                   start node in order to reach the end node,
+                                   empty if the end cannot be reached.
+            closed          (set): Contains all Nodes expanded by the repair.
+            stats   (SearchStats): Counters and timings of the repair
+        """
+
+        maze = self.maze
+        walls = maze.walls
+        for position in cells:
+            if not maze.in_bounds(position):
+                raise ValueError("cell %r lies outside the %i x %i maze" % (position, maze.height, maze.width))
+            index = position[0] * maze.width + position[1]
+            walls[index] ^= WALL
+            self._changed.append(index)
+        return self.plan(observer)
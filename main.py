@@ -1,22 +1,30 @@
-from utils import read_maze, draw
-from a_star import astar
-from depth_first import dfs
-from bi_a_star import bi_a_star
-
-
-if __name__ == '__main__':
-    # read Maze of choice and get start, end positions
-    maze, start, end = read_maze("maze-VLarge.txt")
-
-    # call search algorithms
-    d_path, d_closed = dfs(maze, start, end)
-    # print(d_path)
-
-    a_path, a_closed = astar(maze, start, end)
-    # print(a_path)
-
-    bi_path, bi_closed = bi_a_star(maze, start, end)
-    # print("Bidirectional path: ", bi_path)
-
-    # draw maze pathing, save to < file_name >
-    # draw(maze, bi_path, bi_closed, "bi-a-star-VLarge.jpeg", False)
+from utils import read_maze, draw
+from a_star import astar
+from depth_first import dfs
+from bi_a_star import bi_a_star
+from jps import jps
+
+
+if __name__ == '__main__':
+    # read Maze of choice and get start, end positions
+    maze, start, end = read_maze("maze-VLarge.txt")
+
+    # call search algorithms, print their statistics
+    d_path, d_closed, d_stats = dfs(maze, start, end)
+    print("\n" + d_stats.report("Depth-First Search", "Stack pushes"))
+    # print(d_path)
+
+    a_path, a_closed, a_stats = astar(maze, start, end)
+    print("\n" + a_stats.report("A-Star Search"))
+    # print(a_path)
+
+    bi_path, bi_closed, bi_stats = bi_a_star(maze, start, end)
+    print("\n" + bi_stats.report("Bidirectional A* Search"))
+    # print("Bidirectional path: ", bi_path)
+
+    j_path, j_closed, j_stats = jps(maze, start, end)
+    print("\n" + j_stats.report("Jump Point Search"))
+    # print(j_path)
+
+    # draw maze pathing, save to < file_name >
+    # draw(maze, bi_path, bi_closed, "bi-a-star-VLarge.jpeg", False)
@@ -0,0 +1,296 @@
+import mmap
+
+WALL = 1
+OPEN = 0
+
+# OPEN as a byte string, to search wall bitmaps that are memory-mapped
+OPEN_BYTE = bytes((OPEN,))
+
+# size of the slices the loader reads from the mapped file at a time
+CHUNK_SIZE = 1 << 20
+
+
+class Maze:
+    """
+    Compact representation of a maze, backed by one flat bytearray
+    instead of a list of per-character lists.
+
+    Cells can be addressed by position (row, column) or by their flat
+    index, row * width + column. The solvers work on flat indices
+    internally and convert back to positions for their results.
+
+    Attributes:
+        height       (int): Number of rows in the maze.
+        width        (int): Number of columns in the maze.
+        size         (int): Total number of cells, height * width.
+        walls  (bytearray): Wall bitmap, WALL (1) for a wall and OPEN (0)
+                            for a free cell. A read-only mmap of a binary
+                            maze file is also accepted.
+        start      (tuple): Position of the start Node, or None.
+        end        (tuple): Position of the end Node, or None.
+    """
+
+    __slots__ = ("height", "width", "size", "walls", "start", "end")
+
+    def __init__(self, walls, height, width, start=None, end=None):
+        if len(walls) != height * width:
+            raise ValueError("wall bitmap has %i cells, expected %i x %i"
+                             % (len(walls), height, width))
+        self.height = height
+        self.width = width
+        self.size = height * width
+        self.walls = walls
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Builds a Maze from rows of '#' and '-' characters, such as the
+        list of lists that read_maze used to return.
+
+        Args:
+            rows  (list): Contains the maze, one sequence of characters per row
+
+        Returns:
+            maze  (Maze): The compact maze
+        """
+
+        height = len(rows)
+        width = len(rows[0]) if height else 0
+        walls = bytearray(height * width)
+        for r, row in enumerate(rows):
+            if len(row) != width:
+                raise ValueError("row %i has %i cells, expected %i" % (r, len(row), width))
+            base = r * width
+            for c, cell in enumerate(row):
+                if cell == '#':
+                    walls[base + c] = WALL
+        return cls(walls, height, width)
+
+    def find_start_end(self):
+        """
+        Finds the first opening in the top row and the last opening
+        in the bottom row of the maze.
+
+        Returns:
+            start  (tuple): Position of the start Node
+            end    (tuple): Position of the end Node
+        """
+
+        start = self.walls.find(OPEN_BYTE, 0, self.width)
+        end = self.walls.rfind(OPEN_BYTE, self.size - self.width, self.size)
+        if start < 0 or end < 0:
+            raise ValueError("maze has no opening in its top or bottom row")
+        return self.position(start), self.position(end)
+
+    def find_exits(self):
+        """
+        Finds every opening on the outer edge of the maze, in its top and
+        bottom rows and its left and right columns.
+
+        Returns:
+            exits   (list): Positions of the openings, in ascending index
+                            order, so the start find_start_end returns
+                            comes first and its end last
+        """
+
+        walls = self.walls
+        width = self.width
+        size = self.size
+        edge = set()
+        for first in (0, size - width):
+            i = walls.find(OPEN_BYTE, first, first + width)
+            while i >= 0:
+                edge.add(i)
+                i = walls.find(OPEN_BYTE, i + 1, first + width)
+        for first in (0, width - 1):
+            column = walls[first:size:width]
+            i = column.find(OPEN_BYTE)
+            while i >= 0:
+                edge.add(first + i * width)
+                i = column.find(OPEN_BYTE, i + 1)
+        return [self.position(i) for i in sorted(edge)]
+
+    def index(self, position):
+        """
+        Returns the flat index of a (row, column) position.
+        """
+        return position[0] * self.width + position[1]
+
+    def position(self, index):
+        """
+        Returns the (row, column) position of a flat index.
+        """
+        return divmod(index, self.width)
+
+    def in_bounds(self, position):
+        """
+        Returns True if the (row, column) position lies inside the maze.
+        """
+        return 0 <= position[0] < self.height and 0 <= position[1] < self.width
+
+    def is_wall(self, position):
+        """
+        Returns True if the (row, column) position is a wall.
+        """
+        return self.walls[position[0] * self.width + position[1]] == WALL
+
+    def neighbours(self, index):
+        """
+        Returns the flat indices of the open cells next to the given cell,
+        in top left right bottom order, which is ascending index order.
+
+        Args:
+            index      (int): Flat index of the current cell
+
+        Returns:
+            neighbours (list): Flat indices of the open neighbouring cells
+        """
+
+        walls = self.walls
+        width = self.width
+        column = index % width
+        neighbours = []
+
+        if index >= width and not walls[index - width]:
+            neighbours.append(index - width)
+        if column and not walls[index - 1]:
+            neighbours.append(index - 1)
+        if column + 1 < width and not walls[index + 1]:
+            neighbours.append(index + 1)
+        if index + width < self.size and not walls[index + width]:
+            neighbours.append(index + width)
+        return neighbours
+
+    # row access, for code that still indexes the maze as maze[r][c]
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, row):
+        if not 0 <= row < self.height:
+            raise IndexError("maze row out of range")
+        base = row * self.width
+        return self.walls[base:base + self.width].translate(_ROW_CHARS).decode("ascii")
+
+
+# maps the wall bitmap back to the '#'/'-' characters of the text format
+_ROW_CHARS = bytes.maketrans(bytes((OPEN, WALL)), b"-#")
+
+
+# keeps only the cell characters and row breaks of the text format
+_DELETE = bytes(b for b in range(256) if b not in b"#-\n")
+_CELLS = bytes.maketrans(b"-#", bytes((OPEN, WALL)))
+
+
+def load_maze(file_name, chunk_size=CHUNK_SIZE):
+    """
+    Loads a maze from a .txt file of '#' and '-' characters.
+
+    The file is memory-mapped and parsed a slice of whole lines at a
+    time straight into the wall bitmap, so the text is never held in
+    memory as a whole. Blank lines and all characters other than '#'
+    and '-' are ignored. The start and end are found once, after the
+    last row has been read.
+
+    Args:
+        file_name   (str): The .txt file of the maze to be read
+        chunk_size  (int): Approximate number of bytes parsed per slice
+
+    Returns:
+        maze       (Maze): The compact maze, with start and end set
+    """
+
+    walls = bytearray()
+    width = None
+
+    with open(file_name, "rb") as file:
+        try:
+            text = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ValueError("%s contains no maze rows" % file_name) from None
+
+        with text:
+            length = len(text)
+            pos = 0
+            while pos < length:
+                # cut the slice at a line break so rows are never split
+                stop = text.find(b"\n", min(pos + chunk_size, length) - 1)
+                stop = length if stop < 0 else stop + 1
+
+                for row in text[pos:stop].translate(None, _DELETE).split(b"\n"):
+                    if not row:
+                        continue
+                    if width is None:
+                        width = len(row)
+                    elif len(row) != width:
+                        raise ValueError("row %i has %i cells, expected %i"
+                                         % (len(walls) // width, len(row), width))
+                    walls += row.translate(_CELLS)
+                pos = stop
+
+    if width is None:
+        raise ValueError("%s contains no maze rows" % file_name)
+
+    maze = Maze(walls, len(walls) // width, width)
+    maze.start, maze.end = maze.find_start_end()
+    return maze
+
+
+def as_maze(maze):
+    """
+    Returns the given maze as a Maze, converting a list of rows if needed.
+
+    Args:
+        maze   (Maze or list): Contains the maze
+
+    Returns:
+        maze           (Maze): The compact maze
+    """
+
+    if isinstance(maze, Maze):
+        return maze
+    return Maze.from_rows(maze)
+
+
+def trace_path(parent, end, width):
+    """
+    Rebuilds a path by following a parent-index array back from a cell.
+
+    Args:
+        parent  (array): Parent flat index of every reached cell, -1 for
+                         the cell the search started from
+        end       (int): Flat index of the last cell of the path
+        width     (int): Number of columns in the maze
+
+    Returns:
+        path     (list): Positions from the start cell to the end cell
+    """
+
+    path = []
+    i = end
+    while i != -1:
+        path.append(divmod(i, width))
+        i = parent[i]
+    return path[::-1]
+
+
+def bitmap_positions(bitmap, width):
+    """
+    Returns the positions of all set cells of a per-cell bitmap, such as
+    the closed bitmap of a search.
+
+    Args:
+        bitmap  (bytearray): One byte per cell, 1 when set
+        width         (int): Number of columns in the maze
+
+    Returns:
+        positions     (set): (row, column) of every set cell
+    """
+
+    positions = set()
+    i = bitmap.find(1)
+    while i >= 0:
+        positions.add(divmod(i, width))
+        i = bitmap.find(1, i + 1)
+    return positions
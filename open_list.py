@@ -0,0 +1,236 @@
+import heapq
+import sys
+from functools import partial
+
+# open list backends of astar_search and bi_a_star_search
+HEAP = "heap"
+BUCKET = "bucket"
+RADIX = "radix"
+
+
+class HeapOpenList:
+    """
+    Binary heap open list, O(log n) per push and pop.
+
+    Like every open list, it holds the packed int keys of the solvers,
+    (f << f_shift) | ((mask - g) << shift) | index, and pops the lowest.
+    Its push and pop are heapq's C functions bound to the heap, so they
+    cost no more than calling heapq directly. Open lists do not count
+    their pushes and pops, the solvers count them in locals and report
+    them in their SearchStats.
+
+    Attributes:
+        heap       (list): The keys, in heapq order.
+        push   (callable): push(key), adds a key.
+        pop    (callable): pop(), removes and returns the lowest key.
+    """
+
+    __slots__ = ("heap", "push", "pop")
+
+    def __init__(self, f_shift):
+        self.heap = []
+        self.push = partial(heapq.heappush, self.heap)
+        self.pop = partial(heapq.heappop, self.heap)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def peek(self):
+        return self.heap[0]
+
+    def state(self):
+        """
+        Returns the keys in heap order and no extra values, for restore.
+        """
+        return list(self.heap), []
+
+    def restore(self, keys, extra):
+        """
+        Replaces the contents with keys and extra values from state.
+        """
+        self.heap[:] = keys
+
+
+class BucketOpenList:
+    """
+    Bucket queue open list, one LIFO bucket per f value, O(1) amortized per
+    push and pop as long as f values are small integers.
+
+    Keys are popped by lowest f only, the latest pushed first within a
+    bucket, which favours the deeper of cells with equal f much like the
+    higher-g tie-break of the heap. The lowest non-empty bucket is tracked,
+    and only moves up past empty buckets.
+
+    Attributes:
+        f_shift     (int): Bit position of f in the keys.
+        buckets    (list): List of keys for every f value.
+        lowest      (int): f value no key is below.
+        size        (int): Number of keys held.
+    """
+
+    __slots__ = ("f_shift", "buckets", "lowest", "size")
+
+    def __init__(self, f_shift):
+        self.f_shift = f_shift
+        self.buckets = []
+        self.lowest = sys.maxsize
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, key):
+        f = key >> self.f_shift
+        try:
+            self.buckets[f].append(key)
+        except IndexError:
+            self.buckets.extend([] for _ in range(f + 1 - len(self.buckets)))
+            self.buckets[f].append(key)
+        if f < self.lowest:
+            self.lowest = f
+        self.size += 1
+
+    def _lowest_bucket(self):
+        if not self.size:
+            raise IndexError("open list is empty")
+        buckets = self.buckets
+        low = self.lowest
+        while not buckets[low]:
+            low += 1
+        self.lowest = low
+        return buckets[low]
+
+    def pop(self):
+        bucket = self._lowest_bucket()
+        self.size -= 1
+        return bucket.pop()
+
+    def peek(self):
+        return self._lowest_bucket()[-1]
+
+    def state(self):
+        """
+        Returns the keys bucket by bucket, in push order within each, and
+        no extra values, for restore.
+        """
+        return [key for bucket in self.buckets for key in bucket], []
+
+    def restore(self, keys, extra):
+        """
+        Replaces the contents with keys and extra values from state.
+        """
+        self.buckets = []
+        self.lowest = sys.maxsize
+        self.size = 0
+        for key in keys:
+            self.push(key)
+
+
+class RadixOpenList:
+    """
+    Radix heap open list, for searches whose popped f values never
+    decrease, as with the consistent heuristics of the solvers.
+
+    Bucket 0 holds the keys whose f equals the last f popped, and bucket i
+    those whose f first differs from it at bit i - 1. When bucket 0 runs
+    empty, the lowest non-empty bucket is spread out again around its
+    lowest f, and every key moves down at most once per bit, so pushes and
+    pops cost O(log C) amortized for f values up to C.
+
+    Attributes:
+        f_shift     (int): Bit position of f in the keys.
+        buckets    (list): List of keys per bucket.
+        last        (int): f value of the last key popped.
+        size        (int): Number of keys held.
+    """
+
+    __slots__ = ("f_shift", "buckets", "last", "size")
+
+    def __init__(self, f_shift):
+        self.f_shift = f_shift
+        self.buckets = [[] for _ in range(65)]
+        self.last = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, key):
+        f = key >> self.f_shift
+        if f < self.last:
+            raise ValueError("f %i is below the last popped f %i, the heuristic is not consistent" % (f, self.last))
+        self.buckets[(f ^ self.last).bit_length()].append(key)
+        self.size += 1
+
+    def _first_bucket(self):
+        buckets = self.buckets
+        if not buckets[0]:
+            if not self.size:
+                raise IndexError("open list is empty")
+            i = 1
+            while not buckets[i]:
+                i += 1
+            (keys, buckets[i]) = (buckets[i], [])
+            f_shift = self.f_shift
+            last = self.last = min(keys) >> f_shift
+            for key in keys:
+                buckets[((key >> f_shift) ^ last).bit_length()].append(key)
+        return buckets[0]
+
+    def pop(self):
+        bucket = self._first_bucket()
+        self.size -= 1
+        return bucket.pop()
+
+    def peek(self):
+        return self._first_bucket()[-1]
+
+    def state(self):
+        """
+        Returns the keys bucket by bucket and, as extra values, the last f
+        popped followed by the size of every bucket, for restore.
+        """
+        return [key for bucket in self.buckets for key in bucket], [self.last] + [len(b) for b in self.buckets]
+
+    def restore(self, keys, extra):
+        """
+        Replaces the contents with keys and extra values from state.
+        """
+        self.last = extra[0]
+        self.buckets = []
+        at = 0
+        for count in extra[1:]:
+            self.buckets.append(list(keys[at:at + count]))
+            at += count
+        self.size = len(keys)
+
+
+OPEN_LISTS = {HEAP: HeapOpenList, BUCKET: BucketOpenList, RADIX: RadixOpenList}
+
+
+def make_open_list(kind, f_shift, heuristic=None):
+    """
+    Creates an empty open list of the given kind.
+
+    Without a kind, a bucket queue is picked for heuristics marked with
+    integer = True, such as landmarks.Landmarks, whose f values are small
+    integers, and a binary heap for the Manhattan distance and any other
+    heuristic. CPython's heapq is C code, so on the Manhattan searches the
+    heap keeps up with the bucket queue, whose pushes and pops run in
+    Python.
+
+    Args:
+        kind            (str): One of HEAP, BUCKET and RADIX, or None
+        f_shift         (int): Bit position of f in the keys
+        heuristic  (callable): The heuristic of the search, None for the
+                               Manhattan distance
+
+    Returns:
+        open_list    (object): The empty open list
+    """
+
+    if kind is None:
+        kind = BUCKET if getattr(heuristic, "integer", False) else HEAP
+    if kind not in OPEN_LISTS:
+        raise ValueError("unknown open list %r, expected one of %s" % (kind, ", ".join(OPEN_LISTS)))
+    return OPEN_LISTS[kind](f_shift)
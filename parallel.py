@@ -0,0 +1,134 @@
+import glob
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from batch import ALGORITHMS, BatchSolver
+from binary import cached_maze
+
+# number of queries sent to a worker per task
+CHUNK_SIZE = 16
+
+# solvers of the mazes this worker process has loaded, by file name
+_solvers = {}
+
+
+def solve_chunk(file_name, algorithm, queries, index=True):
+    """
+    Solves a chunk of queries on one maze inside a worker process.
+
+    The maze is loaded from its memory-mapped file, and its adjacency index
+    from the cache next to it, the first time the worker sees the file.
+    Later chunks reuse them, so the grid is never sent between processes.
+
+    Args:
+        file_name    (str): The .txt file of the maze
+        algorithm    (str): One of batch.ALGORITHMS
+        queries     (list): (start, end) position pairs
+        index       (bool): Whether to search the adjacency index
+
+    Returns:
+        results     (list): (start, end, path) of every query
+    """
+
+    key = (file_name, index)
+    solver = _solvers.get(key)
+    if solver is None:
+        solver = _solvers[key] = BatchSolver.from_file(file_name, index)
+    return list(solver.solve(queries, algorithm))
+
+
+def run_jobs(jobs, workers=None, chunk_size=CHUNK_SIZE, index=True):
+    """
+    Spreads (maze file, algorithm, start, end) jobs across a process pool,
+    yielding results as they finish.
+
+    Consecutive jobs on the same maze and algorithm are sent to workers in
+    chunks. Only a few chunks per worker are in flight at a time, so jobs
+    can be streamed from a generator of any length.
+
+    Args:
+        jobs       (iterable): (file name, algorithm, start, end) tuples
+        workers         (int): Number of worker processes, defaults to the
+                               number of CPUs
+        chunk_size      (int): Number of queries per task
+        index          (bool): Whether workers search the adjacency index
+
+    Yields:
+        file_name       (str): The .txt file of the maze
+        algorithm       (str): The algorithm used
+        start         (tuple): Position of the starting position
+        end           (tuple): Position of the end position
+        path           (list): Path from start to end, empty if the end
+                               cannot be reached
+    """
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+
+        def drain(limit):
+            # wait until at most limit chunks are in flight, yield what finished
+            while len(pending) > limit:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    (file_name, algorithm) = pending.pop(future)
+                    for (start, end, path) in future.result():
+                        yield file_name, algorithm, start, end, path
+
+        key = None
+        queries = []
+        for (file_name, algorithm, start, end) in jobs:
+            if (file_name, algorithm) != key or len(queries) >= chunk_size:
+                if queries:
+                    pending[executor.submit(solve_chunk, key[0], key[1], queries, index)] = key
+                    yield from drain(2 * workers)
+                key = (file_name, algorithm)
+                queries = []
+            queries.append((start, end))
+
+        if queries:
+            pending[executor.submit(solve_chunk, key[0], key[1], queries, index)] = key
+        yield from drain(0)
+
+
+def maze_jobs(directory, algorithms=ALGORITHMS, pattern="maze-*.txt", repeat=1):
+    """
+    Builds one job per maze file in a directory and algorithm, from the
+    maze's own start to its end.
+
+    Args:
+        directory     (str): Directory holding the maze files
+        algorithms  (tuple): Algorithms to run on every maze
+        pattern       (str): Glob pattern of the maze files
+        repeat        (int): Number of times to repeat every job
+
+    Returns:
+        jobs         (list): (file name, algorithm, start, end) tuples
+    """
+
+    jobs = []
+    for file_name in sorted(glob.glob(os.path.join(directory, pattern))):
+        try:
+            maze = cached_maze(file_name)
+        except ValueError:
+            continue
+        (start, end) = (maze.start, maze.end)
+        for algorithm in algorithms:
+            jobs.extend([(file_name, algorithm, start, end)] * repeat)
+    return jobs
+
+
+if __name__ == '__main__':
+    # usage: python parallel.py [maze directory] [workers] [repeat]
+    directory = sys.argv[1] if len(sys.argv) > 1 else "."
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+
+    jobs = maze_jobs(directory, repeat=repeat)
+    start_time = time.perf_counter()
+    for (file_name, algorithm, start, end, path) in run_jobs(jobs, workers):
+        print("%s %s %s -> %s: %i steps" % (file_name, algorithm, start, end, len(path)))
+    elapsed = time.perf_counter() - start_time
+    print("\n%i jobs on %i workers in %.2f s, %.1f jobs/sec" % (len(jobs), workers, elapsed, len(jobs) / elapsed))
@@ -0,0 +1,146 @@
+import os
+import struct
+import zlib
+from itertools import chain
+
+import numpy as np
+
+from maze import as_maze
+
+# palette indices of the cell codes
+BACKGROUND = 0
+VISITED = 1
+PATH = 2
+WALL_CELL = 3
+
+# RGB colour of every cell code
+PALETTE = np.array([
+    (255, 255, 255),
+    (138, 216, 255),
+    (255, 0, 0),
+    (0, 0, 0),
+], dtype=np.uint8)
+
+
+def cell_mask(cells, maze):
+    """
+    Converts the cells given by a solver into a flat boolean mask.
+
+    Args:
+        cells  (iterable): (row, column) positions, such as a path or a set
+                           of explored cells, or a bitmap with one byte per cell
+        maze       (Maze): The maze the cells belong to
+
+    Returns:
+        mask    (ndarray): Flat bool array, True for every given cell
+    """
+
+    if isinstance(cells, (bytes, bytearray, memoryview)):
+        return np.frombuffer(cells, dtype=np.uint8).astype(bool)
+
+    # flatten the (row, column) pairs straight into an array, without a list of tuples
+    mask = np.zeros(maze.size, dtype=bool)
+    positions = np.fromiter(chain.from_iterable(cells), dtype=np.int64).reshape(-1, 2)
+    mask[positions[:, 0] * maze.width + positions[:, 1]] = True
+    return mask
+
+
+def render(maze, path, visited, walls=False, scale=2):
+    """
+    Builds an RGB image of a maze, the cells a search explored and the path
+    it found, without drawing a single cell at a time.
+
+    Every cell gets a palette index, with the path drawn over the explored
+    cells and the walls over both, and the palette is looked up for the
+    whole grid at once before scaling it up with np.repeat.
+
+    Args:
+        maze       (Maze): Contains the maze, a list of rows is also accepted
+        path   (iterable): Positions of the path from start to end
+        visited (iterable): Positions of the explored cells, or a bitmap
+        walls      (bool): Whether the walls should be drawn
+        scale       (int): Size of every cell in pixels
+
+    Returns:
+        image   (ndarray): uint8 array of shape (height * scale, width * scale, 3)
+    """
+
+    maze = as_maze(maze)
+    codes = np.zeros(maze.size, dtype=np.uint8)
+    codes[cell_mask(visited, maze)] = VISITED
+    codes[cell_mask(path, maze)] = PATH
+    if walls:
+        codes[np.frombuffer(maze.walls, dtype=np.uint8).astype(bool)] = WALL_CELL
+
+    image = PALETTE[codes.reshape(maze.height, maze.width)]
+    if scale > 1:
+        image = np.repeat(np.repeat(image, scale, axis=0), scale, axis=1)
+    return image
+
+
+def write_ppm(image, file_name):
+    """
+    Writes an RGB image as a binary PPM file.
+
+    Args:
+        image   (ndarray): uint8 array of shape (height, width, 3)
+        file_name   (str): The file to write
+    """
+
+    (height, width, _) = image.shape
+    with open(file_name, "wb") as file:
+        file.write(b"P6\n%i %i\n255\n" % (width, height))
+        file.write(np.ascontiguousarray(image, dtype=np.uint8).tobytes())
+
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def write_png(image, file_name, level=1):
+    """
+    Writes an RGB image as a PNG file, using zlib only.
+
+    Args:
+        image   (ndarray): uint8 array of shape (height, width, 3)
+        file_name   (str): The file to write
+        level       (int): zlib compression level, the lowest is already
+                           small for the few flat colours of a maze
+    """
+
+    (height, width, _) = image.shape
+
+    # every scanline starts with filter type 0, no filtering
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 1:] = image.reshape(height, width * 3)
+
+    with open(file_name, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        file.write(_png_chunk(b"IDAT", zlib.compress(rows.tobytes(), level)))
+        file.write(_png_chunk(b"IEND", b""))
+
+
+def save(image, file_name):
+    """
+    Saves an RGB image, choosing the format from the file extension.
+
+    PNG and PPM are written directly. Other formats, such as the .jpeg
+    files in visuals/, are encoded by PyGame from the array, which needs
+    no display.
+
+    Args:
+        image   (ndarray): uint8 array of shape (height, width, 3)
+        file_name   (str): The file to write
+    """
+
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension == ".png":
+        write_png(image, file_name)
+    elif extension == ".ppm":
+        write_ppm(image, file_name)
+    else:
+        import pygame
+
+        # surfarray is indexed by (x, y), so the rows and columns are swapped
+        pygame.image.save(pygame.surfarray.make_surface(image.swapaxes(0, 1)), file_name)
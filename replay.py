@@ -0,0 +1,278 @@
+import math
+import os
+import struct
+from array import array
+
+import numpy as np
+
+from maze import as_maze
+from render import BACKGROUND, PALETTE, PATH, VISITED, WALL_CELL, write_png
+from stats import EXPAND
+
+# palette index of the pixels a GIF frame leaves as they were
+TRANSPARENT = 4
+
+# LZW codes of the GIF frames, for a palette of 8 colours
+_CODE_SIZE = 3
+_CLEAR = 1 << _CODE_SIZE
+_END = _CLEAR + 1
+# the table is cleared before it can reach the 4096 codes of 12 bits
+_LAST_CODE = 4092
+
+
+class ExpansionRecorder:
+    """
+    Observer that records the cells a search expands, in order.
+
+    Pass it as the observer of any solver. The cells are kept as an
+    int32 array of flat indices, 4 bytes per expansion, and bidirectional
+    searches keep the order both directions were interleaved in.
+
+    Attributes:
+        order    (array): Flat index of every expanded cell, in order.
+    """
+
+    def __init__(self):
+        self.order = array("i")
+
+    def __call__(self, event, cell):
+        if event == EXPAND:
+            self.order.append(cell)
+
+
+def replay(maze, order, path=(), frames=100, walls=True):
+    """
+    Replays the expansion order of a search onto a reused frame buffer.
+
+    The buffer holds one palette index per cell. Every frame only marks the
+    cells expanded since the last one, and reports the rectangle they lie
+    in, so exporters can write just that part. The path is drawn on the
+    last frame.
+
+    Args:
+        maze       (Maze): The maze that was searched
+        order  (sequence): Flat indices of the expanded cells, in order,
+                           such as ExpansionRecorder.order
+        path   (iterable): Positions of the path from start to end
+        frames      (int): Number of frames after the first, at most
+        walls      (bool): Whether the walls should be drawn
+
+    Yields:
+        codes   (ndarray): The (height, width) uint8 buffer of palette
+                           indices, overwritten by the next frame
+        box       (tuple): (top, left, bottom, right) of the rectangle that
+                           changed, bottom and right excluded
+    """
+
+    maze = as_maze(maze)
+    (height, width) = (maze.height, maze.width)
+    codes = np.full(maze.size, BACKGROUND, dtype=np.uint8)
+    if walls:
+        codes[np.frombuffer(maze.walls, dtype=np.uint8).astype(bool)] = WALL_CELL
+    grid = codes.reshape(height, width)
+    yield grid, (0, 0, height, width)
+
+    order = np.asarray(order, dtype=np.int64)
+    path = np.array([r * width + c for (r, c) in path], dtype=np.int64)
+    step = max(1, math.ceil(len(order) / max(frames, 1)))
+
+    for first in range(0, len(order), step):
+        cells = order[first:first + step]
+        codes[cells] = VISITED
+        if first + step >= len(order) and len(path):
+            codes[path] = PATH
+            cells = np.concatenate((cells, path))
+        (rows, cols) = np.divmod(cells, width)
+        yield grid, (int(rows.min()), int(cols.min()), int(rows.max()) + 1, int(cols.max()) + 1)
+
+    # nothing was expanded, the path still gets its own frame
+    if not len(order) and len(path):
+        codes[path] = PATH
+        (rows, cols) = np.divmod(path, width)
+        yield grid, (int(rows.min()), int(cols.min()), int(rows.max()) + 1, int(cols.max()) + 1)
+
+
+def _scaled(block, scale):
+    if scale > 1:
+        block = np.repeat(np.repeat(block, scale, axis=0), scale, axis=1)
+    return block
+
+
+def _lzw(pixels):
+    """
+    LZW-encodes the palette indices of a GIF frame, one run of equal
+    pixels at a time.
+
+    Every code sent stands for a run of one colour. Sending a run one pixel
+    longer than the previous run of the same colour is always possible, as
+    its code is the one the decoder is about to add, so a run of n pixels
+    takes about sqrt(2n) codes and the work is per run, not per pixel.
+    Runs already in the table are reused when they fit.
+
+    Args:
+        pixels  (ndarray): Flat uint8 palette indices
+
+    Returns:
+        data  (bytearray): The LZW code stream, ending with the end code
+    """
+
+    pixels = np.asarray(pixels).reshape(-1)
+    starts = np.concatenate(([0], np.flatnonzero(pixels[1:] != pixels[:-1]) + 1))
+    lengths = np.diff(np.append(starts, len(pixels)))
+
+    first = _END + 1
+    width = _CODE_SIZE + 1
+    next_code = first
+    runs = [{} for _ in range(1 << _CODE_SIZE)]
+    longest = [1] * (1 << _CODE_SIZE)
+    # colour and length of the run sent last, -1 right after a clear
+    (last_colour, last_length) = (-1, 0)
+
+    out = bytearray()
+    bits = width
+    acc = _CLEAR
+    for (colour, remaining) in zip(pixels[starts].tolist(), lengths.tolist()):
+        table = runs[colour]
+        while remaining:
+            if next_code >= _LAST_CODE:
+                # start a new table before the decoder runs out of codes
+                acc |= _CLEAR << bits
+                bits += width
+                width = _CODE_SIZE + 1
+                next_code = first
+                for each in runs:
+                    each.clear()
+                longest = [1] * (1 << _CODE_SIZE)
+                (last_colour, last_length) = (-1, 0)
+
+            # the longest run of this colour in the table, or one past the last run
+            length = min(remaining, longest[colour])
+            while length > 1 and length not in table:
+                length -= 1
+            code = table[length] if length > 1 else colour
+            if last_colour == colour and length <= last_length < remaining:
+                length = last_length + 1
+                code = next_code
+
+            acc |= code << bits
+            bits += width
+            while bits >= 8:
+                out.append(acc & 0xFF)
+                acc >>= 8
+                bits -= 8
+
+            # the decoder adds the last run followed by the first pixel of this one
+            if last_colour != -1:
+                if last_colour == colour and last_length + 1 not in table:
+                    table[last_length + 1] = next_code
+                    longest[colour] = max(longest[colour], last_length + 1)
+                next_code += 1
+                if next_code == 1 << width and width < 12:
+                    width += 1
+            (last_colour, last_length) = (colour, length)
+            remaining -= length
+
+    acc |= _END << bits
+    bits += width
+    while bits > 0:
+        out.append(acc & 0xFF)
+        acc >>= 8
+        bits -= 8
+    return out
+
+
+def _sub_blocks(data):
+    """
+    Splits data into GIF sub-blocks of at most 255 bytes, each prefixed by
+    its length, followed by the empty block that ends them.
+    """
+
+    out = bytearray()
+    for i in range(0, len(data), 255):
+        block = data[i:i + 255]
+        out.append(len(block))
+        out += block
+    out.append(0)
+    return out
+
+
+def export_gif(maze, order, file_name, path=(), frames=100, scale=1, delay=4, walls=True):
+    """
+    Writes an animated GIF of a search, one frame per batch of expansions.
+
+    Frames are streamed to the file as they are built. After the first,
+    full frame, each frame only holds the rectangle that changed, with the
+    pixels that did not change left transparent, and is drawn over the
+    previous one. Memory is bounded by two maze-sized buffers and one frame,
+    even on maze-VLarge.
+
+    Args:
+        maze       (Maze): The maze that was searched
+        order  (sequence): Flat indices of the expanded cells, in order,
+                           such as ExpansionRecorder.order
+        file_name   (str): The .gif file to write
+        path   (iterable): Positions of the path from start to end
+        frames      (int): Number of frames after the first, at most
+        scale       (int): Size of every cell in pixels
+        delay       (int): Hundredths of a second between frames
+        walls      (bool): Whether the walls should be drawn
+    """
+
+    maze = as_maze(maze)
+    (width, height) = (maze.width * scale, maze.height * scale)
+    if width > 0xFFFF or height > 0xFFFF:
+        raise ValueError("GIF frames are at most 65535 pixels wide, got %i x %i" % (width, height))
+
+    palette = np.zeros((1 << _CODE_SIZE, 3), dtype=np.uint8)
+    palette[:len(PALETTE)] = PALETTE
+    shown = None
+
+    with open(file_name, "wb") as file:
+        # header, screen with an 8-colour global palette, looping forever
+        file.write(b"GIF89a" + struct.pack("<HHBBB", width, height, 0xF2, 0, 0))
+        file.write(palette.tobytes())
+        file.write(b"!\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00")
+
+        for (grid, (top, left, bottom, right)) in replay(maze, order, path, frames, walls):
+            block = grid[top:bottom, left:right]
+            if shown is None:
+                shown = grid.copy()
+                pixels = block
+            else:
+                before = shown[top:bottom, left:right]
+                pixels = np.where(block == before, np.uint8(TRANSPARENT), block)
+                before[...] = block
+            pixels = _scaled(pixels, scale)
+
+            # graphic control: keep the previous frame under this one, through the transparent pixels
+            file.write(b"!\xf9\x04\x05" + struct.pack("<HB", delay, TRANSPARENT) + b"\x00")
+            file.write(b"," + struct.pack("<HHHHB", left * scale, top * scale,
+                                          pixels.shape[1], pixels.shape[0], 0))
+            file.write(bytes([_CODE_SIZE]) + _sub_blocks(_lzw(pixels)))
+        file.write(b";")
+
+
+def export_frames(maze, order, directory, path=(), frames=100, scale=1, walls=True):
+    """
+    Writes a search as a sequence of PNG frames, frame-00000.png onwards.
+
+    Args:
+        maze       (Maze): The maze that was searched
+        order  (sequence): Flat indices of the expanded cells, in order,
+                           such as ExpansionRecorder.order
+        directory   (str): Directory to write the frames to, created if needed
+        path   (iterable): Positions of the path from start to end
+        frames      (int): Number of frames after the first, at most
+        scale       (int): Size of every cell in pixels
+        walls      (bool): Whether the walls should be drawn
+
+    Returns:
+        count       (int): Number of frames written
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    for (grid, _) in replay(maze, order, path, frames, walls):
+        write_png(_scaled(PALETTE[grid], scale), os.path.join(directory, "frame-%05i.png" % count))
+        count += 1
+    return count
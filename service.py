@@ -0,0 +1,284 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from batch import ALGORITHMS, BatchSolver, random_queries
+from stats import EXHAUSTED, TIMEOUT, Budget, SearchAborted, SearchStats, percentile
+
+# statuses of a result besides stats.TIMEOUT and stats.EXHAUSTED
+OK = "ok"
+ERROR = "error"
+
+# seconds a request waits past its deadline for the worker to send back
+# the partial result of the search it stopped
+DEADLINE_GRACE = 0.1
+
+# number of recent latencies the percentiles are computed over
+LATENCY_WINDOW = 1024
+
+COUNTERS = ("requests", "coalesced", "cancelled", OK, TIMEOUT, EXHAUSTED, ERROR)
+
+# solvers of the mazes this worker process has loaded, by file name
+_solvers = {}
+
+
+def solve_request(file_name, algorithm, start, end, deadline=None, max_expanded=None, index=True):
+    """
+    Solves one query inside a worker process, within a deadline and a
+    number of expansions.
+
+    The maze is loaded the first time the worker sees its file, as in
+    parallel.solve_chunk. A query still queued when its deadline passes is
+    not started at all. A start or end outside the maze or on a wall raises
+    ValueError, as in BatchSolver.solve.
+
+    Args:
+        file_name      (str): The .txt file of the maze
+        algorithm      (str): One of batch.ALGORITHMS
+        start        (tuple): Position of the starting position
+        end          (tuple): Position of the end position
+        deadline     (float): Optional time.time() to give up at
+        max_expanded   (int): Optional number of expansions allowed
+        index         (bool): Whether to search the adjacency index
+
+    Returns:
+        result        (dict): "status", OK, TIMEOUT or EXHAUSTED, "path",
+                              empty unless OK and the end can be reached,
+                              and "stats", the SearchStats as a dict, of
+                              the search up to where it stopped
+    """
+
+    if deadline is not None and time.time() >= deadline:
+        return {"status": TIMEOUT, "path": [], "stats": SearchStats().as_dict()}
+
+    key = (file_name, index)
+    solver = _solvers.get(key)
+    if solver is None:
+        solver = _solvers[key] = BatchSolver.from_file(file_name, index)
+
+    budget = Budget(deadline, max_expanded)
+    start_time = time.perf_counter()
+    try:
+        (_, _, path) = next(solver.solve([(tuple(start), tuple(end))], algorithm, budget))
+    except SearchAborted as aborted:
+        stats = SearchStats(expanded=aborted.expanded)
+        stats.timings["search"] = time.perf_counter() - start_time
+        return {"status": aborted.reason, "path": [], "stats": stats.as_dict()}
+    return {"status": OK, "path": path, "stats": solver.stats.as_dict()}
+
+
+class SolveService:
+    """
+    asyncio front end that runs solves on a worker process pool.
+
+    Requests for the same (maze file, algorithm, start, end) made while one
+    is already being solved wait for that solve instead of starting their
+    own. Each request can carry a timeout and an expansion budget: workers
+    check both as they expand cells and send back the counters of the
+    search so far when either runs out. A shared solve is bounded by the
+    budget of the request that started it, and every request also stops
+    waiting at its own timeout. A solve is cancelled once no request waits
+    for it any more, which stops it if it has not started yet.
+
+    Attributes:
+        executor  (Executor): Pool the solves run on.
+        index         (bool): Whether workers search the adjacency index.
+        counters      (dict): Number of requests, coalesced requests,
+                              cancelled requests and results per status.
+    """
+
+    def __init__(self, workers=None, executor=None, index=True):
+        self._owned = executor is None
+        self.executor = executor or ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+        self.index = index
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        # [future, number of waiting requests] of every solve in flight
+        self._in_flight = {}
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    async def solve(self, file_name, algorithm, start, end, timeout=None, max_expanded=None):
+        """
+        Solves a query, sharing the solve of an identical query in flight.
+
+        Args:
+            file_name      (str): The .txt file of the maze
+            algorithm      (str): One of batch.ALGORITHMS
+            start        (tuple): Position of the starting position
+            end          (tuple): Position of the end position
+            timeout      (float): Optional seconds to give up after
+            max_expanded   (int): Optional number of expansions allowed
+
+        Returns:
+            result        (dict): The result of solve_request, with the
+                                  "latency" of the request in seconds and
+                                  whether it was "coalesced" with another
+        """
+
+        if algorithm not in ALGORITHMS:
+            raise ValueError("unknown algorithm %r, expected one of %s" % (algorithm, ", ".join(ALGORITHMS)))
+        for position in (start, end):
+            # the worker checks the rest against the maze, once it is loaded
+            if len(position) != 2 or not all(isinstance(each, int) and each >= 0 for each in position):
+                raise ValueError("%r is not a (row, column) position in a maze" % (position,))
+        start_time = time.perf_counter()
+        self.counters["requests"] += 1
+        key = (file_name, algorithm, tuple(start), tuple(end))
+        entry = self._in_flight.get(key)
+        coalesced = entry is not None and not entry[0].cancelled()
+        if coalesced:
+            self.counters["coalesced"] += 1
+        else:
+            deadline = time.time() + timeout if timeout is not None else None
+            try:
+                future = asyncio.get_running_loop().run_in_executor(
+                    self.executor, solve_request, file_name, algorithm, key[2], key[3], deadline, max_expanded,
+                    self.index)
+            except Exception:
+                # a broken or shut down pool refuses the solve outright
+                self.counters[ERROR] += 1
+                raise
+            entry = self._in_flight[key] = [future, 0]
+            future.add_done_callback(lambda _: self._in_flight.pop(key) if self._in_flight.get(key) is entry else None)
+
+        entry[1] += 1
+        try:
+            wait = timeout + DEADLINE_GRACE if timeout is not None else None
+            result = await asyncio.wait_for(asyncio.shield(entry[0]), wait)
+        except asyncio.TimeoutError:
+            result = {"status": TIMEOUT, "path": [], "stats": None}
+        except asyncio.CancelledError:
+            self.counters["cancelled"] += 1
+            raise
+        except Exception:
+            self.counters[ERROR] += 1
+            raise
+        finally:
+            entry[1] -= 1
+            if not entry[1] and not entry[0].done():
+                entry[0].cancel()
+
+        latency = time.perf_counter() - start_time
+        self._latencies.append(latency)
+        self.counters[result["status"]] += 1
+        return dict(result, latency=latency, coalesced=coalesced)
+
+    async def handle(self, message):
+        """
+        Answers a JSON request, the way a network front end would pass them
+        on, with a JSON response. Failures are reported in the response
+        rather than raised.
+
+        Args:
+            message        (str): JSON object with "maze", "algorithm",
+                                  "start" and "end", and optionally
+                                  "timeout" and "max_expanded"
+
+        Returns:
+            response       (str): JSON object of the result of solve, or
+                                  with "status" ERROR and an "error"
+        """
+
+        try:
+            request = json.loads(message)
+            result = await self.solve(request["maze"], request.get("algorithm", ALGORITHMS[0]),
+                                      request["start"], request["end"], request.get("timeout"),
+                                      request.get("max_expanded"))
+        except Exception as error:
+            # bad requests, as well as failed or broken workers
+            result = {"status": ERROR, "error": "%s: %s" % (type(error).__name__, error)}
+        return json.dumps(result)
+
+    def metrics(self):
+        """
+        Returns the queue depth, the counters and the latency of recent
+        requests.
+
+        Returns:
+            metrics       (dict): "in_flight" solves, requests "waiting" on
+                                  them, every counter, and the "p50", "p95"
+                                  and "max" latency in seconds
+        """
+
+        metrics = {"in_flight": len(self._in_flight),
+                   "waiting": sum(waiting for (_, waiting) in self._in_flight.values())}
+        metrics.update(self.counters)
+        latencies = list(self._latencies)
+        for (name, p) in (("p50", 50), ("p95", 95), ("max", 100)):
+            metrics[name] = percentile(latencies, p) if latencies else 0.0
+        return metrics
+
+    def close(self):
+        """
+        Shuts the worker pool down, if the service created it.
+        """
+        if self._owned:
+            self.executor.shutdown(cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class LocalClient:
+    """
+    Client of a SolveService in the same process, which sends its requests
+    through SolveService.handle as JSON, so the service can be exercised
+    end to end without a network.
+
+    Attributes:
+        service (SolveService): The service requests are sent to.
+    """
+
+    def __init__(self, service):
+        self.service = service
+
+    async def solve(self, file_name, algorithm, start, end, timeout=None, max_expanded=None):
+        """
+        Solves a query through the service.
+
+        Args:
+            file_name      (str): The .txt file of the maze
+            algorithm      (str): One of batch.ALGORITHMS
+            start        (tuple): Position of the starting position
+            end          (tuple): Position of the end position
+            timeout      (float): Optional seconds to give up after
+            max_expanded   (int): Optional number of expansions allowed
+
+        Returns:
+            result        (dict): The decoded response, with the path as a
+                                  list of (row, column) tuples
+        """
+
+        message = json.dumps({"maze": file_name, "algorithm": algorithm, "start": start, "end": end,
+                              "timeout": timeout, "max_expanded": max_expanded})
+        result = json.loads(await self.service.handle(message))
+        if "path" in result:
+            result["path"] = [tuple(each) for each in result["path"]]
+        return result
+
+
+async def main(file_name, count, timeout):
+    queries = random_queries(BatchSolver.from_file(file_name, index=False).maze, count)
+    async with SolveService() as service:
+        client = LocalClient(service)
+        # every query is sent twice, the second copy shares the first's solve
+        requests = [client.solve(file_name, algorithm, start, end, timeout)
+                    for (start, end) in queries for algorithm in ALGORITHMS for _ in range(2)]
+        results = await asyncio.gather(*requests)
+        for status in (OK, TIMEOUT, EXHAUSTED, ERROR):
+            print("%s: %i" % (status, sum(result["status"] == status for result in results)))
+        print(json.dumps(service.metrics(), indent=2))
+
+
+if __name__ == '__main__':
+    # usage: python service.py [maze file] [number of queries] [timeout]
+    file_name = sys.argv[1] if len(sys.argv) > 1 else "maze-VLarge.txt"
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    timeout = float(sys.argv[3]) if len(sys.argv) > 3 else None
+    asyncio.run(main(file_name, count, timeout))
@@ -0,0 +1,206 @@
+import math
+import time
+from contextlib import contextmanager
+
+# events passed to observers, along with the flat index of the cell
+EXPAND = "expand"
+PUSH = "push"
+
+# reasons a Budget stops a search for
+TIMEOUT = "timeout"
+EXHAUSTED = "exhausted"
+
+# expansions between two looks at the clock of a Budget with a deadline
+CHECK_EVERY = 256
+
+
+class SearchStats:
+    """
+    Counters and timings of one search, returned by the solvers instead of
+    printing them.
+
+    Attributes:
+        found         (bool): Whether the end was reached.
+        expanded       (int): Number of cells expanded.
+        pushes         (int): Number of pushes onto the open list or stack.
+        pops           (int): Number of entries popped, including outdated
+                              heap entries that were skipped.
+        max_frontier   (int): Largest size of the open list or stack.
+        reopened       (int): Number of pushes of a cell that was already
+                              on the open list, after a cheaper g was found.
+        path_length    (int): Number of cells on the path, 0 if none.
+        timings       (dict): Seconds spent per phase of the search, such as
+                              "search" and "path".
+
+    The solvers are given a maze that is already loaded and indexed, and
+    one maze serves many searches, so the "load" and "index" phases are
+    timed once per maze where that happens instead, in the timings of
+    batch.BatchSolver.from_file and of the benchmark reports.
+    """
+
+    __slots__ = ("found", "expanded", "pushes", "pops", "max_frontier", "reopened", "path_length", "timings")
+
+    def __init__(self, found=False, expanded=0, pushes=0, pops=0, max_frontier=0, reopened=0):
+        self.found = found
+        self.expanded = expanded
+        self.pushes = pushes
+        self.pops = pops
+        self.max_frontier = max_frontier
+        self.reopened = reopened
+        self.path_length = 0
+        self.timings = {}
+
+    @contextmanager
+    def timed(self, phase):
+        """
+        Adds the time spent inside the with block to the given phase.
+
+        Args:
+            phase      (str): Name of the phase, such as "search"
+        """
+
+        start_time = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.timings[phase] = self.timings.get(phase, 0.0) + time.perf_counter() - start_time
+
+    @property
+    def elapsed(self):
+        """
+        Total seconds spent over all phases.
+        """
+        return sum(self.timings.values())
+
+    def as_dict(self):
+        """
+        Returns the stats as a dict, ready to be written as JSON.
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def report(self, title, pushes="Heap pushes"):
+        """
+        Formats the stats the way the solvers used to print them.
+
+        Args:
+            title      (str): Name of the search, such as "A-Star Search"
+            pushes     (str): Label of the push counter
+
+        Returns:
+            report     (str): Multi-line summary of the search
+        """
+
+        lines = ["%s:" % title,
+                 "Nodes explored: %i" % self.expanded,
+                 "%s: %i" % (pushes, self.pushes),
+                 "Pops: %i" % self.pops,
+                 "Max frontier: %i" % self.max_frontier,
+                 "Reopened: %i" % self.reopened]
+        lines.extend("Time %s: %s" % (phase, seconds) for (phase, seconds) in self.timings.items())
+        lines.append("Path length: %i steps" % self.path_length)
+        return "\n".join(lines)
+
+
+def observed(function, observer, event, cell=None):
+    """
+    Wraps a push or expand function of a solver so that the observer is
+    called with the event and the cell after every call.
+
+    When there is no observer the function itself is returned, so solvers
+    bind the result to a local once and pay nothing per call for hooks that
+    are disabled.
+
+    Args:
+        function (callable): Function whose last argument is the cell, or
+                             an open list key when cell is given
+        observer (callable): Called as observer(event, cell), or None
+        event         (str): EXPAND or PUSH
+        cell     (callable): Optional decoder of the cell from the last argument
+
+    Returns:
+        function (callable): The function, wrapped when there is an observer
+    """
+
+    if observer is None:
+        return function
+
+    if cell is None:
+        def call(*args):
+            function(*args)
+            observer(event, args[-1])
+    else:
+        def call(*args):
+            function(*args)
+            observer(event, cell(args[-1]))
+    return call
+
+
+def percentile(samples, p):
+    """
+    Returns the nearest-rank p-th percentile of the samples.
+
+    Args:
+        samples   (list): Measured values
+        p        (float): Percentile between 0 and 100
+
+    Returns:
+        value    (float): Smallest sample with at least p% of the samples
+                          at or below it
+    """
+
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+class SearchAborted(Exception):
+    """
+    Raised by a Budget from inside a solver to stop its search.
+
+    Attributes:
+        reason         (str): TIMEOUT or EXHAUSTED.
+        expanded       (int): Number of cells expanded before stopping.
+    """
+
+    def __init__(self, reason, expanded):
+        super().__init__("search stopped after %i expansions: %s" % (expanded, reason))
+        self.reason = reason
+        self.expanded = expanded
+
+
+class Budget:
+    """
+    Observer that bounds a search by a deadline or a number of expansions.
+
+    Solvers run to completion on their own, so a Budget passed as their
+    observer checks the bounds on every expansion and raises SearchAborted
+    once either is spent, which unwinds the solver from inside its loop.
+    The clock is only read every CHECK_EVERY expansions. The deadline is a
+    time.time() timestamp, so it can be set in one process and checked in
+    another.
+
+    Attributes:
+        deadline     (float): time.time() to stop at, or None.
+        max_expanded   (int): Expansions allowed, or None.
+        observer  (callable): Optional observer(event, cell) to pass every
+                              event on to.
+        expanded       (int): Number of cells expanded so far.
+    """
+
+    __slots__ = ("deadline", "max_expanded", "observer", "expanded")
+
+    def __init__(self, deadline=None, max_expanded=None, observer=None):
+        self.deadline = deadline
+        self.max_expanded = max_expanded
+        self.observer = observer
+        self.expanded = 0
+
+    def __call__(self, event, cell):
+        if self.observer is not None:
+            self.observer(event, cell)
+        if event != EXPAND:
+            return
+        self.expanded += 1
+        if self.max_expanded is not None and self.expanded > self.max_expanded:
+            raise SearchAborted(EXHAUSTED, self.max_expanded)
+        if self.deadline is not None and not self.expanded % CHECK_EVERY and time.time() >= self.deadline:
+            raise SearchAborted(TIMEOUT, self.expanded)
@@ -0,0 +1,63 @@
+from array import array
+
+# largest generation a uint32 stamp can hold before the stamps are cleared
+MAX_GENERATION = 0xFFFFFFFF
+
+
+class Workspace:
+    """
+    Preallocated per-cell search buffers that can be reused across
+    queries on the same maze.
+
+    Instead of clearing the buffers between queries, every query bumps
+    the generation counter. A cell's g-cost and parent are only valid when
+    its seen stamp equals the current generation, so starting a new query
+    costs O(1) instead of O(size).
+
+    Attributes:
+        size          (int): Number of cells the buffers cover.
+        generation    (int): Stamp of the current query.
+        g           (array): g-cost of every cell seen by the current query.
+        parent      (array): Parent index of every cell seen by the current
+                             query, -1 for the cell the search started from.
+        seen        (array): uint32 generation stamp of g and parent.
+        order        (list): Flat indices of the cells expanded by the
+                             current query, in expansion order.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.generation = 0
+        self.g = array("i", bytes(4 * size))
+        self.parent = array("i", bytes(4 * size))
+        self.seen = array("I", bytes(4 * size))
+        self.order = []
+
+    def reset(self):
+        """
+        Starts a new query, invalidating everything the last one stored.
+
+        Returns:
+            generation  (int): Stamp of the new query
+        """
+
+        self.generation += 1
+        if self.generation > MAX_GENERATION:
+            # the counter wrapped, clear the stamps once and start again
+            self.seen = array("I", bytes(4 * self.size))
+            self.generation = 1
+        self.order.clear()
+        return self.generation
+
+    def explored(self, width):
+        """
+        Returns the positions of all cells expanded by the current query.
+
+        Args:
+            width      (int): Number of columns in the maze
+
+        Returns:
+            explored   (set): (row, column) of every expanded cell
+        """
+
+        return {divmod(i, width) for i in self.order}